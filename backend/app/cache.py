@@ -0,0 +1,167 @@
+"""报表结果缓存
+
+- 键：报表名 + 代数（generation）+ 规范化后的 ReportFilters
+- 淘汰：LRU + TTL
+- 失效：crud 中任何订单/商品写入提交后调用 report_cache.invalidate()，代数 +1，旧键自然失效
+- 后端：CacheBackend 接口，默认进程内 MemoryCacheBackend，以后可换成共享存储（如 Redis）
+
+环境变量：
+- REPORT_CACHE_TTL：缓存有效期（秒），默认 60，设为 0 关闭缓存
+- REPORT_CACHE_SIZE：最多缓存条目数，默认 256
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from . import schemas
+
+
+class CacheBackend:
+    """缓存后端接口
+
+    值是任意 Python 对象；共享存储的实现需要自行序列化（报表结果都是 pydantic 模型，可直接 pickle）。
+    代数计数器也放在后端里，这样多进程共享同一个后端时失效是全局的。
+    """
+
+    def get(self, key: str) -> Optional[Any]:
+        """取值，不存在或已过期返回 None"""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """写入，ttl 秒后过期"""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """清空所有条目"""
+        raise NotImplementedError
+
+    def size(self) -> int:
+        """当前条目数"""
+        raise NotImplementedError
+
+    def get_generation(self) -> int:
+        """当前代数"""
+        raise NotImplementedError
+
+    def bump_generation(self) -> int:
+        """代数 +1 并返回新值"""
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """进程内 LRU + TTL 缓存（线程安全）"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get_generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def bump_generation(self) -> int:
+        with self._lock:
+            self._generation += 1
+            # 旧代数的条目已经不可能命中，顺手清掉释放内存
+            self._entries.clear()
+            return self._generation
+
+
+def canonical_filters(filters: schemas.ReportFilters) -> str:
+    """把筛选条件规范化成稳定的字符串：列表去重排序，None 与空列表视为相同"""
+    data = {}
+    for field, value in filters.model_dump(mode="json").items():
+        if isinstance(value, list):
+            value = sorted(set(value)) or None
+        if value is not None:
+            data[field] = value
+    return json.dumps(data, sort_keys=True, separators=(",", ":"))
+
+
+class ReportCache:
+    """报表缓存，统计命中/未命中次数"""
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_or_compute(self, name: str, filters: schemas.ReportFilters, compute: Callable[[], Any]) -> Any:
+        """命中直接返回缓存；否则计算并写入
+
+        代数在计算前读取：计算期间若有写入提交，结果写在旧代数下，不会被后续请求读到。
+        """
+        if self.ttl <= 0:
+            return compute()
+        key = f"{name}:{self.backend.get_generation()}:{canonical_filters(filters)}"
+        value = self.backend.get(key)
+        if value is not None:
+            self._count(hit=True)
+            return value
+        self._count(hit=False)
+        value = compute()
+        self.backend.set(key, value, self.ttl)
+        return value
+
+    def invalidate(self) -> None:
+        """数据有写入时调用，使所有已缓存的报表失效"""
+        self.backend.bump_generation()
+
+    def stats(self) -> dict:
+        """命中率等统计信息"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self.backend.size(),
+            "generation": self.backend.get_generation(),
+            "ttl_seconds": self.ttl,
+        }
+
+
+report_cache = ReportCache(
+    MemoryCacheBackend(max_entries=int(os.getenv("REPORT_CACHE_SIZE", "256"))),
+    ttl=float(os.getenv("REPORT_CACHE_TTL", "60")),
+)
@@ -1,24 +1,121 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import select, and_
-from . import models, schemas
-from datetime import datetime
+import os
+from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import select, insert, update, func, and_, or_
+from sqlalchemy.exc import IntegrityError
+from . import models, schemas, rollup, sequences, product_sales, report_core, inventory
+from .cache import report_cache
+from .database import SessionLocal
+from datetime import datetime, date, timedelta
 from typing import Iterable, List
+from collections import Counter
 from decimal import Decimal
 from fastapi import HTTPException
 from sqlalchemy import Column,Text
 
+# ==================== 分页列表 ====================
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def _keyset_select(model, out_schema, conditions: list, limit: int, cursor: int | None,
+                   fields: list[str] | None):
+    """keyset 分页的查询语句和实际返回的字段（explain 命令也用它生成列表查询）"""
+    allowed = list(out_schema.model_fields)
+    if fields:
+        unknown = [f for f in fields if f not in allowed]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    selected = fields or allowed
+    columns = [getattr(model, name) for name in dict.fromkeys(["id", *selected])]
+
+    stmt = select(*columns).where(*conditions)
+    if cursor is not None:
+        stmt = stmt.where(model.id < cursor)
+    return stmt.order_by(model.id.desc()).limit(limit + 1), selected
+
+
+def _keyset_page(db: Session, model, out_schema, conditions: list, limit: int, cursor: int | None,
+                 fields: list[str] | None) -> schemas.Page:
+    """按 id 倒序的游标（keyset）分页
+
+    WHERE id < :cursor ORDER BY id DESC LIMIT :limit + 1，多取一行判断是否还有下一页；
+    只查询需要的列，直接组装成字典返回，不构造 ORM 对象。
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    stmt, selected = _keyset_select(model, out_schema, conditions, limit, cursor, fields)
+    rows = db.execute(stmt).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [
+        {name: float(value) if isinstance(value, Decimal) else value for name, value in row._mapping.items() if name in selected}
+        for row in rows
+    ]
+    return schemas.Page(items=items, next_cursor=rows[-1].id if has_more else None)
+
+
+def _refresh_after_commit(db: Session, obj) -> None:
+    """提交后对象已过期（expire_on_commit=True）时重新加载；
+    DB_EXPIRE_ON_COMMIT=0 时属性仍然有效（写入的值都在 Python 里），省掉这次往返"""
+    if db.expire_on_commit:
+        db.refresh(obj)
+
+
 # ==================== Product CRUD ====================
 
+# 修改成本价时，订单数超过这个值的商品改为后台重算利润
+PROFIT_RECOMPUTE_DEFER_THRESHOLD = int(os.getenv("PROFIT_RECOMPUTE_DEFER_THRESHOLD", "50000"))
+
+IMPORT_CHUNK_SIZE = 1000
+
+
+def _chunks(items: Iterable, size: int):
+    """把可迭代对象切成固定大小的列表"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _allocate_skus(db: Session, prefixes: list[str]) -> list[str]:
+    """为一批新商品生成 SKU：每个前缀只分配一次，前缀内依次编号 prefix_001, prefix_002 ..."""
+    allocated = {
+        prefix: iter(sequences.next_skus(db, prefix, count))
+        for prefix, count in Counter(prefixes).items()
+    }
+    return [next(allocated[prefix]) for prefix in prefixes]
+
+
+def _recompute_profits(db: Session, product_ids) -> tuple[int, dict[int, Decimal]]:
+    """按商品当前成本价（库里的值，调用前先 flush），用一条 UPDATE 重算这些商品所有订单的利润，
+    同步日汇总表和商品的销售累计；返回 (更新的订单数, {商品 id: 新的 profit_total})"""
+    cost = (
+        select(models.Product.cost_price)
+        .where(models.Product.id == models.Order.product_id)
+        .scalar_subquery()
+    )
+    result = db.execute(
+        update(models.Order)
+        .where(models.Order.product_id.in_(list(product_ids)))
+        .values(profit=models.Order.actual_price * models.Order.quantity - cost * models.Order.quantity)
+        .execution_options(synchronize_session=False)
+    )
+    rollup.reprice_products(db, product_ids)
+    totals = product_sales.reprice_products(db, product_ids)
+    return result.rowcount, totals
+
+
 def create_product(db: Session, data: schemas.ProductCreate) -> models.Product:
     """创建商品"""
-    # 用户输入的是前缀，例如 "XXX"
-    prefix = data.sku.strip()  
-     # 找出数据库里已有的同前缀 SKU
-    existing = db.query(models.Product).filter(models.Product.sku.like(f"{prefix}_%")).all()
-
-    # 自动生成下一个序号
-    next_num = len(existing) + 1
-    new_sku = f"{prefix}_{next_num:03d}"
+    # 用户输入的是前缀，例如 "XXX"，自动生成下一个序号
+    prefix = data.sku.strip()
+    new_sku = _allocate_skus(db, [prefix])[0]
 
     product = models.Product(
         sku=new_sku,
@@ -29,8 +126,12 @@ def create_product(db: Session, data: schemas.ProductCreate) -> models.Product:
         actual_price=Decimal(str(data.actual_price)) if data.actual_price is not None else None,
     )
     db.add(product)
+    # 先 flush 拿到商品 id，期初库存记一条流水
+    db.flush()
+    inventory.record(db, product, product.quantity, "product_create")
     db.commit()
-    db.refresh(product)
+    report_cache.invalidate()
+    _refresh_after_commit(db, product)
     return product
 
 
@@ -39,67 +140,228 @@ def get_product_by_sku(db: Session, sku: str) -> models.Product | None:
     return db.execute(stmt).scalar_one_or_none()
 
 
-def list_products(db: Session) -> list[models.Product]:
-    stmt = select(models.Product).order_by(models.Product.id.desc())
-    return list(db.execute(stmt).scalars().all())
+def _product_matches(q: str):
+    """商品列表的搜索条件：SKU 前缀或商品名包含 q（不区分大小写）"""
+    p = models.Product
+    return or_(p.sku.startswith(q, autoescape=True), p.name.icontains(q, autoescape=True))
+
+
+def list_products(
+    db: Session,
+    skus: list[str] | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: int | None = None,
+    fields: list[str] | None = None,
+    ids: list[int] | None = None,
+    q: str | None = None,
+) -> schemas.Page:
+    """商品列表：按 id 倒序的游标分页，可按 SKU / id 筛选、按 q 搜索（SKU 前缀或名称）、只返回部分字段"""
+    conditions = []
+    if skus:
+        conditions.append(models.Product.sku.in_(skus))
+    if ids:
+        conditions.append(models.Product.id.in_(ids))
+    if q and q.strip():
+        conditions.append(_product_matches(q.strip()))
+    return _keyset_page(db, models.Product, schemas.ProductOut, conditions, limit, cursor, fields)
+
 
+def export_products_query(skus: list[str] | None = None):
+    """商品导出查询，列顺序与 csv_export.PRODUCT_EXPORT_HEADERS 一致"""
+    p = models.Product
+    stmt = select(p.sku, p.name, p.cost_price, p.quantity, p.preset_price, p.actual_price)
+    if skus:
+        stmt = stmt.where(p.sku.in_(skus))
+    return stmt.order_by(p.id)
 
-def update_product(db: Session, product: models.Product, data: schemas.ProductUpdate) -> models.Product:
-    for field, value in data.model_dump(exclude_unset=True).items():
+
+def update_product(
+    db: Session, product: models.Product, data: schemas.ProductUpdate, recompute_profits: bool = True
+) -> models.Product:
+    """更新商品
+
+    成本价变化时在同一事务内重算该商品所有订单的利润（一条 UPDATE，见 recompute_product_profits）。
+    recompute_profits=False 时由调用方另行安排（例如交给后台任务 run_profit_recompute_job）。
+    """
+    old_cost = product.cost_price
+    changes = data.model_dump(exclude_unset=True)
+    old_quantity = None
+    if changes.get("quantity") is not None:
+        # 直接改库存：加行锁重新读当前库存（商品对象里的值可能已被并发订单改过），差额记一条流水
+        old_quantity = db.scalar(
+            select(models.Product.quantity).where(models.Product.id == product.id).with_for_update()
+        )
+    for field, value in changes.items():
         if field in ["cost_price", "preset_price", "actual_price"] and value is not None:
             value = Decimal(str(value))
         setattr(product, field, value)
     db.add(product)
+    if old_quantity is not None:
+        inventory.record(db, product, product.quantity - old_quantity, "product_update")
+    # ✅ 如果成本价更新了，自动重算该商品的所有订单利润
+    if recompute_profits and product.cost_price != old_cost:
+        recompute_product_profits(db, product)
     db.commit()
-    db.refresh(product)
-     # ✅ 如果成本价更新了，自动重算该商品的所有订单利润
-    if data.cost_price is not None:
-        orders = db.query(models.Order).filter(models.Order.product_id == product.id).all()
-        for order in orders:
-            # 这里用 order 本身的数据，调用 update_order 来重算利润
-            update_data = schemas.OrderUpdate(
-                actual_price=order.actual_price,
-                quantity=order.quantity,
-                payment_method=order.payment_method,
-                channel=order.channel,
-                status=order.status,
-                buyer_name=order.buyer_name,
-                transaction_date=order.transaction_date,
-                remark=order.remark,
-            )
-            update_order(db, order, update_data)
+    report_cache.invalidate()
+    _refresh_after_commit(db, product)
+    return product
+
+
+def recompute_product_profits(db: Session, product: models.Product) -> int:
+    """按商品当前成本价重算它所有订单的利润并同步日汇总表（不提交），返回更新的订单数（见 _recompute_profits）"""
+    db.flush()
+    updated, totals = _recompute_profits(db, [product.id])
+    set_committed_value(product, "profit_total", totals[product.id])
+    return updated
+
+
+def should_defer_profit_recompute(db: Session, product: models.Product, data: schemas.ProductUpdate) -> bool:
+    """成本价有变化、且该商品订单数超过 PROFIT_RECOMPUTE_DEFER_THRESHOLD 时，利润重算改为后台执行"""
+    if data.cost_price is None or Decimal(str(data.cost_price)) == product.cost_price:
+        return False
+    order_count = db.scalar(
+        select(func.count(models.Order.id)).where(models.Order.product_id == product.id)
+    )
+    return order_count > PROFIT_RECOMPUTE_DEFER_THRESHOLD
+
 
+def run_profit_recompute_job(product_id: int) -> int:
+    """后台任务：用独立 session 重算某商品所有订单利润并提交，返回更新的订单数"""
+    with SessionLocal() as db:
+        product = db.get(models.Product, product_id)
+        if product is None:
+            return 0
+        updated = recompute_product_profits(db, product)
         db.commit()
-    return product
+    report_cache.invalidate()
+    return updated
 
 
 def delete_product(db: Session, product: models.Product) -> None:
+    inventory.remove_product(db, product.id)
     db.delete(product)
     db.commit()
+    report_cache.invalidate()
+
+
+def get_stock_history(
+    db: Session,
+    product: models.Product,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: int | None = None,
+) -> schemas.StockHistory:
+    """商品在 [start_date, end_date] 内的库存流水（按 id 倒序的游标分页），以及区间开始前和结束时的库存
+
+    区间首尾的库存由最近的快照加上其后的一小段流水算出（inventory.stock_at），不扫描全部历史。
+    """
+    m = models.InventoryMovement
+    start = datetime.combine(start_date, datetime.min.time()) if start_date else None
+    end = datetime.combine(end_date, datetime.min.time()) + timedelta(days=1) if end_date else None
+    conditions = [m.product_id == product.id]
+    if start is not None:
+        conditions.append(m.created_at >= start)
+    if end is not None:
+        conditions.append(m.created_at < end)
+    page = _keyset_page(db, m, schemas.InventoryMovementOut, conditions, limit, cursor, None)
+    return schemas.StockHistory(
+        items=page.items,
+        next_cursor=page.next_cursor,
+        product_sku=product.sku,
+        opening_quantity=inventory.stock_at(db, product.id, start) if start is not None else 0,
+        closing_quantity=inventory.stock_at(db, product.id, end),
+    )
+
+
 def get_product_by_name(db: Session, name: str) -> models.Product | None:
     return db.query(models.Product).filter(models.Product.name == name).first()
 
-def upsert_products(db: Session, products: Iterable[schemas.ProductCreate]) -> dict:
+def _upsert_product_chunk(db: Session, chunk: list[schemas.ProductCreate]) -> dict:
+    """按商品名 upsert 一批商品（一个事务）
+
+    1. 一条查询取出本批已存在的商品并加行锁（用于区分新增/更新、判断成本价和库存是否变化）
+    2. 新商品按前缀一次性分配 SKU
+    3. INSERT ... ON CONFLICT (name) DO UPDATE 一次写入，库存变化一次写入流水
+    4. 只对成本价真正变化的商品重算订单利润（一条 UPDATE）
+    """
+    # 同一批里重名时以最后一行为准
+    latest = {payload.name: payload for payload in chunk}
+    existing = {
+        p.name: p
+        for p in db.execute(
+            select(models.Product.name, models.Product.sku, models.Product.cost_price, models.Product.quantity)
+            .where(models.Product.name.in_(latest.keys()))
+            .order_by(models.Product.id)
+            .with_for_update()
+        )
+    }
+
     inserted = 0
     updated = 0
-    for payload in products:
-        existing = get_product_by_name(db, payload.name)
-        if existing is None:
-            create_product(db, payload)  # 依然生成 SKU_xxx
-            inserted += 1
-        else:
-            update_product(
-                db,
-                existing,
-                schemas.ProductUpdate(
-                    name=payload.name,
-                    cost_price=payload.cost_price,
-                    quantity=payload.quantity,
-                    preset_price=payload.preset_price,
-                    actual_price=payload.actual_price,
-                ),
-            )
+    seen = set(existing)
+    for payload in chunk:
+        if payload.name in seen:
             updated += 1
+        else:
+            inserted += 1
+            seen.add(payload.name)
+
+    new_names = [name for name in latest if name not in existing]
+    new_skus = dict(zip(new_names, _allocate_skus(db, [latest[name].sku.strip() for name in new_names])))
+
+    rows = []
+    changed_cost_names = []
+    for name, payload in latest.items():
+        cost_price = Decimal(str(payload.cost_price))
+        if name in existing and existing[name].cost_price != cost_price:
+            changed_cost_names.append(name)
+        rows.append({
+            "sku": existing[name].sku if name in existing else new_skus[name],
+            "name": name,
+            "cost_price": cost_price,
+            "quantity": payload.quantity,
+            "preset_price": Decimal(str(payload.preset_price)) if payload.preset_price is not None else None,
+            "actual_price": Decimal(str(payload.actual_price)) if payload.actual_price is not None else None,
+        })
+
+    table = models.Product.__table__
+    stmt = rollup.dialect_insert(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={name: stmt.excluded[name] for name in ("cost_price", "quantity", "preset_price", "actual_price")},
+    )
+    ids = dict(db.execute(stmt.returning(table.c.name, table.c.id), rows).all())
+    inventory.record_rows(db, [
+        {
+            "product_id": ids[row["name"]],
+            "delta": row["quantity"] - (existing[row["name"]].quantity if row["name"] in existing else 0),
+            "quantity_after": row["quantity"],
+            "reason": "product_import",
+        }
+        for row in rows
+    ])
+
+    if changed_cost_names:
+        _recompute_profits(db, [ids[name] for name in changed_cost_names])
+    db.commit()
+    return {"inserted": inserted, "updated": updated}
+
+
+def upsert_products(db: Session, products: Iterable[schemas.ProductCreate], chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """批量导入商品：以商品名为唯一识别，存在则更新，不存在则新增（生成 SKU_xxx）
+
+    按 chunk_size 分批，每批一个事务、固定几条 SQL（见 _upsert_product_chunk）。
+    每批提交后立即让报表缓存失效：后面的批次出错时，已提交的批次也不会被旧缓存挡住。
+    """
+    inserted = 0
+    updated = 0
+    for chunk in _chunks(products, chunk_size):
+        stats = _upsert_product_chunk(db, chunk)
+        if stats["inserted"] or stats["updated"]:
+            report_cache.invalidate()
+        inserted += stats["inserted"]
+        updated += stats["updated"]
     return {"inserted": inserted, "updated": updated}
 
 '''
@@ -130,41 +392,40 @@ def upsert_products(db: Session, products: Iterable[schemas.ProductCreate]) -> d
 
 # ==================== Order CRUD ====================
 
-def create_order(db: Session, data: schemas.OrderCreate) -> models.Order:
-    """创建订单（自动扣减库存并计算利润）"""
-    product = get_product_by_sku(db, data.product_sku)
-    if product is None:
-        raise HTTPException(status_code=400, detail="不存在该商品")
-    if product.quantity < data.quantity:
+def _adjust_stock(db: Session, product: models.Product, delta: int,
+                  sales: product_sales.SalesDelta | None = None, **values) -> None:
+    """原子地调整库存：UPDATE products SET quantity = quantity + :delta WHERE id = :id RETURNING quantity
+
+    扣减（delta < 0）时再加上 AND quantity >= :n，库存不够则一行都不更新 -> 400。
+    判断和扣减是同一条语句，并发下单不会基于读到的旧库存超卖；PostgreSQL 上这一行的
+    行锁持有到事务提交，同一商品的并发订单在这里排队。
+    sales（销售累计的变化）和 values 里的其他列（如 actual_price）一并写入。
+    新值由 RETURNING 写回 product 但不标记为已修改，提交时不会再用旧值覆盖。
+    """
+    table = models.Product.__table__
+    values = {**(sales.values(product.id) if sales else {}), **values}
+    stmt = update(table).where(table.c.id == product.id).values(quantity=table.c.quantity + delta, **values)
+    if delta < 0:
+        stmt = stmt.where(table.c.quantity >= -delta)
+    columns = ["quantity", *values]
+    row = db.execute(stmt.returning(*(table.c[name] for name in columns))).first()
+    if row is None:
         raise HTTPException(status_code=400, detail="库存不足")
+    for name, value in zip(columns, row):
+        set_committed_value(product, name, value)
 
+
+def _order_from_payload(data: schemas.OrderCreate, product: models.Product, order_number: str | None,
+                        created_at: datetime) -> models.Order:
+    """由请求构造新订单（不含库存扣减）；order_number 为 None 时由调用方在扣完库存后再分配"""
     # 计算利润：销售额 - 成本 （全部用 Decimal）
     total_sales = Decimal(str(data.actual_price)) * Decimal(str(data.quantity))
     total_cost = product.cost_price * Decimal(str(data.quantity))
     profit = total_sales - total_cost
-    
-    # 查询该商品已有多少订单
-    existing_orders = (
-        db.query(models.Order)
-        .filter(models.Order.product_id == product.id)
-        .with_entities(models.Order.order_number)
-        .all()
-    )
 
-    # 找最大编号
-    max_suffix = 0
-    for o in existing_orders:
-        if o.order_number and "_" in o.order_number:
-            try:
-                suffix = int(o.order_number.split("_")[-1])
-                max_suffix = max(max_suffix, suffix)
-            except:
-                pass
-    new_order_number = f"{product.sku}_{max_suffix + 1:03d}"
-
-    order = models.Order(
-        order_number=new_order_number,
-        created_at=datetime.utcnow(),
+    return models.Order(
+        order_number=order_number,
+        created_at=created_at,
         transaction_date=data.transaction_date,
         buyer_name=data.buyer_name,
         actual_price=Decimal(str(data.actual_price)),
@@ -177,18 +438,61 @@ def create_order(db: Session, data: schemas.OrderCreate) -> models.Order:
         remark = data.remark,
     )
 
-    product.quantity -= data.quantity
-    product.actual_price = Decimal(str(data.actual_price))
+
+def create_order(db: Session, data: schemas.OrderCreate) -> models.Order:
+    """创建订单（自动扣减库存并计算利润）"""
+    product = get_product_by_sku(db, data.product_sku)
+    if product is None:
+        raise HTTPException(status_code=400, detail="不存在该商品")
+    order = _order_from_payload(data, product, None, datetime.utcnow())
+
+    # 扣库存、累计销量和更新商品售价在同一条条件 UPDATE 里完成
+    sales = product_sales.SalesDelta()
+    sales.add(order)
+    _adjust_stock(db, product, -data.quantity, sales, actual_price=Decimal(str(data.actual_price)))
+
+    # 从该商品的订单号计数器原子地取下一个序号（先锁商品行、再锁计数器，与批量写入的加锁顺序一致）
+    order.order_number = sequences.next_order_number(db, product)
+    inventory.record(db, product, -data.quantity, "order_create", order.order_number)
+
+    rollup.add_order(db, order, product)
 
     db.add(order)
-    db.add(product)
     db.commit()
-    db.refresh(order)
+    report_cache.invalidate()
+    _refresh_after_commit(db, order)
     return order
 
 
-def get_order_by_id(db: Session, order_id: int) -> models.Order | None:
+def _lock_order_product(db: Session, order_id: int) -> None:
+    """锁住订单所属商品的行（订单不存在时什么都不锁）
+
+    改单/删单/批量写入都先拿到商品的行锁再读订单（与 apply_order_batch 的顺序一致），
+    之后读到的订单数量就是最新的，并发修改同一订单会在这里排队，不会基于旧数量调整库存。
+    PostgreSQL 用 SELECT ... FOR UPDATE；SQLite 不支持 FOR UPDATE，改用一条不改值的 UPDATE
+    开启写事务，其他写入要等本事务提交。
+    """
+    p = models.Product
+    product_id = select(models.Order.product_id).where(models.Order.id == order_id).scalar_subquery()
+    if db.get_bind().dialect.name == "sqlite":
+        db.execute(update(p).where(p.id == product_id).values(quantity=p.quantity))
+    else:
+        db.execute(select(p.id).where(p.id == product_id).with_for_update())
+
+
+def get_order_by_id(db: Session, order_id: int, with_product: bool = False,
+                    for_update: bool = False) -> models.Order | None:
+    """with_product=True 时 JOIN 商品表一次取回 order.product（修改/删除订单要用商品的库存和成本价）
+
+    Order.product 是 lazy="raise_on_sql"，需要商品的路径都要在查询里显式加载。
+    for_update=True 时先锁住订单所属的商品（见 _lock_order_product）再读订单，用于修改/删除。
+    """
     stmt = select(models.Order).where(models.Order.id == order_id)
+    if with_product:
+        stmt = stmt.join(models.Order.product).options(contains_eager(models.Order.product))
+    if for_update:
+        _lock_order_product(db, order_id)
+        stmt = stmt.execution_options(populate_existing=True)
     return db.execute(stmt).scalar_one_or_none()
 
 
@@ -197,230 +501,1001 @@ def get_order_by_number(db: Session, order_number: str) -> models.Order | None:
     return db.execute(stmt).scalar_one_or_none()
 
 
-def list_orders(db: Session) -> list[models.Order]:
-    stmt = select(models.Order).order_by(models.Order.id.desc())
-    return list(db.execute(stmt).scalars().all())
+def list_orders(
+    db: Session,
+    filters: schemas.ReportFilters | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: int | None = None,
+    fields: list[str] | None = None,
+    q: str | None = None,
+) -> schemas.Page:
+    """订单列表：按 id 倒序的游标分页
 
+    筛选条件与报表共用 ReportFilters（日期范围、渠道、支付方式、状态、SKU），
+    q 按订单号前缀或商品（SKU 前缀、名称）搜索，fields 只查询并返回指定字段。
+    """
+    conditions = []
+    if filters is not None:
+        conditions = _ReportSource(use_rollup=False).conditions(filters, joined_products=False)
+    if q and q.strip():
+        q = q.strip()
+        conditions.append(or_(
+            models.Order.order_number.startswith(q, autoescape=True),
+            models.Order.product_id.in_(select(models.Product.id).where(_product_matches(q))),
+        ))
+    return _keyset_page(db, models.Order, schemas.OrderOut, conditions, limit, cursor, fields)
 
-def update_order(db: Session, order: models.Order, data: schemas.OrderUpdate) -> models.Order:
-    """更新订单信息并调整库存，重新计算利润"""
-    product = order.product
 
-    # 如果数量有变化，调整库存
-    if data.quantity is not None and data.quantity != order.quantity:
-        diff = data.quantity - order.quantity
-        if diff > 0:
-            if product.quantity < diff:
-                raise HTTPException(status_code=400, detail="库存不足")
-            product.quantity -= diff
-        else:
-            product.quantity += abs(diff)
+def export_orders_query(filters: schemas.ReportFilters | None = None):
+    """订单导出查询（带商品 SKU 和名称），筛选条件同 list_orders，
+    列顺序与 csv_export.ORDER_EXPORT_HEADERS 一致"""
+    o, p = models.Order, models.Product
+    stmt = (
+        select(
+            o.order_number, o.transaction_date, o.buyer_name, p.sku, p.name, o.quantity,
+            o.actual_price, o.profit, o.payment_method, o.channel, o.status, o.remark,
+        )
+        .join(p, p.id == o.product_id)
+    )
+    if filters is not None:
+        stmt = stmt.where(*_ReportSource(use_rollup=False).conditions(filters, joined_products=False))
+    return stmt.order_by(o.id)
+
+
+def analytics_orders_query(filters: schemas.ReportFilters | None = None):
+    """分析用订单明细查询：订单字段 + 商品 SKU/名称/成本价，筛选条件同 list_orders"""
+    o, p = models.Order, models.Product
+    stmt = (
+        select(
+            o.id, o.order_number, o.created_at, o.transaction_date, o.buyer_name,
+            o.product_id, p.sku.label("product_sku"), p.name.label("product_name"), p.cost_price,
+            o.actual_price, o.quantity, o.profit, o.payment_method, o.channel, o.status, o.remark,
+        )
+        .join(p, p.id == o.product_id)
+    )
+    if filters is not None:
+        stmt = stmt.where(*_ReportSource(use_rollup=False).conditions(filters, joined_products=False))
+    return stmt.order_by(o.id)
+
+
+def _final_price_and_quantity(order: models.Order, data: schemas.OrderUpdate) -> tuple[Decimal, int]:
+    """修改后的售价和数量（未修改的沿用订单原值）"""
+    final_price = Decimal(str(data.actual_price)) if data.actual_price is not None else order.actual_price
+    final_quantity = data.quantity if data.quantity is not None else order.quantity
+    return final_price, final_quantity
+
+
+def _apply_order_update(order: models.Order, product: models.Product, data: schemas.OrderUpdate) -> None:
+    """把修改写到订单对象上并按新的售价和数量重算利润（不含库存和日汇总表）"""
+    final_price, final_quantity = _final_price_and_quantity(order, data)
 
     # 更新订单字段
-    for field, value in data.model_dump(exclude_unset=True).items():
+    for field, value in data.model_dump(exclude_unset=True, exclude={"id"}).items():
         if field in ["actual_price", "profit"] and value is not None:
             value = Decimal(str(value))
         setattr(order, field, value)
 
     # 重新计算利润
-    final_price = Decimal(str(data.actual_price)) if data.actual_price is not None else order.actual_price
-    final_quantity = data.quantity if data.quantity is not None else order.quantity
     total_sales = final_price * Decimal(str(final_quantity))
     total_cost = product.cost_price * Decimal(str(final_quantity))
     order.profit = total_sales - total_cost
 
-     # ✅ 更新 product 的实际售价为这次订单的售价
-    product.actual_price = final_price
-    
+
+def update_order(db: Session, order: models.Order, data: schemas.OrderUpdate) -> models.Order:
+    """更新订单信息并调整库存，重新计算利润"""
+    product = order.product
+    final_price, final_quantity = _final_price_and_quantity(order, data)
+    old_quantity = order.quantity
+
+    # 先扣除旧订单对日汇总表和销售累计的贡献，字段更新后再加回新贡献
+    sales = product_sales.SalesDelta()
+    sales.add(order, -1)
+    rollup.remove_order(db, order, product)
+    _apply_order_update(order, product, data)
+    sales.add(order)
+
+    # 按数量差调整库存（加量时库存不够 -> 400），同时把商品售价更新为这次订单的售价
+    _adjust_stock(db, product, old_quantity - final_quantity, sales, actual_price=final_price)
+    inventory.record(db, product, old_quantity - final_quantity, "order_update", order.order_number)
+    rollup.add_order(db, order, product)
+
     db.add(order)
-    db.add(product)
     db.commit()
-    db.refresh(order)
+    report_cache.invalidate()
+    _refresh_after_commit(db, order)
     return order
 
 
 def delete_order(db: Session, order: models.Order) -> None:
     """删除订单并自动恢复库存"""
     product = order.product
-    product.quantity += order.quantity
+    sales = product_sales.SalesDelta()
+    sales.add(order, -1)
+    _adjust_stock(db, product, order.quantity, sales)
+    inventory.record(db, product, order.quantity, "order_delete", order.order_number)
+    rollup.remove_order(db, order, product)
     db.delete(order)
-    db.add(product)
     db.commit()
+    report_cache.invalidate()
+
 
+_BATCH_ACTIONS = ("delete", "update", "create")
 
-def upsert_orders(db: Session, orders: Iterable[schemas.OrderCreate]) -> dict:
-    """批量导入订单"""
+
+def apply_order_batch(db: Session, batch: schemas.OrderBatch) -> schemas.OrderBatchResult:
+    """批量下单/改单/删单（一个事务）
+
+    1. 按 id 顺序锁定本批涉及的商品行（SELECT ... FOR UPDATE），再读取要修改/删除的订单
+    2. 按 删除 -> 修改 -> 新增 的顺序在内存里逐项校验，维护每个商品的剩余库存
+    3. 写入：每个商品一条条件 UPDATE 调整净库存（连同销售累计和最后一次订单的售价），每个商品分配一次订单号，
+       日汇总表的增量合并后一次写入，库存流水逐单一次写入，订单的新增/修改/删除在同一次 flush 里完成
+
+    all_or_nothing 模式下只要有一项失败就什么都不写，返回 400（detail 为各项结果）；
+    best_effort 模式下失败的项跳过，其余照常提交。
+    """
+    o, p = models.Order, models.Product
+    order_ids = {item.id for item in batch.update} | set(batch.delete)
+    skus = {item.product_sku for item in batch.create}
+
+    # 先锁商品再读订单：其他改动这些商品库存的写入都要等这把行锁，之后读到的订单就是最新的
+    product_filters = []
+    if order_ids:
+        product_filters.append(p.id.in_(select(o.product_id).where(o.id.in_(order_ids))))
+    if skus:
+        product_filters.append(p.sku.in_(skus))
+    products: dict[int, models.Product] = {}
+    if product_filters:
+        stmt = select(p).where(or_(*product_filters)).order_by(p.id).with_for_update()
+        products = {product.id: product for product in db.execute(stmt).scalars()}
+    by_sku = {product.sku: product for product in products.values()}
+    orders: dict[int, models.Order] = {}
+    if order_ids:
+        orders = {order.id: order for order in db.execute(select(o).where(o.id.in_(order_ids))).scalars()}
+
+    stock = {product.id: product.quantity for product in products.values()}
+    sales = {product_id: product_sales.SalesDelta() for product_id in products}
+    # 每个商品按处理顺序的库存变化 (变化量, 原因, 订单)，提交前写成流水
+    movements: dict[int, list[tuple[int, str, models.Order]]] = {product_id: [] for product_id in products}
+    last_price: dict[int, Decimal] = {}
+    merged: dict[tuple, dict] = {}
+    results: dict[tuple[str, int], schemas.OrderBatchItem] = {}
+    deleted: list[models.Order] = []
+    updated: list[tuple[int, models.Order]] = []
+    pending: list[tuple[int, schemas.OrderCreate, models.Product]] = []
+
+    def fail(action: str, index: int, error: str, order_id: int | None = None) -> None:
+        results[action, index] = schemas.OrderBatchItem(
+            action=action, index=index, ok=False, order_id=order_id, error=error,
+        )
+
+    for index, order_id in enumerate(batch.delete):
+        # 删除后从 orders 里拿掉：重复删除、或删除后再修改同一订单都按不存在处理
+        order = orders.pop(order_id, None)
+        if order is None:
+            fail("delete", index, "Order not found", order_id)
+            continue
+        product = products[order.product_id]
+        stock[product.id] += order.quantity
+        movements[product.id].append((order.quantity, "order_delete", order))
+        sales[product.id].add(order, -1)
+        rollup.merge_delta(merged, rollup.order_key(order), rollup.order_values(order, product), sign=-1)
+        deleted.append(order)
+        results["delete", index] = schemas.OrderBatchItem(action="delete", index=index, ok=True, order_id=order_id)
+
+    for index, item in enumerate(batch.update):
+        order = orders.get(item.id)
+        if order is None:
+            fail("update", index, "Order not found", item.id)
+            continue
+        product = products[order.product_id]
+        final_price, final_quantity = _final_price_and_quantity(order, item)
+        diff = final_quantity - order.quantity
+        if stock[product.id] < diff:
+            fail("update", index, "库存不足", item.id)
+            continue
+        stock[product.id] -= diff
+        movements[product.id].append((-diff, "order_update", order))
+        last_price[product.id] = final_price
+        sales[product.id].add(order, -1)
+        rollup.merge_delta(merged, rollup.order_key(order), rollup.order_values(order, product), sign=-1)
+        _apply_order_update(order, product, item)
+        sales[product.id].add(order)
+        rollup.merge_delta(merged, rollup.order_key(order), rollup.order_values(order, product))
+        updated.append((index, order))
+        results["update", index] = schemas.OrderBatchItem(action="update", index=index, ok=True, order_id=item.id)
+
+    for index, item in enumerate(batch.create):
+        product = by_sku.get(item.product_sku)
+        if product is None:
+            fail("create", index, "不存在该商品")
+            continue
+        if stock[product.id] < item.quantity:
+            fail("create", index, "库存不足")
+            continue
+        stock[product.id] -= item.quantity
+        last_price[product.id] = Decimal(str(item.actual_price))
+        pending.append((index, item, product))
+        results["create", index] = schemas.OrderBatchItem(action="create", index=index, ok=True)
+
+    def ordered_results() -> list[schemas.OrderBatchItem]:
+        return [results[key] for key in sorted(results, key=lambda k: (_BATCH_ACTIONS.index(k[0]), k[1]))]
+
+    if batch.mode == "all_or_nothing" and any(not item.ok for item in results.values()):
+        db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail=schemas.OrderBatchResult(committed=False, results=ordered_results()).model_dump(mode="json"),
+        )
+
+    now = datetime.utcnow()
+    created: list[tuple[int, models.Order]] = []
+    for index, item, product in pending:
+        order = _order_from_payload(item, product, None, now)
+        movements[product.id].append((-item.quantity, "order_create", order))
+        sales[product.id].add(order)
+        rollup.merge_delta(merged, rollup.order_key(order), rollup.order_values(order, product))
+        created.append((index, order))
+
+    # 每个商品一条条件 UPDATE：净库存变化 + 销售累计 + 最后一次订单的售价
+    for product_id, product in products.items():
+        delta = stock[product_id] - product.quantity
+        values = {"actual_price": last_price[product_id]} if product_id in last_price else {}
+        if delta or values or sales[product_id]:
+            _adjust_stock(db, product, delta, sales[product_id], **values)
+
+    # 每个商品一次分配本批新订单的全部订单号
+    counts = Counter(order.product_id for _, order in created)
+    numbers = {pid: iter(sequences.next_order_numbers(db, products[pid], n)) for pid, n in counts.items()}
+    for _, order in created:
+        order.order_number = next(numbers[order.product_id])
+        db.add(order)
+    # quantity_after 从加锁时的库存（最终库存减去本批净变化）依次累加
+    inventory.record_rows(db, [
+        row
+        for product_id, changes in movements.items()
+        for row in inventory.running_rows(
+            stock[product_id] - sum(delta for delta, _, _ in changes), product_id,
+            [(delta, reason, order.order_number) for delta, reason, order in changes],
+        )
+    ])
+    for order in deleted:
+        db.delete(order)
+    rollup.apply_merged(db, merged)
+    db.flush()
+
+    # flush 后 id 已分配、字段都在内存里：提交前补上订单内容，提交后不用再逐个刷新订单
+    for action, items in (("update", updated), ("create", created)):
+        for index, order in items:
+            results[action, index] = schemas.OrderBatchItem(
+                action=action, index=index, ok=True, order_id=order.id, order=schemas.OrderOut.model_validate(order),
+            )
+    db.commit()
+    if deleted or updated or created:
+        report_cache.invalidate()
+    return schemas.OrderBatchResult(committed=True, results=ordered_results())
+
+
+def _import_order_chunk(db: Session, chunk: list[schemas.OrderImport]) -> dict:
+    """导入一批订单（一个事务）
+
+    1. 两条查询预取本批涉及的商品（加行锁）和已存在的订单号
+    2. 在内存中逐行校验：订单号重复 -> 跳过；商品不存在 / 库存不足 -> 记错误
+    3. 计算利润，多行 INSERT 写订单和库存流水，按主键批量 UPDATE 商品库存和销售累计，合并后写日汇总表
+    """
+    skus = {o.product_sku for o in chunk}
+    numbers = {o.order_number for o in chunk}
+    products = {
+        p.sku: p
+        for p in db.execute(
+            select(models.Product).where(models.Product.sku.in_(skus)).with_for_update()
+        ).scalars()
+    }
+    existing = set(db.execute(
+        select(models.Order.order_number).where(models.Order.order_number.in_(numbers))
+    ).scalars())
+
+    stock = {p.id: p.quantity for p in products.values()}
+    last_price: dict[int, Decimal] = {}
+    sales: dict[int, product_sales.SalesDelta] = {}
+    rows: list[dict] = []
+    skipped = 0
+    errors: list[str] = []
+    now = datetime.utcnow()
+    for payload in chunk:
+        if payload.order_number in existing:
+            skipped += 1
+            continue
+        product = products.get(payload.product_sku)
+        if product is None:
+            errors.append(f"订单 {payload.order_number}: 不存在该商品")
+            continue
+        if stock[product.id] < payload.quantity:
+            errors.append(f"订单 {payload.order_number}: 库存不足")
+            continue
+        existing.add(payload.order_number)
+        stock[product.id] -= payload.quantity
+
+        actual_price = Decimal(str(payload.actual_price))
+        quantity = Decimal(payload.quantity)
+        last_price[product.id] = actual_price
+        rows.append({
+            "order_number": payload.order_number,
+            "created_at": now,
+            "transaction_date": payload.transaction_date,
+            "buyer_name": payload.buyer_name,
+            "actual_price": actual_price,
+            "quantity": payload.quantity,
+            "profit": actual_price * quantity - product.cost_price * quantity,
+            "payment_method": payload.payment_method,
+            "channel": payload.channel,
+            "status": payload.status,
+            "product_id": product.id,
+            "remark": payload.remark,
+        })
+        sales.setdefault(product.id, product_sales.SalesDelta()).add_row(rows[-1])
+
+    if rows:
+        db.execute(insert(models.Order), rows)
+        # 商品行已加锁，库存和销售累计直接按算好的新值批量写回
+        by_id = {p.id: p for p in products.values()}
+        db.execute(
+            update(models.Product),
+            [
+                {"id": pid, "quantity": stock[pid], "actual_price": price, **sales[pid].totals(by_id[pid])}
+                for pid, price in last_price.items()
+            ],
+        )
+        rollup.add_rows(db, rows, {p.id: p.cost_price for p in products.values()})
+        changes: dict[int, list[tuple[int, str, str]]] = {}
+        for row in rows:
+            changes.setdefault(row["product_id"], []).append((-row["quantity"], "order_import", row["order_number"]))
+        inventory.record_rows(db, [
+            movement
+            for pid, items in changes.items()
+            for movement in inventory.running_rows(stock[pid] - sum(delta for delta, _, _ in items), pid, items)
+        ])
+        sequences.bump_for_order_numbers(db, rows, {p.id: p.sku for p in products.values()})
+    db.commit()
+    return {"inserted": len(rows), "skipped": skipped, "errors": errors}
+
+
+def upsert_orders(db: Session, orders: Iterable[schemas.OrderImport], chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """批量导入订单
+
+    按 chunk_size 分批，每批一个事务、固定几条 SQL（见 _import_order_chunk），
+    不再逐行查询和提交。订单号已存在的跳过，商品不存在或库存不足的记录到 errors。
+    每批提交后立即让报表缓存失效（同 upsert_products）。
+    """
     inserted = 0
     skipped = 0
     errors = []
-    for payload in orders:
+    for chunk in _chunks(orders, chunk_size):
         try:
-            existing = get_order_by_number(db, payload.order_number)
-            if existing is not None:
-                skipped += 1
-                continue
-            create_order(db, payload)
-            inserted += 1
-        except ValueError as e:
-            errors.append(f"订单 {payload.order_number}: {str(e)}")
+            stats = _import_order_chunk(db, chunk)
+        except IntegrityError as e:
+            # 例如并发导入了相同订单号：整批回滚，记录错误后继续下一批
+            db.rollback()
+            errors.append(f"订单 {chunk[0].order_number} ~ {chunk[-1].order_number}: 批次写入失败 {e.orig}")
+            continue
+        if stats["inserted"]:
+            report_cache.invalidate()
+        inserted += stats["inserted"]
+        skipped += stats["skipped"]
+        errors.extend(stats["errors"])
     return {
         "inserted": inserted,
         "skipped": skipped,
         "errors": errors,
         "total_processed": inserted + skipped + len(errors)
     }
-from datetime import datetime
-from collections import defaultdict
-from . import models, schemas
-from datetime import datetime, timedelta
-def generate_comprehensive_report(db, filters: schemas.ReportFilters):
+# ==================== 报表聚合（SQL 端） ====================
+from sqlalchemy import cast, tuple_, desc, literal_column, Date, String, Float
+
+
+class _ReportSource:
+    """报表数据源
+
+    - 订单明细：orders JOIN products，逐单聚合
+    - 日汇总表：daily_sales_rollup JOIN products，按 (天, 渠道, 支付方式, 状态, 商品) 预聚合，
+      扫描量与订单数无关
+    两者对外暴露相同的列（channel / product 关联 / 日期列）和相同标签的聚合指标。
+    """
+
+    def __init__(self, use_rollup: bool):
+        self.use_rollup = use_rollup
+        if use_rollup:
+            table = models.DailySalesRollup
+            self.table = table
+            self.date_col = table.day
+            self.channel = table.channel
+            self.payment_method = table.payment_method
+            self.status = table.status
+            self.product_id = table.product_id
+            self.metrics = [
+                func.coalesce(func.sum(table.total_sales), 0).label("total_sales"),
+                func.coalesce(func.sum(table.total_cost), 0).label("total_cost"),
+                func.coalesce(func.sum(table.total_profit), 0).label("total_profit"),
+                func.coalesce(func.sum(table.order_count), 0).label("order_count"),
+                func.coalesce(func.sum(table.quantity), 0).label("quantity"),
+            ]
+        else:
+            table = models.Order
+            self.table = table
+            self.date_col = table.transaction_date
+            self.channel = table.channel
+            self.payment_method = table.payment_method
+            self.status = table.status
+            self.product_id = table.product_id
+            self.metrics = [
+                func.coalesce(func.sum(table.actual_price * table.quantity), 0).label("total_sales"),
+                func.coalesce(func.sum(models.Product.cost_price * table.quantity), 0).label("total_cost"),
+                func.coalesce(func.sum(table.profit), 0).label("total_profit"),
+                func.count(table.id).label("order_count"),
+                func.coalesce(func.sum(table.quantity), 0).label("quantity"),
+            ]
+
+    def dated(self):
+        """有交易日期的记录"""
+        if self.use_rollup:
+            return self.date_col != rollup.UNDATED_DAY
+        return self.date_col.is_not(None)
+
+    def conditions(self, filters: schemas.ReportFilters, joined_products: bool = True) -> list:
+        """把 ReportFilters 编译成 SQL WHERE 条件列表
+
+        joined_products=False 时查询里没有 JOIN products，SKU 条件改写成 product_id IN (子查询)。
+        """
+        conditions = []
+        if self.use_rollup:
+            # 日期筛选按整天进行，与明细表上的 [start 00:00, end 23:59:59.999999] 等价
+            if filters.start_date or filters.end_date:
+                conditions.append(self.dated())
+            if filters.start_date:
+                conditions.append(self.date_col >= filters.start_date)
+            if filters.end_date:
+                conditions.append(self.date_col <= filters.end_date)
+        else:
+            if filters.start_date:
+                conditions.append(self.date_col >= datetime.combine(filters.start_date, datetime.min.time()))
+            if filters.end_date:
+                conditions.append(self.date_col <= datetime.combine(filters.end_date, datetime.max.time()))
+        if filters.channels:
+            conditions.append(self.channel.in_(filters.channels))
+        if filters.payment_methods:
+            conditions.append(self.payment_method.in_(filters.payment_methods))
+        if filters.statuses:
+            conditions.append(self.status.in_(filters.statuses))
+        if filters.product_skus:
+            if joined_products:
+                conditions.append(models.Product.sku.in_(filters.product_skus))
+            else:
+                conditions.append(self.product_id.in_(
+                    select(models.Product.id).where(models.Product.sku.in_(filters.product_skus))
+                ))
+        return conditions
+
+
+def _report_source(filters: schemas.ReportFilters) -> _ReportSource:
+    """选择数据源：当前所有筛选维度都能在日汇总表上表达，启用汇总表时优先使用"""
+    return _ReportSource(use_rollup=rollup.REPORT_USE_ROLLUP)
+
+
+TIME_BUCKETS = ("day", "week", "month", "year")
+
+
+def _time_bucket(db: Session, source: _ReportSource, unit: str = "day"):
+    """按 day/week/month/year 截断日期列的 SQL 表达式，返回分组起始日期
+
+    PostgreSQL 用 date_trunc，其它方言（SQLite）用 date()/strftime()。
+    截断单位用 literal_column 内联，保证 SELECT 与 GROUP BY 中的表达式完全一致。
+    """
+    col = source.date_col
+    if db.get_bind().dialect.name == "postgresql":
+        if unit == "day":
+            return cast(col, Date)
+        return cast(func.date_trunc(literal_column(f"'{unit}'"), col), Date)
+    if unit == "week":
+        # 周一作为一周的开始（与 PostgreSQL date_trunc('week') 一致）
+        return func.date(col, literal_column("'weekday 0'"), literal_column("'-6 days'"))
+    if unit == "month":
+        return func.strftime(literal_column("'%Y-%m-01'"), col)
+    if unit == "year":
+        return func.strftime(literal_column("'%Y-01-01'"), col)
+    return func.date(col)
+
+
+def _report_select(source: _ReportSource, *columns, filters: schemas.ReportFilters):
+    """构造 数据源 JOIN products 的聚合查询，并应用筛选条件"""
+    return (
+        select(*columns, *source.metrics)
+        .select_from(source.table)
+        .join(models.Product, source.product_id == models.Product.id)
+        .where(*source.conditions(filters))
+    )
+
+
+def _margin(profit: float, sales: float) -> float:
+    """利润率 (%)"""
+    return (profit / sales * 100) if sales > 0 else 0
+
+
+def _bucket_label(value) -> str:
+    """把分桶值（date / datetime / str）统一成 ISO 日期字符串"""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)[:10]
+
+
+def _summary_from_row(row) -> schemas.SalesSummary:
+    total_sales = float(row.total_sales)
+    total_profit = float(row.total_profit)
+    return schemas.SalesSummary(
+        total_sales=total_sales,
+        total_cost=float(row.total_cost),
+        total_profit=total_profit,
+        total_orders=int(row.order_count),
+        total_quantity=int(row.quantity),
+        profit_margin=_margin(total_profit, total_sales),
+    )
+
+
+def _channel_from_row(row) -> schemas.ChannelStats:
+    total_sales = float(row.total_sales)
+    total_profit = float(row.total_profit)
+    return schemas.ChannelStats(
+        channel=row.channel,
+        total_sales=total_sales,
+        total_cost=float(row.total_cost),
+        total_profit=total_profit,
+        order_count=int(row.order_count),
+        profit_margin=_margin(total_profit, total_sales),
+    )
+
+
+def _product_from_row(row) -> schemas.ProductStats:
+    total_sales = float(row.total_sales)
+    total_profit = float(row.total_profit)
+    return schemas.ProductStats(
+        product_sku=row.sku,
+        product_name=row.name,
+        total_sales=total_sales,
+        total_cost=float(row.total_cost),
+        total_profit=total_profit,
+        quantity_sold=int(row.quantity),
+        order_count=int(row.order_count),
+        profit_margin=_margin(total_profit, total_sales),
+    )
+
+
+def _time_point_from_row(row) -> schemas.TimeSeriesData:
+    return schemas.TimeSeriesData(
+        date=_bucket_label(row.bucket),
+        total_sales=float(row.total_sales),
+        total_cost=float(row.total_cost),
+        total_profit=float(row.total_profit),
+        order_count=int(row.order_count),
+    )
+
+
+def _stats_to_time_point(label: str, stats) -> schemas.TimeSeriesData:
+    """把渠道/商品统计转成以渠道名/SKU 为分组键的时间序列点"""
+    return schemas.TimeSeriesData(
+        date=label,
+        total_sales=stats.total_sales,
+        total_cost=stats.total_cost,
+        total_profit=stats.total_profit,
+        order_count=stats.order_count,
+    )
+
+
+def _merge_time_points(label: str, points: list[schemas.TimeSeriesData]) -> schemas.TimeSeriesData:
+    """把多个点的指标相加，合并成一个点"""
+    return schemas.TimeSeriesData(
+        date=label,
+        total_sales=sum(p.total_sales for p in points),
+        total_cost=sum(p.total_cost for p in points),
+        total_profit=sum(p.total_profit for p in points),
+        order_count=sum(p.order_count for p in points),
+    )
+
+
+def _downsample_time_series(points: list[schemas.TimeSeriesData], filters: schemas.ReportFilters) -> list[schemas.TimeSeriesData]:
+    """按 max_points 降采样
+
+    - 时间分组：每 ceil(n / max_points) 个相邻分组合并为一个点，标签取第一个分组的日期
+    - channel/product 分组：保留销售额前 max_points - 1 个，其余合并为“其他”
+    """
+    max_points = filters.max_points
+    if not max_points or len(points) <= max_points:
+        return points
+    if filters.group_by in ("channel", "product"):
+        head, rest = points[:max_points - 1], points[max_points - 1:]
+        return head + [_merge_time_points("其他", rest)]
+    step = -(-len(points) // max_points)
+    return [
+        _merge_time_points(points[i].date, points[i:i + step])
+        for i in range(0, len(points), step)
+    ]
+
+
+def _sort_by_sales(items: list) -> list:
+    """按销售额降序排列（GROUPING SETS 结果无法逐组 ORDER BY，只能在取回后排序）"""
+    return sorted(items, key=lambda s: s.total_sales, reverse=True)
+
+
+def _report_grouping_sets(db: Session, filters: schemas.ReportFilters):
+    """PostgreSQL：用一条 GROUPING SETS 查询同时算出汇总 / 渠道 / 商品 / 时间分组结果
+
+    group_by 为 channel/product 时时间序列直接复用渠道/商品分组，不再额外加分组集。
+    """
+    source = _report_source(filters)
+    temporal = (filters.group_by or "day") in TIME_BUCKETS
+    bucket = _time_bucket(db, source, filters.group_by) if temporal else literal_column("NULL")
+    product_key = tuple_(models.Product.id, models.Product.sku, models.Product.name)
+    grouping_sets = [tuple_(), source.channel, product_key]
+    if temporal:
+        grouping_sets.append(bucket)
+    stmt = (
+        _report_select(
+            source,
+            func.grouping(source.channel).label("g_channel"),
+            func.grouping(models.Product.id).label("g_product"),
+            (func.grouping(bucket) if temporal else literal_column("1")).label("g_bucket"),
+            source.channel,
+            models.Product.sku,
+            models.Product.name,
+            bucket.label("bucket"),
+            filters=filters,
+        )
+        .group_by(func.grouping_sets(*grouping_sets))
+    )
+
+    summary_row = None
+    channel_rows, product_rows, bucket_rows = [], [], []
+    for row in db.execute(stmt):
+        if row.g_channel == 0:
+            channel_rows.append(row)
+        elif row.g_product == 0:
+            product_rows.append(row)
+        elif row.g_bucket == 0:
+            if row.bucket is not None and row.bucket != rollup.UNDATED_DAY:
+                bucket_rows.append(row)
+        else:
+            summary_row = row
+    return summary_row, channel_rows, product_rows, bucket_rows
+
+
+def generate_comprehensive_report(db: Session, filters: schemas.ReportFilters) -> schemas.ReportResponse:
     """
     生成综合报表
     - 汇总统计
     - 渠道统计
     - 商品统计
     - 时间序列统计
+
+    所有聚合都在数据库里完成（SUM / COUNT + GROUP BY），
+    只把分组结果取回 Python，内存占用与订单数量无关。
+    启用日汇总表时从 daily_sales_rollup 读取，扫描量与订单数无关。
     """
+    if db.get_bind().dialect.name == "postgresql":
+        summary_row, channel_rows, product_rows, bucket_rows = _report_grouping_sets(db, filters)
+        summary = _summary_from_row(summary_row)
+        channel_stats = _sort_by_sales([_channel_from_row(r) for r in channel_rows])
+        product_stats = _sort_by_sales([_product_from_row(r) for r in product_rows])
+        if filters.group_by == "channel":
+            time_series = [_stats_to_time_point(s.channel.value, s) for s in channel_stats]
+        elif filters.group_by == "product":
+            time_series = [_stats_to_time_point(s.product_sku, s) for s in product_stats]
+        else:
+            time_series = sorted((_time_point_from_row(r) for r in bucket_rows), key=lambda t: t.date)
+        time_series = _downsample_time_series(time_series, filters)
+    else:
+        summary = calculate_sales_summary(db, filters)
+        channel_stats = calculate_channel_stats(db, filters)
+        product_stats = calculate_product_stats(db, filters)
+        time_series = calculate_time_series(db, filters)
+
+    return schemas.ReportResponse(
+        summary=summary,
+        channel_stats=channel_stats,
+        product_stats=product_stats,
+        time_series=time_series,
+        filters_applied=filters,
+        generated_at=datetime.utcnow(),
+    )
 
-    query = db.query(models.Order).join(models.Product, models.Order.product_id == models.Product.id)
-
-    # ===== 应用筛选条件 =====
-    if filters.start_date:
-        start_datetime = datetime.combine(filters.start_date, datetime.min.time())
-        query = query.filter(models.Order.transaction_date >= start_datetime)
-    if filters.end_date:
-        end_datetime = datetime.combine(filters.end_date, datetime.max.time())
-        query = query.filter(models.Order.transaction_date <= end_datetime)
-    if filters.channels and len(filters.channels) > 0:
-        query = query.filter(models.Order.channel.in_(filters.channels))
-    if filters.payment_methods and len(filters.payment_methods) > 0:
-        query = query.filter(models.Order.payment_method.in_(filters.payment_methods))
-    if filters.statuses and len(filters.statuses) > 0:
-        query = query.filter(models.Order.status.in_(filters.statuses))
-    if filters.product_skus and len(filters.product_skus) > 0:
-        query = query.filter(models.Product.sku.in_(filters.product_skus))   # ✅ 改成从 Product 表里筛 SKU
-    # ✅ 调试输出
-    from sqlalchemy.dialects import postgresql
-    print("Filters Debug:", filters.start_date, filters.end_date)
-    compiled = query.statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
-    print("Generated SQL:", compiled)
-
-    orders = query.all()
-
-    # ===== 汇总统计 =====
-    total_sales = sum(float(o.actual_price) * o.quantity for o in orders)
-    total_cost = sum(float(o.product.cost_price) * o.quantity for o in orders if o.product)
-    total_profit = sum(float(o.profit) for o in orders)
-    total_orders = len(orders)
-    total_quantity = sum(o.quantity for o in orders)
-    profit_margin = (total_profit / total_sales * 100) if total_sales > 0 else 0
 
-    summary = schemas.SalesSummary(
-        total_sales=total_sales,
-        total_cost=total_cost,
-        total_profit=total_profit,
-        total_orders=total_orders,
-        total_quantity=total_quantity,
-        profit_margin=profit_margin,
+def calculate_sales_summary(db: Session, filters: schemas.ReportFilters) -> schemas.SalesSummary:
+    """销售汇总：一条不分组的聚合查询"""
+    source = _report_source(filters)
+    return _summary_from_row(db.execute(_report_select(source, filters=filters)).one())
+
+
+def calculate_channel_stats(db: Session, filters: schemas.ReportFilters) -> list[schemas.ChannelStats]:
+    """渠道统计：按渠道 GROUP BY，在数据库中按销售额降序排列"""
+    source = _report_source(filters)
+    stmt = (
+        _report_select(source, source.channel, filters=filters)
+        .group_by(source.channel)
+        .order_by(desc("total_sales"))
+    )
+    return [_channel_from_row(r) for r in db.execute(stmt)]
+
+
+def calculate_product_stats(db: Session, filters: schemas.ReportFilters) -> list[schemas.ProductStats]:
+    """商品统计：按商品 GROUP BY，在数据库中按销售额降序排列"""
+    source = _report_source(filters)
+    stmt = (
+        _report_select(source, models.Product.sku, models.Product.name, filters=filters)
+        .group_by(models.Product.id, models.Product.sku, models.Product.name)
+        .order_by(desc("total_sales"), models.Product.sku)
     )
+    return [_product_from_row(r) for r in db.execute(stmt)]
+
 
-    # ===== 渠道统计 =====
-    channel_stats_dict = defaultdict(lambda: {
-        "total_sales": 0.0,
-        "total_cost": 0.0,
-        "total_profit": 0.0,
-        "order_count": 0,
-        "quantity": 0,
-    })
-
-    for o in orders:
-        cs = channel_stats_dict[o.channel]
-        cs["total_sales"] += float(o.actual_price) * o.quantity
-        cs["total_cost"] += float(o.product.cost_price) * o.quantity if o.product else 0
-        cs["total_profit"] += float(o.profit)
-        cs["order_count"] += 1
-        cs["quantity"] += o.quantity
-
-    channel_stats = [
-        schemas.ChannelStats(
-            channel=channel,
-            total_sales=data["total_sales"],
-            total_cost=data["total_cost"],
-            total_profit=data["total_profit"],
-            order_count=data["order_count"],
-            profit_margin=(data["total_profit"] / data["total_sales"] * 100) if data["total_sales"] > 0 else 0,
+def calculate_time_series(db: Session, filters: schemas.ReportFilters) -> list[schemas.TimeSeriesData]:
+    """时间序列：按 filters.group_by 分组
+
+    - day/week/month/year：在数据库中按截断后的交易日期 GROUP BY（忽略没有交易日期的订单），按日期升序
+    - channel/product：复用渠道/商品统计，按销售额降序
+    - 设置了 max_points 时对结果做降采样
+    """
+    if filters.group_by == "channel":
+        points = [_stats_to_time_point(s.channel.value, s) for s in calculate_channel_stats(db, filters)]
+    elif filters.group_by == "product":
+        points = [_stats_to_time_point(s.product_sku, s) for s in calculate_product_stats(db, filters)]
+    else:
+        source = _report_source(filters)
+        bucket = _time_bucket(db, source, filters.group_by or "day")
+        stmt = (
+            _report_select(source, bucket.label("bucket"), filters=filters)
+            .where(source.dated())
+            .group_by(bucket)
+            .order_by(bucket)
         )
-        for channel, data in channel_stats_dict.items()
-    ]
+        points = [_time_point_from_row(r) for r in db.execute(stmt)]
+    return _downsample_time_series(points, filters)
+
+
+# ==================== 商品分析：Top-N / ABC / 售价分位数 ====================
+
+# Top-N 可选的排序指标 -> 合计列
+TOP_PRODUCT_METRICS = {"profit": "total_profit", "sales": "total_sales", "quantity": "quantity"}
+MAX_TOP_PRODUCTS = 100
+
+# 售价分位数（分子, 分母），用整数运算定位名次
+PRICE_QUANTILES = {"median_price": (1, 2), "p90_price": (9, 10)}
+# 插值后的售价保留的小数位（去掉 double 计算的尾差）
+PRICE_DIGITS = 4
+
+
+def _product_totals(source: _ReportSource, filters: schemas.ReportFilters):
+    """按商品合计的聚合查询（列同 calculate_product_stats），数据源可以是日汇总表"""
+    return (
+        _report_select(source, models.Product.sku, models.Product.name, filters=filters)
+        .group_by(models.Product.id, models.Product.sku, models.Product.name)
+    )
+
+
+def calculate_top_products(db: Session, filters: schemas.ReportFilters, limit: int = 10,
+                           metric: str = "profit") -> list[schemas.ProductStats]:
+    """按利润（或销售额/销量）排名前 limit 的商品
+
+    ORDER BY ... LIMIT 在数据库里完成，PostgreSQL 对它用 top-N 堆排序，只保留 limit 行。
+    """
+    if metric not in TOP_PRODUCT_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of: {', '.join(TOP_PRODUCT_METRICS)}")
+    limit = max(1, min(limit, MAX_TOP_PRODUCTS))
+    stmt = (
+        _product_totals(_report_source(filters), filters)
+        .order_by(desc(TOP_PRODUCT_METRICS[metric]), models.Product.sku)
+        .limit(limit)
+    )
+    return [_product_from_row(r) for r in db.execute(stmt)]
+
+
+def calculate_abc_classes(db: Session, filters: schemas.ReportFilters, a_share: float = 80,
+                          b_share: float = 95) -> list[schemas.ProductABC]:
+    """商品 ABC 分类（按销售额）
 
-    # ===== 商品统计 =====
-    product_stats_dict = defaultdict(lambda: {
-        "product_name": "",
-        "total_sales": 0.0,
-        "total_cost": 0.0,
-        "total_profit": 0.0,
-        "quantity_sold": 0,
-        "order_count": 0,
-    })
-
-    for o in orders:
-        sku = o.product.sku if o.product else "未知SKU"   # ✅ 从 Product 拿 SKU
-        ps = product_stats_dict[sku]
-        ps["product_name"] = o.product.name if o.product else "未知商品"
-        ps["total_sales"] += float(o.actual_price) * o.quantity
-        ps["total_cost"] += float(o.product.cost_price) * o.quantity if o.product else 0
-        ps["total_profit"] += float(o.profit)
-        ps["quantity_sold"] += o.quantity
-        ps["order_count"] += 1
-
-    product_stats = [
-        schemas.ProductStats(
-            product_sku=sku,
-            product_name=data["product_name"],
-            total_sales=data["total_sales"],
-            total_cost=data["total_cost"],
-            total_profit=data["total_profit"],
-            quantity_sold=data["quantity_sold"],
-            order_count=data["order_count"],
-            profit_margin=(data["total_profit"] / data["total_sales"] * 100) if data["total_sales"] > 0 else 0,
+    窗口函数在数据库里算累计销售额：SUM(total_sales) OVER (ORDER BY total_sales DESC ROWS UNBOUNDED PRECEDING)，
+    总额用 SUM(...) OVER ()。累加到该商品之前的占比还不到 a_share% 的为 A 类（跨过 80% 的那个商品也算 A），
+    不到 b_share% 的为 B 类，其余和没有销售额的为 C 类。
+    """
+    if not 0 < a_share <= b_share <= 100:
+        raise HTTPException(status_code=400, detail="要求 0 < a_share <= b_share <= 100")
+    totals = _product_totals(_report_source(filters), filters).subquery()
+    order = (totals.c.total_sales.desc(), totals.c.sku)
+    stmt = select(
+        totals.c.sku,
+        totals.c.name,
+        totals.c.total_sales,
+        func.sum(totals.c.total_sales).over(order_by=order, rows=(None, 0)).label("cumulative"),
+        func.sum(totals.c.total_sales).over().label("grand_total"),
+    ).order_by(*order)
+
+    items = []
+    for row in db.execute(stmt):
+        total_sales = float(row.total_sales)
+        grand_total = float(row.grand_total)
+        cumulative = float(row.cumulative) / grand_total * 100 if grand_total > 0 else 0
+        share = total_sales / grand_total * 100 if grand_total > 0 else 0
+        before = cumulative - share
+        if total_sales <= 0:
+            abc_class = "C"
+        elif before < a_share:
+            abc_class = "A"
+        elif before < b_share:
+            abc_class = "B"
+        else:
+            abc_class = "C"
+        items.append(schemas.ProductABC(
+            product_sku=row.sku,
+            product_name=row.name,
+            total_sales=total_sales,
+            sales_share=share,
+            cumulative_share=cumulative,
+            abc_class=abc_class,
+        ))
+    return items
+
+
+def calculate_price_percentiles(db: Session, filters: schemas.ReportFilters) -> list[schemas.ProductPricePercentiles]:
+    """每个商品订单售价的中位数和 P90，按 SKU 排序
+
+    要用逐单售价，只能读 orders（日汇总表里没有）：
+    - PostgreSQL：percentile_cont(q) WITHIN GROUP (ORDER BY actual_price)，排序和取分位都在数据库里完成
+    - 其它方言：没有 percentile_cont，用报表计算核心算（calculate_exact_price_percentiles）
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return calculate_exact_price_percentiles(db, filters)
+
+    source = _ReportSource(use_rollup=False)
+    o, p = models.Order, models.Product
+    price = cast(o.actual_price, Float)  # percentile_cont 按 double 计算，不要再按 Numeric(12, 2) 截断
+    stmt = (
+        select(
+            p.sku, p.name, func.count(o.id).label("order_count"),
+            *(func.percentile_cont(n / d).within_group(price).label(name)
+              for name, (n, d) in PRICE_QUANTILES.items()),
+        )
+        .join(p, p.id == o.product_id)
+        .where(*source.conditions(filters, joined_products=False))
+        .group_by(p.id, p.sku, p.name)
+        .order_by(p.sku)
+    )
+    return [
+        schemas.ProductPricePercentiles(
+            product_sku=row.sku, product_name=row.name, order_count=row.order_count,
+            **{name: round(row._mapping[name], PRICE_DIGITS) for name in PRICE_QUANTILES},
         )
-        for sku, data in product_stats_dict.items()
+        for row in db.execute(stmt)
     ]
 
-    # ===== 时间序列统计（按天） =====
-    time_series_dict = defaultdict(lambda: {
-        "total_sales": 0.0,
-        "total_cost": 0.0,
-        "total_profit": 0.0,
-        "order_count": 0,
-    })
-
-    for o in orders:
-        if o.transaction_date:
-            day = o.transaction_date.date().isoformat()
-            ts = time_series_dict[day]
-            ts["total_sales"] += float(o.actual_price) * o.quantity
-            ts["total_cost"] += float(o.product.cost_price) * o.quantity if o.product else 0
-            ts["total_profit"] += float(o.profit)
-            ts["order_count"] += 1
-
-    time_series = [
-        schemas.TimeSeriesData(
-            date=day,
-            total_sales=data["total_sales"],
-            total_cost=data["total_cost"],
-            total_profit=data["total_profit"],
-            order_count=data["order_count"],
+
+def calculate_exact_price_percentiles(db: Session,
+                                      filters: schemas.ReportFilters) -> list[schemas.ProductPricePercentiles]:
+    """售价分位数的精确计算版本：按列取回 (商品, 售价分)，report_core.quantiles 一次排序后按商品插值
+
+    金额是整数分、插值用 Decimal，结果与 percentile_cont 一致；report_core check 用它核对 PostgreSQL 的结果。
+    """
+    source = _ReportSource(use_rollup=False)
+    o, p = models.Order, models.Product
+    table = report_core.load(
+        db,
+        select(o.product_id, report_core.cents(o.actual_price)).where(*source.conditions(filters, joined_products=False)),
+        report_core.PRICE_SCHEMA,
+    )
+    quantiles = report_core.quantiles(
+        table, "product_id", "price_cents", [Decimal(n) / Decimal(d) for n, d in PRICE_QUANTILES.values()],
+    )
+    counts = table.group_by("product_id", use_threads=False).aggregate([("price_cents", "count")]).to_pydict()
+    counts = dict(zip(counts["product_id"], counts["price_cents_count"]))
+    products = db.execute(select(p.id, p.sku, p.name).where(p.id.in_(list(quantiles))).order_by(p.sku))
+    return [
+        schemas.ProductPricePercentiles(
+            product_sku=row.sku, product_name=row.name, order_count=counts[row.id],
+            **{name: round(float(report_core.to_decimal(value)), PRICE_DIGITS)
+               for name, value in zip(PRICE_QUANTILES, quantiles[row.id])},
         )
-        for day, data in sorted(time_series_dict.items())
+        for row in products
     ]
 
-    # ===== 最终响应 =====
+
+# ==================== 报表计算核心（精确定点） ====================
+
+def report_orders_query(db: Session, filters: schemas.ReportFilters, unit: str = "day"):
+    """report_core 用的订单列（直接读 orders），金额换算成整数分，列顺序与 report_core.ORDER_SCHEMA 一致"""
+    source = _ReportSource(use_rollup=False)
+    o, p = models.Order, models.Product
+    return (
+        select(
+            o.product_id,
+            cast(o.channel, String),
+            cast(_time_bucket(db, source, unit), String),
+            o.quantity,
+            report_core.cents(o.actual_price),
+            report_core.cents(p.cost_price),
+            report_core.cents(o.profit),
+        )
+        .join(p, p.id == o.product_id)
+        .where(*source.conditions(filters))
+    )
+
+
+def _exact_amounts(row: dict) -> dict:
+    """report_core 合计行（整数分）-> 报表里的金额字段和利润率"""
+    return {
+        "total_sales": float(report_core.to_decimal(row["total_sales"])),
+        "total_cost": float(report_core.to_decimal(row["total_cost"])),
+        "total_profit": float(report_core.to_decimal(row["total_profit"])),
+        "profit_margin": float(report_core.margin(row["total_profit"], row["total_sales"])),
+    }
+
+
+def generate_exact_report(db: Session, filters: schemas.ReportFilters) -> schemas.ReportResponse:
+    """综合报表的精确计算版本
+
+    按列取回订单（金额为整数分），一次向量化 group_by 按 (渠道, 商品, 时间分组) 合计，
+    汇总/渠道/商品/时间序列都从这个结果再合计；金额全程是整数运算，只在输出时转成 float。
+    结果与 generate_comprehensive_report 一致，用于核对，也是 SQL 表达不了的指标的计算基础。
+    """
+    temporal = (filters.group_by or "day") in TIME_BUCKETS
+    table = report_core.load(db, report_orders_query(db, filters, filters.group_by if temporal else "day"))
+    totals = report_core.group_totals(table, ["channel", "product_id", "bucket"])
+
+    row = report_core.regroup(totals, []).to_pylist()[0]
+    summary = schemas.SalesSummary(
+        **_exact_amounts(row), total_orders=row["order_count"], total_quantity=row["quantity"],
+    )
+    channel_stats = _sort_by_sales([
+        schemas.ChannelStats(channel=models.Channel[row["channel"]], **_exact_amounts(row),
+                             order_count=row["order_count"])
+        for row in report_core.regroup(totals, ["channel"]).to_pylist()
+    ])
+
+    product_rows = report_core.regroup(totals, ["product_id"]).to_pylist()
+    products = {
+        p.id: p
+        for p in db.execute(
+            select(models.Product.id, models.Product.sku, models.Product.name)
+            .where(models.Product.id.in_([row["product_id"] for row in product_rows]))
+        )
+    }
+    product_stats = sorted(
+        (
+            schemas.ProductStats(
+                product_sku=products[row["product_id"]].sku, product_name=products[row["product_id"]].name,
+                **_exact_amounts(row), quantity_sold=row["quantity"], order_count=row["order_count"],
+            )
+            for row in product_rows
+        ),
+        key=lambda s: (-s.total_sales, s.product_sku),
+    )
+
+    if filters.group_by == "channel":
+        time_series = [_stats_to_time_point(s.channel.value, s) for s in channel_stats]
+    elif filters.group_by == "product":
+        time_series = [_stats_to_time_point(s.product_sku, s) for s in product_stats]
+    else:
+        time_series = sorted(
+            (
+                schemas.TimeSeriesData(date=row["bucket"], order_count=row["order_count"], **{
+                    name: value for name, value in _exact_amounts(row).items() if name != "profit_margin"
+                })
+                for row in report_core.regroup(totals, ["bucket"]).to_pylist()
+                if row["bucket"] is not None
+            ),
+            key=lambda t: t.date,
+        )
+
     return schemas.ReportResponse(
         summary=summary,
         channel_stats=channel_stats,
         product_stats=product_stats,
-        time_series=time_series,
+        time_series=_downsample_time_series(time_series, filters),
         filters_applied=filters,
         generated_at=datetime.utcnow(),
     )
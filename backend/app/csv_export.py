@@ -0,0 +1,86 @@
+"""CSV 导出的流式生成
+
+导出接口返回一个生成器：先立即产出表头，再用服务端游标（yield_per，PostgreSQL 上是
+psycopg2 的命名游标）按批读取查询结果，每批写成一段 CSV 交给 StreamingResponse。
+内存里只有当前这一批数据，导出一百万条订单和导出一百条占用的内存相同。
+
+可选 gzip：每批压缩后用 Z_SYNC_FLUSH 刷出，客户端收到的每一段都能立即解压。
+
+生成器在响应开始发送后才运行，此时请求的 get_db 会话已经关闭，所以这里自己打开会话。
+"""
+import csv
+import enum
+import io
+import os
+import zlib
+from typing import Iterator, Sequence
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+
+from .database import SessionLocal
+
+# 每次从游标取回、写成一段 CSV 的行数
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+PRODUCT_EXPORT_HEADERS = ["sku", "name", "cost_price", "quantity", "preset_price", "actual_price"]
+ORDER_EXPORT_HEADERS = [
+    "order_number", "transaction_date", "buyer_name", "product_sku", "product_name", "quantity",
+    "actual_price", "profit", "payment_method", "channel", "status", "remark",
+]
+
+
+def _csv_value(value):
+    """枚举写成取值（"eBay" 而不是 "Channel.ebay"），与导入时的格式一致"""
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+def iter_row_batches(stmt: Select, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Sequence]:
+    """用服务端游标执行查询，每次产出 batch_size 行"""
+    with SessionLocal() as db:
+        result = db.execute(stmt.execution_options(yield_per=batch_size))
+        yield from result.partitions()
+
+
+def iter_csv(stmt: Select, headers: Sequence[str], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """逐批产出 CSV 文本：第一段是表头，之后每 batch_size 行一段
+
+    stmt 的列顺序必须与 headers 一致。
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take() -> str:
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writerow(headers)
+    yield take()
+
+    for rows in iter_row_batches(stmt, batch_size):
+        writer.writerows([_csv_value(v) for v in row] for row in rows)
+        yield take()
+
+
+def gzip_chunks(chunks: Iterator[str]) -> Iterator[bytes]:
+    """把文本段压缩成 gzip 流，每段都刷出，不等整个文件"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_response(stmt: Select, headers: Sequence[str], filename: str, gzip: bool = False) -> StreamingResponse:
+    """包装成下载响应；gzip=True 时返回 <filename>.gz"""
+    chunks = iter_csv(stmt, headers)
+    if gzip:
+        return StreamingResponse(gzip_chunks(chunks), media_type="application/gzip", headers={
+            "Content-Disposition": f"attachment; filename={filename}.gz"
+        })
+    return StreamingResponse((chunk.encode("utf-8") for chunk in chunks), media_type="text/csv", headers={
+        "Content-Disposition": f"attachment; filename={filename}"
+    })
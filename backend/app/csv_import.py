@@ -0,0 +1,99 @@
+"""CSV 上传的流式解析
+
+上传文件按行增量解码（TextIOWrapper），逐行解析为 pydantic 模型并以生成器的形式交给
+crud 的批量写入函数，由写入端按批消费。整个导入过程中内存里只有当前这一批数据，
+峰值内存取决于批大小而不是文件大小。解析失败的行记录行号后跳过，不中断导入。
+"""
+import csv
+import io
+from datetime import datetime
+from typing import Callable, Iterator
+
+from fastapi import HTTPException, UploadFile
+
+from . import schemas
+
+PRODUCT_REQUIRED_HEADERS = {"sku", "name", "cost_price", "quantity"}
+ORDER_REQUIRED_HEADERS = {"order_number", "product_sku", "actual_price", "quantity", "payment_method", "channel", "status"}
+
+
+def _cell(row: dict, name: str) -> str:
+    """取单元格并去掉首尾空白（缺列时返回空字符串）"""
+    return (row.get(name) or "").strip()
+
+
+def parse_product_row(row: dict) -> schemas.ProductCreate:
+    """CSV 行 -> ProductCreate"""
+    return schemas.ProductCreate(
+        sku=_cell(row, "sku"),
+        name=_cell(row, "name"),
+        cost_price=float(_cell(row, "cost_price") or 0),
+        quantity=int(_cell(row, "quantity") or 0),
+        preset_price=float(_cell(row, "preset_price")) if _cell(row, "preset_price") else None,
+        actual_price=float(_cell(row, "actual_price")) if _cell(row, "actual_price") else None,
+    )
+
+
+def parse_transaction_date(value: str) -> datetime | None:
+    """解析交易日期：ISO 格式优先，再尝试几种常见格式"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        pass
+    for fmt in ["%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y"]:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date format: {value}")
+
+
+def parse_order_row(row: dict) -> schemas.OrderImport:
+    """CSV 行 -> OrderImport"""
+    return schemas.OrderImport(
+        order_number=_cell(row, "order_number"),
+        transaction_date=parse_transaction_date(_cell(row, "transaction_date")),
+        buyer_name=_cell(row, "buyer_name") or None,
+        actual_price=float(_cell(row, "actual_price") or 0),
+        quantity=int(_cell(row, "quantity") or 1),
+        payment_method=_cell(row, "payment_method").lower(),
+        channel=_cell(row, "channel"),
+        status=_cell(row, "status").lower(),
+        product_sku=_cell(row, "product_sku"),
+        remark=_cell(row, "remark") or None,
+    )
+
+
+class CsvRowStream:
+    """逐行读取上传的 CSV，产出解析成功的模型
+
+    - total：已读取的数据行数
+    - errors：解析失败的行（"Row N invalid: ..."，N 从 2 开始，第 1 行是表头）
+    """
+
+    def __init__(self, file: UploadFile, required: set[str], parse_row: Callable[[dict], object]):
+        if not file.filename.lower().endswith(".csv"):
+            raise HTTPException(status_code=400, detail="Only CSV files are supported")
+        self._text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+        self._reader = csv.DictReader(self._text)
+        self._reader.fieldnames = [h.strip() for h in self._reader.fieldnames or []]
+        missing = required - set(self._reader.fieldnames)
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Missing required headers: {', '.join(sorted(missing))}")
+        self._parse_row = parse_row
+        self.total = 0
+        self.errors: list[str] = []
+
+    def __iter__(self) -> Iterator:
+        try:
+            for row_index, row in enumerate(self._reader, start=2):
+                self.total += 1
+                try:
+                    yield self._parse_row(row)
+                except Exception as e:
+                    self.errors.append(f"Row {row_index} invalid: {e}")
+        finally:
+            # 只释放解码器，底层上传文件由 FastAPI 负责关闭
+            self._text.detach()
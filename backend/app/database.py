@@ -1,24 +1,103 @@
-import os
-from sqlalchemy import create_engine
+from datetime import date
+from typing import Optional
+from uuid import uuid4
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import NullPool
+from starlette.concurrency import run_in_threadpool
+
+
+class DatabaseSettings(BaseSettings):
+    """数据库连接配置，全部来自环境变量（DB_ 前缀，例如 DB_POOL_SIZE=20）"""
+
+    model_config = SettingsConfigDict(env_prefix="DB_")
+
+    # 优先使用 Render 提供的 DATABASE_URL，没有时用下面几项拼出 docker-compose 的配置
+    url: Optional[str] = Field(default=None, validation_alias="DATABASE_URL")
+    user: str = "ecom_user"
+    password: str = "ecom_pass"
+    host: str = "localhost"
+    port: int = 5432
+    name: str = "ecommerce"
+
+    # 连接池：常驻连接数、高峰时额外允许的连接数、等连接的超时（秒）、连接最长使用时间（秒，-1 不回收）
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_recycle: int = -1
+    # 每次取连接前先 ping 一次（多一个往返）；有 pool_recycle 兜底时可以关掉
+    pool_pre_ping: bool = True
+
+    # 前面有 PgBouncer 之类的事务级连接池时打开：本地不再建池（NullPool），asyncpg 不缓存 prepared statement
+    transaction_pooler: bool = False
+
+    # 提交后是否让对象过期；关掉后 crud 提交完不再 refresh，每次写入少一个往返
+    expire_on_commit: bool = True
+
+    # 异步模式（见下方 DbRunner），ASYNC_DATABASE_URL 不设置时由 DATABASE_URL 换驱动得到
+    use_async: bool = Field(default=False, validation_alias="DB_ASYNC")
+    async_url: Optional[str] = Field(default=None, validation_alias="ASYNC_DATABASE_URL")
+
+    @property
+    def database_url(self) -> str:
+        return self.url or f"postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{self.name}"
+
+
+settings = DatabaseSettings()
+DATABASE_URL = settings.database_url
+
+
+def engine_options(settings: DatabaseSettings, url: str, async_driver: bool = False) -> dict:
+    """按配置生成 create_engine / create_async_engine 的连接池参数
+
+    SQLite（本地开发）沿用方言默认的连接池，连接池参数只对 PostgreSQL 生效。
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    if settings.transaction_pooler:
+        options = {"poolclass": NullPool}
+        if async_driver:
+            # 事务级连接池下同一会话的语句可能落到不同的后端连接上，不能依赖具名 prepared statement
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+        return options
+    return {
+        "pool_size": settings.pool_size,
+        "max_overflow": settings.max_overflow,
+        "pool_timeout": settings.pool_timeout,
+        "pool_recycle": settings.pool_recycle,
+        "pool_pre_ping": settings.pool_pre_ping,
+    }
+
+
+def create_db_engine(settings: DatabaseSettings):
+    """同步引擎（迁移、后台任务、导出，以及同步模式下的接口）"""
+    return create_engine(settings.database_url, **engine_options(settings, settings.database_url))
 
-# 优先使用 Render 提供的 DATABASE_URL
-DATABASE_URL = os.getenv("DATABASE_URL")
 
-# 如果本地开发没设置 DATABASE_URL，就 fallback 到 docker-compose 的配置
-if not DATABASE_URL:
-    DB_USER = os.getenv("DB_USER", "ecom_user")
-    DB_PASSWORD = os.getenv("DB_PASSWORD", "ecom_pass")
-    DB_HOST = os.getenv("DB_HOST", "localhost")
-    DB_PORT = os.getenv("DB_PORT", "5432")
-    DB_NAME = os.getenv("DB_NAME", "ecommerce")
+def pool_stats(engine) -> dict:
+    """连接池状态：池大小、空闲/借出的连接数、溢出连接数（NullPool 只有类名）"""
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__, "status": pool.status()}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
 
-    DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 # 创建数据库引擎
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+engine = create_db_engine(settings)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine, expire_on_commit=settings.expire_on_commit
+)
 Base = declarative_base()
 
 
@@ -29,3 +108,77 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# ==================== 异步模式 ====================
+# DB_ASYNC=1 时接口通过 AsyncSession 访问数据库（PostgreSQL 用 asyncpg，SQLite 用 aiosqlite），
+# 等待数据库时不占用线程池。迁移、后台任务和导出仍使用上面的同步引擎。
+DB_ASYNC = settings.use_async
+
+
+def async_database_url(url: str) -> str:
+    """同步驱动的连接串 -> 对应的异步驱动"""
+    for prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    _async_url = settings.async_url or async_database_url(DATABASE_URL)
+    async_engine = create_async_engine(_async_url, **engine_options(settings, _async_url, async_driver=True))
+    # 提交后不过期对象：响应序列化发生在会话之外，异步模式下不能再懒加载
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    if async_engine.dialect.name == "postgresql":
+        @event.listens_for(async_engine.sync_engine, "connect")
+        def _plain_date_codec(dbapi_connection, connection_record):
+            """asyncpg 默认把 date.min 收发为 -infinity，而 rollup.UNDATED_DAY 就是 date.min；
+            改成按普通日期收发，与 psycopg2 写入的数据保持一致"""
+            dbapi_connection.run_async(lambda conn: conn.set_type_codec(
+                "date", schema="pg_catalog", encoder=date.isoformat, decoder=date.fromisoformat, format="text",
+            ))
+
+
+class DbRunner:
+    """接口访问数据库的入口：await db.run(fn, *args) 在当前请求的会话里执行 fn(session, *args)
+
+    crud 只有一套同步实现，第一个参数是 Session：
+    - 同步模式：放到线程池里执行（与原来的 def 接口相同），返回前就在同一个线程里归还连接，
+      否则持有连接的请求要排队等线程、占着线程的请求又在等连接，并发高时会互相卡住
+    - 异步模式：AsyncSession.run_sync，crud 里的每次查询都变成 asyncpg 上的 await，
+      请求在等待数据库时不占线程，一个 worker 可以同时挂起大量请求
+
+    一个请求的数据库操作放在一次 run 里完成（同步模式下 run 结束后会话里的对象即被分离）。
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    def _run_and_release(self, fn, *args, **kwargs):
+        try:
+            return fn(self.session, *args, **kwargs)
+        finally:
+            self.session.close()
+
+    async def run(self, fn, *args, **kwargs):
+        if DB_ASYNC:
+            return await self.session.run_sync(fn, *args, **kwargs)
+        return await run_in_threadpool(self._run_and_release, fn, *args, **kwargs)
+
+
+async def get_db_runner():
+    """async 接口使用的依赖，按 DB_ASYNC 打开同步或异步会话"""
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as session:
+            yield DbRunner(session)
+    else:
+        yield DbRunner(SessionLocal())
@@ -0,0 +1,116 @@
+"""查看报表和列表查询的执行计划，确认走了哪些索引
+
+    python -m app.explain            # EXPLAIN（SQLite 为 EXPLAIN QUERY PLAN）
+    python -m app.explain --analyze  # PostgreSQL：EXPLAIN ANALYZE，实际执行一遍
+
+查询语句与 crud 里的实际查询用同样的方式构造，筛选条件取库里最近 30 天、
+第一个渠道和第一个商品，保证计划与线上请求一致。
+"""
+import sys
+from datetime import timedelta
+
+from sqlalchemy import desc, func, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from . import crud, models, schemas
+
+
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN <statement>，参数绑定与原查询相同"""
+
+    inherit_cache = False
+
+    def __init__(self, statement, analyze: bool = False):
+        self.statement = statement
+        self.analyze = analyze
+
+
+@compiles(_Explain)
+def _compile_explain(element, compiler, **kw):
+    prefix = "EXPLAIN ANALYZE " if element.analyze else "EXPLAIN "
+    return prefix + compiler.process(element.statement, **kw)
+
+
+@compiles(_Explain, "sqlite")
+def _compile_explain_sqlite(element, compiler, **kw):
+    return "EXPLAIN QUERY PLAN " + compiler.process(element.statement, **kw)
+
+
+def _sample_filters(db: Session) -> schemas.ReportFilters:
+    """最近 30 天 + 第一个渠道 + 第一个商品"""
+    latest = db.execute(select(func.max(models.Order.transaction_date))).scalar()
+    sku = db.execute(select(models.Product.sku).order_by(models.Product.id).limit(1)).scalar()
+    filters = schemas.ReportFilters(channels=[models.Channel.ebay], product_skus=[sku] if sku else None)
+    if latest is not None:
+        filters.start_date = (latest - timedelta(days=30)).date()
+        filters.end_date = latest.date()
+    return filters
+
+
+def report_queries(db: Session) -> list[tuple[str, object]]:
+    """(名称, 语句) 列表：订单列表、按商品查订单、各报表（明细表和日汇总表两种数据源）"""
+    filters = _sample_filters(db)
+    date_only = filters.model_copy(update={"channels": None, "product_skus": None})
+    sku_only = filters.model_copy(update={"start_date": None, "end_date": None, "channels": None})
+    orders = crud._ReportSource(use_rollup=False)
+    rollup = crud._ReportSource(use_rollup=True)
+    product_id = db.execute(select(models.Product.id).order_by(models.Product.id).limit(1)).scalar() or 0
+
+    def list_orders(f):
+        conditions = orders.conditions(f, joined_products=False) if f else []
+        stmt, _ = crud._keyset_select(models.Order, schemas.OrderOut, conditions, crud.DEFAULT_PAGE_SIZE, None, None)
+        return stmt
+
+    queries = [
+        ("orders list", list_orders(None)),
+        ("orders list: date range", list_orders(date_only)),
+        ("orders list: date range + channel", list_orders(filters.model_copy(update={"product_skus": None}))),
+        ("orders list: sku", list_orders(sku_only)),
+        ("orders by product", select(models.Order.id).where(models.Order.product_id == product_id)),
+    ]
+    for label, source in (("orders", orders), ("rollup", rollup)):
+        queries += [
+            (f"summary [{label}]", crud._report_select(source, filters=filters)),
+            (f"channels [{label}]", crud._report_select(source, source.channel, filters=date_only)
+                .group_by(source.channel).order_by(desc("total_sales"))),
+            (f"products [{label}]", crud._report_select(source, models.Product.sku, filters=date_only)
+                .group_by(models.Product.id, models.Product.sku).order_by(desc("total_sales"))),
+        ]
+        bucket = crud._time_bucket(db, source, "day").label("bucket")
+        queries.append((
+            f"timeseries by day [{label}]",
+            crud._report_select(source, bucket, filters=date_only).where(source.dated()).group_by(bucket).order_by(bucket),
+        ))
+    return queries
+
+
+def explain(db: Session, analyze: bool = False) -> list[tuple[str, list[str]]]:
+    """对每个查询执行 EXPLAIN，返回 (名称, 计划文本行)"""
+    analyze = analyze and db.get_bind().dialect.name == "postgresql"
+    plans = []
+    for name, stmt in report_queries(db):
+        rows = db.execute(_Explain(stmt, analyze=analyze)).all()
+        # PostgreSQL 每行一列计划文本；SQLite 的 QUERY PLAN 最后一列是说明
+        plans.append((name, [str(row[-1]) for row in rows]))
+    return plans
+
+
+def main(argv: list[str]) -> int:
+    """命令行入口"""
+    from .database import SessionLocal
+
+    if argv not in ([], ["--analyze"]):
+        print("usage: python -m app.explain [--analyze]")
+        return 2
+    with SessionLocal() as db:
+        for name, lines in explain(db, analyze=bool(argv)):
+            print(f"== {name}")
+            for line in lines:
+                print(f"   {line}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
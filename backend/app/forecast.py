@@ -0,0 +1,205 @@
+"""缺货预警与补货预测：按销售速度估算可售天数和补货点
+
+- 日销量序列取自日汇总表 daily_sales_rollup（最近 FORECAST_WINDOW_DAYS 天，按 (商品, 天) 合计）
+- 销售速度：日销量的指数平滑。展开后第 T 天的平滑值是
+      s_T = Σ α(1-α)^k · x_(T-k)  +  (1-α)^W · s_0      （k 为距 as_of 的天数，s_0 取窗口内日均）
+  没有销量的天 x = 0，不用补齐，只对有销量的 (商品, 天) 行按天数算权重再分组求和
+- 可售天数 = 库存 / 销售速度；补货点 = 速度 × 到货周期 + 安全库存（z × 日销量标准差 × √到货周期）
+
+整个商品目录一次批量计算（pyarrow 向量化，没有逐商品循环），结果按 report_cache 的代数缓存：
+任何订单/商品写入都会让代数 +1，下一次请求才重新计算。每个 as_of 一张整目录的表，
+只保留最近用过的 FORECAST_CACHE_SIZE 个（LRU）。
+
+环境变量：
+- FORECAST_WINDOW_DAYS：取多少天的销量，默认 90
+- FORECAST_ALPHA：平滑系数，默认 0.1（越大越看重最近几天）
+- FORECAST_LEAD_TIME_DAYS：补货到货周期（天），默认 14
+- FORECAST_SERVICE_Z：安全库存系数，默认 1.65（约 95% 不缺货）
+- FORECAST_CACHE_SIZE：最多缓存几个 as_of 的结果，默认 8
+
+命令行（在 backend/ 目录下执行）：
+    python -m app.forecast [YYYY-MM-DD]   # 列出需要补货的商品（默认以今天为准）
+"""
+import math
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import String, cast, func, select
+from sqlalchemy.orm import Session
+
+from . import models, report_core, rollup, schemas
+from .cache import report_cache
+
+FORECAST_WINDOW_DAYS = int(os.getenv("FORECAST_WINDOW_DAYS", "90"))
+FORECAST_ALPHA = float(os.getenv("FORECAST_ALPHA", "0.1"))
+FORECAST_LEAD_TIME_DAYS = float(os.getenv("FORECAST_LEAD_TIME_DAYS", "14"))
+FORECAST_SERVICE_Z = float(os.getenv("FORECAST_SERVICE_Z", "1.65"))
+FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "8"))
+
+MAX_REORDER_ITEMS = 1000
+# 预计售罄日期只在这个天数以内给出；卖得极慢的商品可售天数可能上千万天，超出 date 的范围
+STOCKOUT_HORIZON_DAYS = 3650
+
+# 日期按 'YYYY-MM-DD' 字符串取回、在 pyarrow 里批量转成日期，省掉逐行构造 date 对象
+_DAILY_SCHEMA = pa.schema([
+    ("product_id", pa.int64()),
+    ("day", pa.string()),
+    ("quantity", pa.int64()),
+])
+_PRODUCT_SCHEMA = pa.schema([
+    ("product_id", pa.int64()),
+    ("sku", pa.string()),
+    ("name", pa.string()),
+    ("quantity", pa.int64()),
+])
+
+
+def _daily_quantities(db: Session, as_of: date, window: int) -> pa.Table:
+    """窗口内每个商品每天的销量（只有有销量的天）"""
+    r = models.DailySalesRollup
+    stmt = (
+        select(r.product_id, cast(r.day, String), func.sum(r.quantity))
+        .where(r.day > as_of - timedelta(days=window), r.day <= as_of, r.day != rollup.UNDATED_DAY)
+        .group_by(r.product_id, r.day)
+    )
+    daily = report_core.load(db, stmt, _DAILY_SCHEMA)
+    return daily.set_column(1, "day", pc.cast(daily["day"], pa.date32()))
+
+
+def _velocity(daily: pa.Table, as_of: date, window: int, alpha: float) -> pa.Table:
+    """按商品算平滑后的日销量（velocity）和日销量标准差（std）"""
+    age = pc.days_between(daily["day"], pa.scalar(as_of, pa.date32()))
+    quantity = pc.cast(daily["quantity"], pa.float64())
+    weight = pc.multiply(pc.power(1 - alpha, pc.cast(age, pa.float64())), alpha)
+    daily = pa.table({
+        "product_id": daily["product_id"],
+        "weighted": pc.multiply(quantity, weight),
+        "quantity": quantity,
+        "squared": pc.multiply(quantity, quantity),
+    })
+    grouped = daily.group_by(["product_id"], use_threads=False).aggregate([
+        ("weighted", "sum"), ("quantity", "sum"), ("squared", "sum"),
+    ])
+    mean = pc.divide(grouped["quantity_sum"], float(window))
+    velocity = pc.add(grouped["weighted_sum"], pc.multiply(mean, (1 - alpha) ** window))
+    variance = pc.subtract(pc.divide(grouped["squared_sum"], float(window)), pc.multiply(mean, mean))
+    std = pc.sqrt(pc.max_element_wise(variance, 0.0))
+    return pa.table({"product_id": grouped["product_id"], "velocity": velocity, "std": std})
+
+
+def compute_reorder_table(db: Session, as_of: date) -> pa.Table:
+    """整个商品目录的补货预测（一行一个商品），按紧急程度排序：需要补货的在前，可售天数少的在前"""
+    products = report_core.load(
+        db,
+        select(models.Product.id, models.Product.sku, models.Product.name, models.Product.quantity),
+        _PRODUCT_SCHEMA,
+    )
+    stats = _velocity(_daily_quantities(db, as_of, FORECAST_WINDOW_DAYS), as_of,
+                      FORECAST_WINDOW_DAYS, FORECAST_ALPHA)
+
+    # 没有销量的商品速度为 0
+    index = pc.index_in(products["product_id"], stats["product_id"])
+    velocity = pc.fill_null(pc.take(stats["velocity"], index), 0.0)
+    std = pc.fill_null(pc.take(stats["std"], index), 0.0)
+    stock = pc.cast(products["quantity"], pa.float64())
+
+    selling = pc.greater(velocity, 0.0)
+    # 速度为 0 的商品可售天数为空（不会卖完）
+    days_of_cover = pc.if_else(selling, pc.divide(stock, velocity), pa.scalar(None, pa.float64()))
+    reorder_point = pc.add(
+        pc.multiply(velocity, FORECAST_LEAD_TIME_DAYS),
+        pc.multiply(std, FORECAST_SERVICE_Z * math.sqrt(FORECAST_LEAD_TIME_DAYS)),
+    )
+    needs_reorder = pc.and_(selling, pc.less_equal(stock, reorder_point))
+
+    table = pa.table({
+        **{name: products[name] for name in ("sku", "name", "quantity")},
+        "velocity": velocity,
+        "days_of_cover": days_of_cover,
+        "reorder_point": reorder_point,
+        "needs_reorder": needs_reorder,
+    })
+    # 可售天数为空（没有销量）的排在最后
+    order = pc.sort_indices(
+        table.append_column("no_cover", pc.is_null(days_of_cover)),
+        sort_keys=[("needs_reorder", "descending"), ("no_cover", "ascending"),
+                   ("days_of_cover", "ascending"), ("sku", "ascending")],
+    )
+    return table.take(order)
+
+
+# {as_of: (代数, 结果表)}，按最近使用排序，超过 FORECAST_CACHE_SIZE 时淘汰最久没用的；
+# 代数变化（有写入）时整体作废
+_cache: "OrderedDict[date, tuple[int, pa.Table]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def reorder_table(db: Session, as_of: date) -> pa.Table:
+    """带缓存的 compute_reorder_table：同一代数内（期间没有写入）直接复用"""
+    # 代数在计算前读取：计算期间若有写入，结果记在旧代数下，下次请求会重新计算
+    generation = report_cache.backend.get_generation()
+    with _cache_lock:
+        cached = _cache.get(as_of)
+        if cached is not None and cached[0] == generation:
+            _cache.move_to_end(as_of)
+            return cached[1]
+    table = compute_reorder_table(db, as_of)
+    with _cache_lock:
+        if any(g != generation for g, _ in _cache.values()):
+            _cache.clear()
+        _cache[as_of] = (generation, table)
+        _cache.move_to_end(as_of)
+        while len(_cache) > FORECAST_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return table
+
+
+def reorder_items(db: Session, as_of: date | None = None, limit: int = 100,
+                  include_all: bool = False) -> list[schemas.ReorderItem]:
+    """补货建议：默认只返回需要补货的商品（库存不高于补货点），按可售天数升序，最多 limit 条"""
+    as_of = as_of or datetime.utcnow().date()
+    limit = max(1, min(limit, MAX_REORDER_ITEMS))
+    table = reorder_table(db, as_of)
+    if not include_all:
+        table = table.filter(table["needs_reorder"])
+    items = []
+    for row in table.slice(0, limit).to_pylist():
+        cover = row["days_of_cover"]
+        items.append(schemas.ReorderItem(
+            product_sku=row["sku"],
+            product_name=row["name"],
+            quantity=row["quantity"],
+            daily_velocity=row["velocity"],
+            days_of_cover=cover,
+            stockout_date=(as_of + timedelta(days=math.floor(cover))
+                           if cover is not None and cover <= STOCKOUT_HORIZON_DAYS else None),
+            reorder_point=row["reorder_point"],
+            needs_reorder=row["needs_reorder"],
+        ))
+    return items
+
+
+def main(argv: list[str]) -> int:
+    """命令行入口：打印需要补货的商品"""
+    from .database import SessionLocal
+
+    if len(argv) > 1:
+        print("usage: python -m app.forecast [YYYY-MM-DD]")
+        return 2
+    as_of = date.fromisoformat(argv[0]) if argv else None
+    with SessionLocal() as db:
+        items = reorder_items(db, as_of, limit=MAX_REORDER_ITEMS)
+    for item in items:
+        print(f"{item.product_sku:<16} stock {item.quantity:>6}  velocity {item.daily_velocity:>8.2f}/day  "
+              f"cover {item.days_of_cover:>7.1f} days  reorder point {item.reorder_point:>8.1f}")
+    print(f"{len(items)} products need reorder")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
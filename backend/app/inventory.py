@@ -0,0 +1,197 @@
+"""库存流水与快照：inventory_movements（只追加）/ inventory_snapshots
+
+- 每次库存变化（下单/改单/删单、批量、导入，新建/修改/导入商品）都在同一事务里追加一条流水，
+  记下变化量 delta、变化后的库存 quantity_after、原因 reason 和关联的订单号
+- 流水在商品行锁内写入（见 crud._adjust_stock），同一商品的流水 id 顺序就是库存变化的顺序
+- 快照（take_snapshot，定期执行）记下每个商品在某一时刻的库存和已包含的最后一条流水 id；
+  "X 时刻的库存" = X 之前最近的一次快照 + 快照之后、X 之前的流水变化量之和，只扫描一小段流水
+- check 在一致性读里对比 products.quantity 和流水，不加行锁，不影响下单
+
+REASONS：order_create / order_update / order_delete / order_import，
+product_create / product_update / product_import，opening（迁移时的期初库存），reconcile（对账调整）
+
+命令行（在 backend/ 目录下执行）：
+    python -m app.inventory snapshot    # 为有新流水的商品记一次快照（可用 cron 定期执行）
+    python -m app.inventory check       # 校验库存与流水是否一致
+    python -m app.inventory reconcile   # 不一致的商品追加一条 reconcile 流水，使流水与库存对齐
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+REASONS = (
+    "order_create", "order_update", "order_delete", "order_import",
+    "product_create", "product_update", "product_import", "opening", "reconcile",
+)
+
+
+def record(db: Session, product: models.Product, delta: int, reason: str,
+           order_number: str | None = None) -> None:
+    """追加一条流水（不提交）；调用时 product.quantity 已是变化后的库存，delta 为 0 时不记"""
+    if delta:
+        db.add(models.InventoryMovement(
+            product_id=product.id,
+            created_at=datetime.utcnow(),
+            delta=delta,
+            quantity_after=product.quantity,
+            reason=reason,
+            order_number=order_number,
+        ))
+
+
+def record_rows(db: Session, rows: list[dict]) -> None:
+    """批量追加流水（一条多行 INSERT），每行含 product_id / delta / quantity_after / reason / order_number"""
+    rows = [row for row in rows if row["delta"]]
+    if rows:
+        now = datetime.utcnow()
+        db.execute(insert(models.InventoryMovement), [{"created_at": now, "order_number": None, **row} for row in rows])
+
+
+def running_rows(start: int, product_id: int, changes: list[tuple[int, str, str | None]]) -> list[dict]:
+    """按顺序的一串 (delta, reason, order_number) -> 流水行，quantity_after 从 start 开始依次累加"""
+    rows = []
+    quantity = start
+    for delta, reason, order_number in changes:
+        quantity += delta
+        rows.append({
+            "product_id": product_id,
+            "delta": delta,
+            "quantity_after": quantity,
+            "reason": reason,
+            "order_number": order_number,
+        })
+    return rows
+
+
+def remove_product(db: Session, product_id: int) -> None:
+    """删除商品前清掉它的流水和快照（SQLite 默认不执行外键的 ON DELETE CASCADE）"""
+    db.execute(delete(models.InventorySnapshot).where(models.InventorySnapshot.product_id == product_id))
+    db.execute(delete(models.InventoryMovement).where(models.InventoryMovement.product_id == product_id))
+
+
+def _latest_movements(before: datetime | None = None):
+    """每个商品最后一条流水的 id（before 不为空时只看这个时刻及以前的流水）"""
+    m = models.InventoryMovement
+    stmt = select(func.max(m.id)).group_by(m.product_id)
+    if before is not None:
+        stmt = stmt.where(m.created_at <= before)
+    return stmt
+
+
+def take_snapshot(db: Session, taken_at: datetime | None = None) -> int:
+    """为快照之后有新流水的商品记一次快照（一条 INSERT ... SELECT），返回快照的商品数
+
+    快照的库存取自该商品 taken_at 及以前最后一条已提交流水的 quantity_after，不读也不锁 products；
+    快照时还没提交的流水 id 更大，之后按 id > movement_id 从流水里补上。
+    """
+    m, s = models.InventoryMovement, models.InventorySnapshot
+    taken_at = taken_at or datetime.utcnow()
+    last_snapshot = (
+        select(func.coalesce(func.max(s.movement_id), 0))
+        .where(s.product_id == m.product_id)
+        .scalar_subquery()
+    )
+    source = (
+        select(m.product_id, literal(taken_at), m.quantity_after, m.id)
+        .where(m.id.in_(_latest_movements(taken_at)), m.id > last_snapshot)
+    )
+    result = db.execute(
+        insert(s).from_select(["product_id", "taken_at", "quantity", "movement_id"], source)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def stock_at(db: Session, product_id: int, at: datetime | None = None) -> int:
+    """商品在 at 时刻之前（不含）的库存；at 为空时为全部流水之后的库存
+
+    取 at 之前最近的一次快照，再加上快照之后（id > movement_id）、at 之前的流水变化量。
+    """
+    m, s = models.InventoryMovement, models.InventorySnapshot
+    snapshot_stmt = select(s.quantity, s.movement_id).where(s.product_id == product_id)
+    if at is not None:
+        snapshot_stmt = snapshot_stmt.where(s.taken_at < at)
+    snapshot = db.execute(snapshot_stmt.order_by(s.taken_at.desc()).limit(1)).first()
+    quantity, movement_id = snapshot if snapshot is not None else (0, 0)
+
+    ledger_stmt = select(func.coalesce(func.sum(m.delta), 0)).where(m.product_id == product_id, m.id > movement_id)
+    if at is not None:
+        ledger_stmt = ledger_stmt.where(m.created_at < at)
+    return quantity + db.scalar(ledger_stmt)
+
+
+def _ledger_totals(db: Session, product_ids=None) -> dict[int, tuple[int, int]]:
+    """{商品 id: (流水变化量之和, 最后一条流水的 quantity_after)}"""
+    m = models.InventoryMovement
+    sums = select(m.product_id, func.sum(m.delta)).group_by(m.product_id)
+    latest = select(m.product_id, m.quantity_after).where(m.id.in_(_latest_movements()))
+    if product_ids is not None:
+        sums = sums.where(m.product_id.in_(product_ids))
+        latest = latest.where(m.product_id.in_(product_ids))
+    last = dict(db.execute(latest).all())
+    return {product_id: (int(total), last[product_id]) for product_id, total in db.execute(sums)}
+
+
+def check(db: Session) -> list[dict]:
+    """对比商品库存与流水（变化量之和、最后一条的 quantity_after），返回不一致的商品（空列表表示一致）
+
+    只做一致性读，不加行锁。
+    """
+    p = models.Product
+    ledger = _ledger_totals(db)
+    mismatches = []
+    for row in db.execute(select(p.id, p.sku, p.quantity).order_by(p.id)):
+        total, last = ledger.get(row.id, (0, 0))
+        if total != row.quantity or last != row.quantity:
+            mismatches.append({"sku": row.sku, "quantity": row.quantity, "ledger_total": total, "ledger_last": last})
+    return mismatches
+
+
+def reconcile(db: Session) -> int:
+    """库存与流水不一致的商品各追加一条 reconcile 流水（变化量 = 库存 - 流水之和），返回调整的商品数
+
+    先用 check 找出不一致的商品，只对这几行加锁后重新核对，不锁整张商品表。
+    """
+    p = models.Product
+    skus = [item["sku"] for item in check(db)]
+    if not skus:
+        return 0
+    products = db.execute(select(p.id, p.quantity).where(p.sku.in_(skus)).order_by(p.id).with_for_update()).all()
+    ledger = _ledger_totals(db, [row.id for row in products])
+    rows = []
+    for row in products:
+        total = ledger.get(row.id, (0, 0))[0]
+        rows.extend(running_rows(total, row.id, [(row.quantity - total, "reconcile", None)]))
+    record_rows(db, rows)
+    db.commit()
+    return len([row for row in rows if row["delta"]])
+
+
+def main(argv: list[str]) -> int:
+    """命令行入口：snapshot 记快照，check 校验，reconcile 对账"""
+    from .database import SessionLocal
+
+    command = argv[0] if argv else ""
+    if command not in ("snapshot", "check", "reconcile"):
+        print("usage: python -m app.inventory [snapshot|check|reconcile]")
+        return 2
+    with SessionLocal() as db:
+        if command == "snapshot":
+            print(f"inventory snapshot: {take_snapshot(db)} products")
+            return 0
+        if command == "reconcile":
+            print(f"inventory reconcile: {reconcile(db)} products adjusted")
+            return 0
+        mismatches = check(db)
+        for item in mismatches:
+            print(item)
+        print(f"inventory check: {len(mismatches)} mismatched products")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
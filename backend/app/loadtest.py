@@ -0,0 +1,276 @@
+"""简单的并发压测：对一个正在运行的后端发大量并发 GET，统计吞吐和延迟
+
+用来对比同步模式（DB_ASYNC=0，线程池）和异步模式（DB_ASYNC=1，asyncpg）下
+单个 worker 能同时处理多少请求：
+
+    uvicorn app.main:app --workers 1 --port 8000                 # 分别用两种模式启动
+    python -m app.loadtest http://localhost:8000/orders?limit=20 --concurrency 200 --requests 4000
+
+库存并发校验：对同一个 SKU 并发下单（每单 1 件，总数可以超过库存），
+结束后检查 最终库存 == 初始库存 - 成功订单数，且成功订单数不超过初始库存：
+
+    python -m app.loadtest http://localhost:8000 --stock-race P1_001 --concurrency 50 --requests 500
+
+改单并发校验：对同一个 SKU 下一单，再并发地把这一单改成不同的数量、最后并发删除它，
+检查每一步之后 库存 + 订单数量 和 已售数量 - 订单数量 都不变（不会基于读到的旧订单数量调整库存）：
+
+    python -m app.loadtest http://localhost:8000 --update-race P1_001 --concurrency 20 --requests 200
+
+编号并发校验：用同一个 SKU 前缀并发新建商品、再对其中一个商品并发下单，
+检查全部成功，且分配到的 SKU、订单号没有重复：
+
+    python -m app.loadtest http://localhost:8000 --sequence-race RACE --concurrency 50 --requests 500
+
+SQLite 上所有写入排队等同一把文件锁，并发太高时会有请求等锁超时（database is locked，记为 errors），
+对 SQLite 压测时把 --concurrency 调低（如 10）。
+
+这几项校验在 pytest 里有对应的进程内测试（tests/test_order_concurrency.py、tests/test_sequences.py，
+多线程直接调用 crud，不需要启动服务），随测试一起跑；这里的命令用于对真实部署压测。
+
+只用标准库（asyncio 直接写 HTTP/1.1），不依赖额外的压测工具。
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from urllib.parse import urlsplit
+
+
+async def _request(host: str, port: int, method: str, target: str, body: dict | None = None) -> tuple[int, bytes]:
+    """发一次请求（body 为 JSON），返回 (状态码, 响应体)"""
+    payload = json.dumps(body).encode() if body is not None else b""
+    head = f"{method} {target} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+    if body is not None:
+        head += f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(head.encode() + b"\r\n" + payload)
+        await writer.drain()
+        response = await reader.read()
+        status_line, _, rest = response.partition(b"\r\n")
+        return int(status_line.split()[1]), rest.partition(b"\r\n\r\n")[2]
+    finally:
+        writer.close()
+
+
+async def _get(host: str, port: int, target: str) -> int:
+    """发一次 GET，返回状态码"""
+    status, _ = await _request(host, port, "GET", target)
+    return status
+
+
+async def run(url: str, concurrency: int, requests: int) -> dict:
+    """concurrency 个协程一共发 requests 次请求"""
+    parts = urlsplit(url)
+    target = parts.path + (f"?{parts.query}" if parts.query else "") or "/"
+    host, port = parts.hostname, parts.port or 80
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                status = await _get(host, port, target)
+            except OSError:
+                status = 0
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+    }
+
+
+async def stock_race(base_url: str, sku: str, concurrency: int, requests: int) -> dict:
+    """concurrency 个协程对同一个 SKU 一共下 requests 单（每单 1 件），核对最终库存"""
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+    prefix = parts.path.rstrip("/")
+    order = {
+        "product_sku": sku, "actual_price": 1, "quantity": 1,
+        "payment_method": "cash", "channel": "other", "status": "pending", "remark": "stock race",
+    }
+
+    async def stock() -> int:
+        status, body = await _request(host, port, "GET", f"{prefix}/products/{sku}")
+        if status != 200:
+            raise SystemExit(f"GET /products/{sku} -> {status}")
+        return json.loads(body)["quantity"]
+
+    before = await stock()
+    outcomes = {"created": 0, "out_of_stock": 0, "errors": 0}
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            try:
+                status, _ = await _request(host, port, "POST", f"{prefix}/orders", order)
+            except OSError:
+                status = 0
+            key = {200: "created", 400: "out_of_stock"}.get(status, "errors")
+            outcomes[key] += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    after = await stock()
+    expected = before - outcomes["created"]
+    return {
+        "requests": requests,
+        **outcomes,
+        "stock_before": before,
+        "stock_after": after,
+        "exact": after == expected and after >= 0 and outcomes["errors"] == 0,
+    }
+
+
+async def update_race(base_url: str, sku: str, concurrency: int, requests: int) -> dict:
+    """对同一单并发 PATCH 不同的数量（1~5），再并发 DELETE，核对库存和已售数量"""
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+    prefix = parts.path.rstrip("/")
+    order = {
+        "product_sku": sku, "actual_price": 1, "quantity": 1,
+        "payment_method": "cash", "channel": "other", "status": "pending", "remark": "update race",
+    }
+
+    async def product() -> tuple[int, int]:
+        status, body = await _request(host, port, "GET", f"{prefix}/products/{sku}")
+        if status != 200:
+            raise SystemExit(f"GET /products/{sku} -> {status}")
+        data = json.loads(body)
+        return data["quantity"], data["units_sold"]
+
+    before = await product()
+    status, body = await _request(host, port, "POST", f"{prefix}/orders", order)
+    if status != 200:
+        raise SystemExit(f"POST /orders -> {status}")
+    order_id = json.loads(body)["id"]
+    outcomes = {"updated": 0, "out_of_stock": 0, "deleted": 0, "not_found": 0, "errors": 0}
+
+    async def send(method: str, body: dict | None = None) -> None:
+        try:
+            status, _ = await _request(host, port, method, f"{prefix}/orders/{order_id}", body)
+        except OSError:
+            status = 0
+        key = {200: "updated", 204: "deleted", 400: "out_of_stock", 404: "not_found"}.get(status, "errors")
+        outcomes[key] += 1
+
+    async def gather(calls: list) -> None:
+        for start in range(0, len(calls), concurrency):
+            await asyncio.gather(*calls[start:start + concurrency])
+
+    await gather([send("PATCH", {"quantity": 1 + i % 5}) for i in range(requests)])
+    status, body = await _request(host, port, "GET", f"{prefix}/orders/{order_id}")
+    final_quantity = json.loads(body)["quantity"] if status == 200 else 0
+    updated = await product()
+    await gather([send("DELETE") for _ in range(concurrency)])
+    after = await product()
+    return {
+        "requests": requests,
+        **outcomes,
+        "order_quantity": final_quantity,
+        "stock_before": before[0],
+        "stock_updated": updated[0],
+        "stock_after": after[0],
+        "exact": (
+            updated == (before[0] - final_quantity, before[1] + final_quantity)
+            and after == before
+            and outcomes["deleted"] == 1
+            and outcomes["errors"] == 0
+        ),
+    }
+
+
+async def sequence_race(base_url: str, prefix: str, concurrency: int, requests: int) -> dict:
+    """concurrency 个协程用同一前缀一共新建 requests 个商品，再对第一个商品一共下 requests 单，核对编号唯一"""
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+    path = parts.path.rstrip("/")
+    # 商品名唯一，每个商品带上序号
+    started = time.time_ns()
+    errors = 0
+
+    async def create(target: str, body, key: str, count: int) -> list[str]:
+        """并发 POST count 次（body(i) 生成第 i 次的请求体），返回响应里的 key"""
+        nonlocal errors
+        values: list[str] = []
+        remaining = count
+
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                try:
+                    status, response = await _request(host, port, "POST", f"{path}{target}", body(remaining))
+                except OSError:
+                    status = 0
+                if status == 200:
+                    values.append(json.loads(response)[key])
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return values
+
+    skus = await create("/products", lambda i: {
+        "sku": prefix, "name": f"sequence race {started}-{i}", "cost_price": 1, "quantity": requests,
+    }, "sku", requests)
+    order = {
+        "product_sku": min(skus) if skus else prefix, "actual_price": 1, "quantity": 1,
+        "payment_method": "cash", "channel": "other", "status": "pending", "remark": "sequence race",
+    }
+    order_numbers = await create("/orders", lambda i: order, "order_number", requests) if skus else []
+    return {
+        "requests": requests,
+        "skus": len(skus),
+        "unique_skus": len(set(skus)),
+        "orders": len(order_numbers),
+        "unique_order_numbers": len(set(order_numbers)),
+        "errors": errors,
+        "exact": (
+            errors == 0
+            and len(set(skus)) == len(skus) == requests
+            and len(set(order_numbers)) == len(order_numbers) == requests
+        ),
+    }
+
+
+def main(argv: list[str]) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog="python -m app.loadtest")
+    parser.add_argument("url")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--stock-race", metavar="SKU", help="对该商品并发下单并核对最终库存（url 为后端根地址）")
+    parser.add_argument("--update-race", metavar="SKU", help="对该商品的一单并发改单/删单并核对库存和已售数量")
+    parser.add_argument("--sequence-race", metavar="PREFIX", help="用该前缀并发新建商品、下单并核对 SKU/订单号不重复")
+    args = parser.parse_args(argv)
+    races = ((args.stock_race, stock_race), (args.update_race, update_race), (args.sequence_race, sequence_race))
+    for sku, race in races:
+        if sku:
+            result = asyncio.run(race(args.url, sku, args.concurrency, args.requests))
+            print(result)
+            return 0 if result["exact"] else 1
+    print(asyncio.run(run(args.url, args.concurrency, args.requests)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,13 +1,13 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, BackgroundTasks
 from sqlalchemy.exc import IntegrityError
-import csv
-import io
-from datetime import datetime
+from datetime import datetime, date
 from typing import Optional, List
-from fastapi.responses import StreamingResponse
-from .database import Base, engine, get_db
-from . import schemas, crud, models
+from .database import engine, async_engine, settings, pool_stats, SessionLocal, DbRunner, get_db_runner
+from . import schemas, crud, models, rollup, csv_export, analytics_export, migrations, forecast, search
+from .csv_import import (
+	CsvRowStream, PRODUCT_REQUIRED_HEADERS, ORDER_REQUIRED_HEADERS, parse_product_row, parse_order_row,
+)
+from .cache import report_cache
 
 
 app = FastAPI(title="E-commerce ERP (Lite)")
@@ -30,7 +30,18 @@ app.add_middleware(
 
 @app.on_event("startup")
 def on_startup():
-	Base.metadata.create_all(bind=engine)
+	# 建表和表结构变更都走版本化迁移（app/migrations）
+	migrations.upgrade(engine)
+	# 旧库首次升级时回填日汇总表
+	with SessionLocal() as db:
+		rollup.ensure_backfilled(db)
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+	# 异步模式下关闭 asyncpg 连接池
+	if async_engine is not None:
+		await async_engine.dispose()
 
 
 @app.get("/health")
@@ -38,202 +49,286 @@ def health():
 	return {"status": "ok"}
 
 
+@app.get("/db/pool")
+def get_pool_stats():
+	"""数据库连接池状态和连接相关配置（异步模式下另含异步引擎的连接池）"""
+	stats = {
+		"settings": settings.model_dump(include={
+			"pool_size", "max_overflow", "pool_timeout", "pool_recycle", "pool_pre_ping",
+			"transaction_pooler", "expire_on_commit", "use_async",
+		}),
+		"sync": pool_stats(engine),
+	}
+	if async_engine is not None:
+		stats["async"] = pool_stats(async_engine.sync_engine)
+	return stats
+
+
+# 查询参数
+def _split(value: Optional[str]) -> Optional[list[str]]:
+	"""逗号分隔的查询参数 -> 列表"""
+	if not value:
+		return None
+	return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def report_filter_params(
+	start_date: Optional[str] = None,
+	end_date: Optional[str] = None,
+	channels: Optional[str] = None,
+	payment_methods: Optional[str] = None,
+	statuses: Optional[str] = None,
+	product_skus: Optional[str] = None,
+	group_by: Optional[str] = None,
+	max_points: Optional[int] = None,
+) -> schemas.ReportFilters:
+	"""GET 接口共用的筛选参数：日期为 YYYY-MM-DD，多个值用逗号分隔；group_by / max_points 仅时间序列使用"""
+	try:
+		return schemas.ReportFilters(
+			start_date=start_date,
+			end_date=end_date,
+			channels=_split(channels),
+			payment_methods=_split(payment_methods),
+			statuses=_split(statuses),
+			product_skus=_split(product_skus),
+			group_by=group_by,
+			max_points=max_points,
+		)
+	except ValueError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+
+
+def _product_or_404(session, sku: str) -> models.Product:
+	product = crud.get_product_by_sku(session, sku)
+	if not product:
+		raise HTTPException(status_code=404, detail="Product not found")
+	return product
+
+
+def _order_or_404(session, order_id: int, with_product: bool = False, for_update: bool = False) -> models.Order:
+	order = crud.get_order_by_id(session, order_id, with_product=with_product, for_update=for_update)
+	if not order:
+		raise HTTPException(status_code=404, detail="Order not found")
+	return order
+
+
 # Products
 @app.post("/products", response_model=schemas.ProductOut)
-def create_product(payload: schemas.ProductCreate, db: Session = Depends(get_db)):
+async def create_product(payload: schemas.ProductCreate, db: DbRunner = Depends(get_db_runner)):
 	try:
-		return crud.create_product(db, payload)
+		return await db.run(crud.create_product, payload)
 	except IntegrityError:
 		raise HTTPException(status_code=400, detail="SKU already exists")
 
 
-@app.get("/products", response_model=list[schemas.ProductOut])
-def list_products(db: Session = Depends(get_db)):
-	return crud.list_products(db)
+@app.get("/products", response_model=schemas.Page)
+async def list_products(
+	limit: int = crud.DEFAULT_PAGE_SIZE,
+	cursor: Optional[int] = None,
+	skus: Optional[str] = None,
+	fields: Optional[str] = None,
+	ids: Optional[str] = None,
+	q: Optional[str] = None,
+	db: DbRunner = Depends(get_db_runner),
+):
+	"""商品列表（按 id 倒序的游标分页）
+	- limit: 每页条数（最多 1000），cursor: 上一页返回的 next_cursor
+	- skus / ids: 按 SKU / 商品 id 筛选，多个用逗号分隔
+	- q: 搜索 SKU 前缀或商品名称
+	- fields: 只返回指定字段，例如 id,sku,name
+	"""
+	try:
+		product_ids = [int(v) for v in _split(ids) or []]
+	except ValueError:
+		raise HTTPException(status_code=400, detail="ids must be integers")
+	return await db.run(
+		crud.list_products, skus=_split(skus), limit=limit, cursor=cursor, fields=_split(fields),
+		ids=product_ids, q=q,
+	)
+
+
+@app.get("/products/reorder", response_model=List[schemas.ReorderItem])
+async def get_reorder_suggestions(
+	as_of: Optional[date] = None,
+	limit: int = 100,
+	include_all: bool = False,
+	db: DbRunner = Depends(get_db_runner),
+):
+	"""缺货预警 / 补货建议（按指数平滑后的销售速度预测）
+	- as_of: 以哪天为准（默认今天），用于回看历史
+	- limit: 最多返回条数（最多 1000）
+	- include_all: 为 true 时返回所有商品，否则只返回库存不高于补货点的商品
+	结果按可售天数升序，整个目录批量计算后缓存到下一次订单/商品写入
+	"""
+	return await db.run(forecast.reorder_items, as_of, limit, include_all)
 
 
 @app.get("/products/{sku}", response_model=schemas.ProductOut)
-def get_product(sku: str, db: Session = Depends(get_db)):
-	product = crud.get_product_by_sku(db, sku)
-	if not product:
-		raise HTTPException(status_code=404, detail="Product not found")
-	return product
+async def get_product(sku: str, db: DbRunner = Depends(get_db_runner)):
+	return await db.run(_product_or_404, sku)
 
 
 @app.patch("/products/{sku}", response_model=schemas.ProductOut)
-def update_product(sku: str, payload: schemas.ProductUpdate, db: Session = Depends(get_db)):
-	product = crud.get_product_by_sku(db, sku)
-	if not product:
-		raise HTTPException(status_code=404, detail="Product not found")
-	return crud.update_product(db, product, payload)
+async def update_product(
+	sku: str,
+	payload: schemas.ProductUpdate,
+	background_tasks: BackgroundTasks,
+	db: DbRunner = Depends(get_db_runner),
+):
+	"""更新商品
+	成本价变化时重算该商品所有订单的利润；订单很多的商品改为响应后在后台重算
+	"""
+	def update(session):
+		product = _product_or_404(session, sku)
+		defer = crud.should_defer_profit_recompute(session, product, payload)
+		return crud.update_product(session, product, payload, recompute_profits=not defer), defer
+
+	product, defer = await db.run(update)
+	if defer:
+		background_tasks.add_task(crud.run_profit_recompute_job, product.id)
+	return product
+
+
+@app.post("/products/{sku}/recompute-profits")
+async def recompute_product_profits(sku: str, db: DbRunner = Depends(get_db_runner)):
+	"""按当前成本价重算该商品所有订单的利润，返回更新的订单数"""
+	def recompute(session):
+		updated = crud.recompute_product_profits(session, _product_or_404(session, sku))
+		session.commit()
+		return updated
+
+	updated = await db.run(recompute)
+	report_cache.invalidate()
+	return {"sku": sku, "orders_updated": updated}
+
+
+@app.get("/products/{sku}/stock-history", response_model=schemas.StockHistory)
+async def get_stock_history(
+	sku: str,
+	start_date: Optional[date] = None,
+	end_date: Optional[date] = None,
+	limit: int = crud.DEFAULT_PAGE_SIZE,
+	cursor: Optional[int] = None,
+	db: DbRunner = Depends(get_db_runner),
+):
+	"""库存流水（按 id 倒序的游标分页）
+	- start_date, end_date: 流水日期范围（含首尾两天）
+	- 同时返回 start_date 之前的库存 opening_quantity 和 end_date 结束时的库存 closing_quantity
+	"""
+	return await db.run(
+		lambda session: crud.get_stock_history(
+			session, _product_or_404(session, sku), start_date, end_date, limit=limit, cursor=cursor,
+		)
+	)
 
 
 @app.delete("/products/{sku}", status_code=204)
-def delete_product(sku: str, db: Session = Depends(get_db)):
-	product = crud.get_product_by_sku(db, sku)
-	if not product:
-		raise HTTPException(status_code=404, detail="Product not found")
-	crud.delete_product(db, product)
+async def delete_product(sku: str, db: DbRunner = Depends(get_db_runner)):
+	await db.run(lambda session: crud.delete_product(session, _product_or_404(session, sku)))
 	return None
 
 
 @app.post("/products/import/csv")
-def import_products_csv(file: UploadFile = File(...), db: Session = Depends(get_db)):
-	if not file.filename.lower().endswith(".csv"):
-		raise HTTPException(status_code=400, detail="Only CSV files are supported")
-	content = file.file.read().decode("utf-8-sig")
-	reader = csv.DictReader(io.StringIO(content))
-	required = {"sku", "name", "cost_price", "quantity"}
-	missing = required - set([h.strip() for h in reader.fieldnames or []])
-	if missing:
-		raise HTTPException(status_code=400, detail=f"Missing headers: {', '.join(sorted(missing))}")
-
-	items: list[schemas.ProductCreate] = []
-	row_index = 1
-	for row in reader:
-		row_index += 1
-		try:
-			payload = schemas.ProductCreate(
-				sku=row.get("sku", "").strip(),
-				name=row.get("name", "").strip(),
-				cost_price=float(row.get("cost_price", 0) or 0),
-				quantity=int(row.get("quantity", 0) or 0),
-				preset_price=float(row.get("preset_price")) if row.get("preset_price") else None,
-				actual_price=float(row.get("actual_price")) if row.get("actual_price") else None,
-			)
-			items.append(payload)
-		except Exception as e:
-			raise HTTPException(status_code=400, detail=f"Row {row_index} invalid: {e}")
-
-	stats = crud.upsert_products(db, items)
-	return {"total": len(items), **stats}
+async def import_products_csv(file: UploadFile = File(...), db: DbRunner = Depends(get_db_runner)):
+	"""批量导入商品CSV文件（流式解析，解析失败的行记录在 errors 中）"""
+	rows = CsvRowStream(file, PRODUCT_REQUIRED_HEADERS, parse_product_row)
+	stats = await db.run(crud.upsert_products, rows)
+	return {"total": rows.total, **stats, "errors": rows.errors}
 
 
 # Orders
 @app.post("/orders", response_model=schemas.OrderOut)
-def create_order(payload: schemas.OrderCreate, db: Session = Depends(get_db)):
+async def create_order(payload: schemas.OrderCreate, db: DbRunner = Depends(get_db_runner)):
 	"""创建新订单
 	- 自动扣减商品库存
 	- 更新商品的 actual_price 为订单价格
 	- 如果库存不足会返回错误
 	"""
 	try:
-		return crud.create_order(db, payload)
+		return await db.run(crud.create_order, payload)
 	except ValueError as e:
 		raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.get("/orders", response_model=list[schemas.OrderOut])
-def list_orders(db: Session = Depends(get_db)):
-	"""获取所有订单列表，按创建时间倒序"""
-	return crud.list_orders(db)
+@app.post("/orders/batch", response_model=schemas.OrderBatchResult)
+async def batch_orders(payload: schemas.OrderBatch, db: DbRunner = Depends(get_db_runner)):
+	"""批量新增/修改/删除订单（一个请求、一个事务）
+	- 执行顺序：delete -> update -> create，同一商品的库存按净变化一次调整
+	- mode=all_or_nothing（默认）：任一项失败整批不生效，返回 400，detail 为每一项的结果
+	- mode=best_effort：失败的项跳过，其余提交；results 里逐项给出 ok / error
+	"""
+	return await db.run(crud.apply_order_batch, payload)
+
+
+@app.get("/orders", response_model=schemas.Page)
+async def list_orders(
+	limit: int = crud.DEFAULT_PAGE_SIZE,
+	cursor: Optional[int] = None,
+	fields: Optional[str] = None,
+	q: Optional[str] = None,
+	filters: schemas.ReportFilters = Depends(report_filter_params),
+	db: DbRunner = Depends(get_db_runner),
+):
+	"""订单列表（按 id 倒序的游标分页）
+	- limit: 每页条数（最多 1000），cursor: 上一页返回的 next_cursor
+	- 筛选：start_date, end_date（交易日期）, channels, payment_methods, statuses, product_skus（逗号分隔）
+	- q: 搜索订单号前缀或商品（SKU 前缀、商品名称）
+	- fields: 只返回指定字段，例如 id,order_number,profit
+	"""
+	return await db.run(crud.list_orders, filters, limit=limit, cursor=cursor, fields=_split(fields), q=q)
 
 
 @app.get("/orders/{order_id}", response_model=schemas.OrderOut)
-def get_order(order_id: int, db: Session = Depends(get_db)):
+async def get_order(order_id: int, db: DbRunner = Depends(get_db_runner)):
 	"""根据订单ID查询单个订单"""
-	order = crud.get_order_by_id(db, order_id)
-	if not order:
-		raise HTTPException(status_code=404, detail="Order not found")
-	return order
+	return await db.run(_order_or_404, order_id)
 
 
 @app.get("/orders/by-number/{order_number}", response_model=schemas.OrderOut)
-def get_order_by_number(order_number: str, db: Session = Depends(get_db)):
+async def get_order_by_number(order_number: str, db: DbRunner = Depends(get_db_runner)):
 	"""根据订单号查询单个订单"""
-	order = crud.get_order_by_number(db, order_number)
+	order = await db.run(crud.get_order_by_number, order_number)
 	if not order:
 		raise HTTPException(status_code=404, detail="Order not found")
 	return order
 
 
 @app.patch("/orders/{order_id}", response_model=schemas.OrderOut)
-def update_order(order_id: int, payload: schemas.OrderUpdate, db: Session = Depends(get_db)):
+async def update_order(order_id: int, payload: schemas.OrderUpdate, db: DbRunner = Depends(get_db_runner)):
 	"""更新订单信息
 	注意：更新订单不会影响库存，如需调整库存请单独处理商品
 	"""
-	order = crud.get_order_by_id(db, order_id)
-	if not order:
-		raise HTTPException(status_code=404, detail="Order not found")
-	return crud.update_order(db, order, payload)
+	return await db.run(lambda session: crud.update_order(session, _order_or_404(session, order_id, with_product=True, for_update=True), payload))
 
 
 @app.delete("/orders/{order_id}", status_code=204)
-def delete_order(order_id: int, db: Session = Depends(get_db)):
+async def delete_order(order_id: int, db: DbRunner = Depends(get_db_runner)):
 	"""删除订单
 	警告：删除订单不会恢复库存，请谨慎操作
 	"""
-	order = crud.get_order_by_id(db, order_id)
-	if not order:
-		raise HTTPException(status_code=404, detail="Order not found")
-	crud.delete_order(db, order)
+	await db.run(lambda session: crud.delete_order(session, _order_or_404(session, order_id, with_product=True, for_update=True)))
 	return None
 
 
 @app.post("/orders/import/csv")
-def import_orders_csv(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def import_orders_csv(file: UploadFile = File(...), db: DbRunner = Depends(get_db_runner)):
 	"""批量导入订单CSV文件
 	支持的CSV格式：
 	- 必填字段：order_number, product_sku, actual_price, quantity, payment_method, channel, status
-	- 可选字段：transaction_date, buyer_name
+	- 可选字段：transaction_date, buyer_name, remark
 	- 如果订单号已存在会跳过该订单
 	- 如果商品SKU不存在或库存不足会记录错误
+	- 流式解析上传文件，按批写入数据库，每批一个事务
+	- 格式错误的行会带行号记录在 errors 中，不影响其它行
 	"""
-	if not file.filename.lower().endswith(".csv"):
-		raise HTTPException(status_code=400, detail="Only CSV files are supported")
-	
-	content = file.file.read().decode("utf-8-sig")
-	reader = csv.DictReader(io.StringIO(content))
-	
-	# 检查必填字段
-	required = {"order_number", "product_sku", "actual_price", "quantity", "payment_method", "channel", "status"}
-	missing = required - set([h.strip() for h in reader.fieldnames or []])
-	if missing:
-		raise HTTPException(status_code=400, detail=f"Missing required headers: {', '.join(sorted(missing))}")
-
-	items: list[schemas.OrderCreate] = []
-	row_index = 1
-	
-	for row in reader:
-		row_index += 1
-		try:
-			# 解析日期字段（如果存在）
-			transaction_date = None
-			if row.get("transaction_date"):
-				try:
-					transaction_date = datetime.fromisoformat(row["transaction_date"].replace("Z", "+00:00"))
-				except ValueError:
-					# 尝试其他日期格式
-					from datetime import datetime
-					for fmt in ["%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y"]:
-						try:
-							transaction_date = datetime.strptime(row["transaction_date"], fmt)
-							break
-						except ValueError:
-							continue
-					if transaction_date is None:
-						raise ValueError(f"Invalid date format: {row['transaction_date']}")
-			
-			payload = schemas.OrderCreate(
-				order_number=row.get("order_number", "").strip(),
-				transaction_date=transaction_date,
-				buyer_name=row.get("buyer_name", "").strip() or None,
-				actual_price=float(row.get("actual_price", 0) or 0),
-				quantity=int(row.get("quantity", 1) or 1),
-				payment_method=row.get("payment_method", "").strip().lower(),
-				channel=row.get("channel", "").strip(),
-				status=row.get("status", "").strip().lower(),
-				product_sku=row.get("product_sku", "").strip(),
-			)
-			items.append(payload)
-		except Exception as e:
-			raise HTTPException(status_code=400, detail=f"Row {row_index} invalid: {e}")
-
-	# 批量处理订单
-	stats = crud.upsert_orders(db, items)
+	rows = CsvRowStream(file, ORDER_REQUIRED_HEADERS, parse_order_row)
+	# 生成器交给 upsert_orders，边解析边按批写入
+	stats = await db.run(crud.upsert_orders, rows)
+	stats["errors"] = rows.errors + stats["errors"]
+	stats["total_processed"] = rows.total
 	return {
 		"message": "CSV import completed",
-		"total_rows": len(items),
+		"total_rows": rows.total,
 		**stats
 	}
 
@@ -241,10 +336,16 @@ def import_orders_csv(file: UploadFile = File(...), db: Session = Depends(get_db
 # ==================== 报表模块 ====================
 from fastapi import Body
 
+
+def _cached_report(name: str, compute):
+	"""报表结果走 report_cache：返回 (session, filters) -> 结果，交给 db.run 在会话里执行"""
+	return lambda session, filters: report_cache.get_or_compute(name, filters, lambda: compute(session, filters))
+
+
 @app.post("/reports/comprehensive", response_model=schemas.ReportResponse)
-def generate_comprehensive_report(
+async def generate_comprehensive_report(
 	filters: schemas.ReportFilters = Body(...),  # 明确告诉 FastAPI 从请求体读取
-	db: Session = Depends(get_db)
+	db: DbRunner = Depends(get_db_runner)
 ):
 	"""生成综合报表
 	包含：
@@ -259,21 +360,24 @@ def generate_comprehensive_report(
 	- 支付方式：payment_methods (cash/payid)
 	- 订单状态：statuses (pending/done)
 	- 商品SKU：product_skus
+	- 时间序列分组：group_by (day/week/month/year/channel/product)，max_points 限制点数
 	"""
 	print("Filters:", filters.start_date, filters.end_date)
 
-	return crud.generate_comprehensive_report(db, filters)
+	report = await db.run(_cached_report("comprehensive", crud.generate_comprehensive_report), filters)
+	return report.model_copy(update={"filters_applied": filters})
+
+
+@app.get("/reports/cache/stats")
+def get_report_cache_stats():
+	"""报表缓存统计：命中/未命中次数、命中率、条目数、当前代数"""
+	return report_cache.stats()
 
 
 @app.get("/reports/summary", response_model=schemas.SalesSummary)
-def get_sales_summary(
-	start_date: Optional[str] = None,
-	end_date: Optional[str] = None,
-	channels: Optional[str] = None,
-	payment_methods: Optional[str] = None,
-	statuses: Optional[str] = None,
-	product_skus: Optional[str] = None,
-	db: Session = Depends(get_db)
+async def get_sales_summary(
+	filters: schemas.ReportFilters = Depends(report_filter_params),
+	db: DbRunner = Depends(get_db_runner)
 ):
 	"""获取销售汇总数据
 	查询参数：
@@ -284,146 +388,150 @@ def get_sales_summary(
 	- statuses: 订单状态，多个用逗号分隔 (pending,done)
 	- product_skus: 商品SKU，多个用逗号分隔
 	"""
-	# 解析查询参数
-	filters = schemas.ReportFilters()
-	
-	if start_date:
-		filters.start_date = datetime.fromisoformat(start_date).date()
-	if end_date:
-		filters.end_date = datetime.fromisoformat(end_date).date()
-	
-	if channels:
-		filters.channels = [c.strip() for c in channels.split(",")]
-	if payment_methods:
-		filters.payment_methods = [p.strip() for p in payment_methods.split(",")]
-	if statuses:
-		filters.statuses = [s.strip() for s in statuses.split(",")]
-	if product_skus:
-		filters.product_skus = [s.strip() for s in product_skus.split(",")]
-	
-	return crud.calculate_sales_summary(db, filters)
+	return await db.run(_cached_report("summary", crud.calculate_sales_summary), filters)
 
 
 @app.get("/reports/channels", response_model=List[schemas.ChannelStats])
-def get_channel_stats(
-	start_date: Optional[str] = None,
-	end_date: Optional[str] = None,
-	channels: Optional[str] = None,
-	payment_methods: Optional[str] = None,
-	statuses: Optional[str] = None,
-	product_skus: Optional[str] = None,
-	db: Session = Depends(get_db)
+async def get_channel_stats(
+	filters: schemas.ReportFilters = Depends(report_filter_params),
+	db: DbRunner = Depends(get_db_runner)
 ):
 	"""获取渠道统计数据
 	按渠道分组统计销售情况，按销售额降序排列
 	"""
-	# 解析查询参数
-	filters = schemas.ReportFilters()
-	
-	if start_date:
-		filters.start_date = datetime.fromisoformat(start_date).date()
-	if end_date:
-		filters.end_date = datetime.fromisoformat(end_date).date()
-	
-	if channels:
-		filters.channels = [c.strip() for c in channels.split(",")]
-	if payment_methods:
-		filters.payment_methods = [p.strip() for p in payment_methods.split(",")]
-	if statuses:
-		filters.statuses = [s.strip() for s in statuses.split(",")]
-	if product_skus:
-		filters.product_skus = [s.strip() for s in product_skus.split(",")]
-	
-	return crud.calculate_channel_stats(db, filters)
+	return await db.run(_cached_report("channels", crud.calculate_channel_stats), filters)
 
 
 @app.get("/reports/products", response_model=List[schemas.ProductStats])
-def get_product_stats(
-	start_date: Optional[str] = None,
-	end_date: Optional[str] = None,
-	channels: Optional[str] = None,
-	payment_methods: Optional[str] = None,
-	statuses: Optional[str] = None,
-	product_skus: Optional[str] = None,
-	db: Session = Depends(get_db)
+async def get_product_stats(
+	filters: schemas.ReportFilters = Depends(report_filter_params),
+	db: DbRunner = Depends(get_db_runner)
 ):
 	"""获取商品统计数据
 	按商品分组统计销售情况，按销售额降序排列
 	"""
-	# 解析查询参数
-	filters = schemas.ReportFilters()
-	
-	if start_date:
-		filters.start_date = datetime.fromisoformat(start_date).date()
-	if end_date:
-		filters.end_date = datetime.fromisoformat(end_date).date()
-	
-	if channels:
-		filters.channels = [c.strip() for c in channels.split(",")]
-	if payment_methods:
-		filters.payment_methods = [p.strip() for p in payment_methods.split(",")]
-	if statuses:
-		filters.statuses = [s.strip() for s in statuses.split(",")]
-	if product_skus:
-		filters.product_skus = [s.strip() for s in product_skus.split(",")]
-	
-	return crud.calculate_product_stats(db, filters)
+	return await db.run(_cached_report("products", crud.calculate_product_stats), filters)
+
+
+@app.get("/reports/products/top", response_model=List[schemas.ProductStats])
+async def get_top_products(
+	limit: int = 10,
+	metric: str = "profit",
+	filters: schemas.ReportFilters = Depends(report_filter_params),
+	db: DbRunner = Depends(get_db_runner)
+):
+	"""商品排行 Top-N
+	- limit: 返回前几名（最多 100）
+	- metric: 排序指标 profit/sales/quantity，默认 profit
+	"""
+	compute = lambda session, filters: crud.calculate_top_products(session, filters, limit, metric)
+	return await db.run(_cached_report(f"products_top:{metric}:{limit}", compute), filters)
+
+
+@app.get("/reports/products/abc", response_model=List[schemas.ProductABC])
+async def get_product_abc(
+	a_share: float = 80,
+	b_share: float = 95,
+	filters: schemas.ReportFilters = Depends(report_filter_params),
+	db: DbRunner = Depends(get_db_runner)
+):
+	"""商品 ABC 分类（按销售额）
+	- a_share: 累计销售额占比在前 a_share% 内的商品为 A 类，默认 80
+	- b_share: 累计占比在前 b_share% 内的其余商品为 B 类，默认 95，剩下的为 C 类
+	"""
+	compute = lambda session, filters: crud.calculate_abc_classes(session, filters, a_share, b_share)
+	return await db.run(_cached_report(f"products_abc:{a_share}:{b_share}", compute), filters)
+
+
+@app.get("/reports/products/price-percentiles", response_model=List[schemas.ProductPricePercentiles])
+async def get_product_price_percentiles(
+	filters: schemas.ReportFilters = Depends(report_filter_params),
+	db: DbRunner = Depends(get_db_runner)
+):
+	"""各商品订单售价的中位数和 P90（按订单计，支持与其它报表相同的日期/渠道等筛选）"""
+	return await db.run(_cached_report("products_price_percentiles", crud.calculate_price_percentiles), filters)
 
 
 @app.get("/reports/timeseries", response_model=List[schemas.TimeSeriesData])
-def get_time_series_data(
-	start_date: Optional[str] = None,
-	end_date: Optional[str] = None,
-	channels: Optional[str] = None,
-	payment_methods: Optional[str] = None,
-	statuses: Optional[str] = None,
-	product_skus: Optional[str] = None,
-	db: Session = Depends(get_db)
+async def get_time_series_data(
+	filters: schemas.ReportFilters = Depends(report_filter_params),
+	db: DbRunner = Depends(get_db_runner)
 ):
 	"""获取时间序列数据
 	按日期分组统计销售情况，用于绘制趋势图
+	- group_by: 分组方式 day/week/month/year/channel/product，默认 day
+	- max_points: 最多返回的点数，超出时合并相邻分组
 	"""
-	# 解析查询参数
-	filters = schemas.ReportFilters()
-	
-	if start_date:
-		filters.start_date = datetime.fromisoformat(start_date).date()
-	if end_date:
-		filters.end_date = datetime.fromisoformat(end_date).date()
-	
-	if channels:
-		filters.channels = [c.strip() for c in channels.split(",")]
-	if payment_methods:
-		filters.payment_methods = [p.strip() for p in payment_methods.split(",")]
-	if statuses:
-		filters.statuses = [s.strip() for s in statuses.split(",")]
-	if product_skus:
-		filters.product_skus = [s.strip() for s in product_skus.split(",")]
-	
-	return crud.calculate_time_series(db, filters)
-from sqlalchemy.orm import joinedload
+	return await db.run(_cached_report("timeseries", crud.calculate_time_series), filters)
+
+
+# ==================== 导出模块 ====================
+
 @app.get("/products/export/csv")
-def export_products(db: Session = Depends(get_db)):
-    products = db.query(models.Product).all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["sku", "name", "cost_price", "quantity", "preset_price", "actual_price"])
-    for p in products:
-        writer.writerow([p.sku, p.name, p.cost_price, p.quantity, p.preset_price, p.actual_price])
-    output.seek(0)
-    return StreamingResponse(output, media_type="text/csv", headers={
-        "Content-Disposition": "attachment; filename=products.csv"
-    })
+def export_products(skus: Optional[str] = None, gzip: bool = False):
+	"""流式导出商品 CSV
+	- skus: 逗号分隔的 SKU，只导出这些商品
+	- gzip: 为 true 时返回 products.csv.gz
+	"""
+	return csv_export.csv_response(
+		crud.export_products_query(_split(skus)), csv_export.PRODUCT_EXPORT_HEADERS, "products.csv", gzip
+	)
+
 
 @app.get("/orders/export/csv")
-def export_orders(db: Session = Depends(get_db)):
-    orders = db.query(models.Order).options(joinedload(models.Order.product)).all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["order_number","transaction_date","buyer_name", "product_name", "quantity", "actual_price", "profit","payment_method" ,"channel", "status"])
-    for o in orders:
-        writer.writerow([o.order.number,  o.transaction_date,o.buyer_name, o.product.name if o.product else "", o.quantity, o.actual_price, o.profit,o.payment_method, o.channel,o.status,])
-    output.seek(0)
-    return StreamingResponse(output, media_type="text/csv", headers={
-        "Content-Disposition": "attachment; filename=orders.csv"
-    })
\ No newline at end of file
+def export_orders(
+	filters: schemas.ReportFilters = Depends(report_filter_params),
+	gzip: bool = False,
+):
+	"""流式导出订单 CSV
+	- 筛选参数与报表接口相同（日期范围、渠道、支付方式、状态、SKU）
+	- gzip: 为 true 时返回 orders.csv.gz
+	"""
+	return csv_export.csv_response(
+		crud.export_orders_query(filters), csv_export.ORDER_EXPORT_HEADERS, "orders.csv", gzip
+	)
+
+
+@app.get("/orders/export/arrow")
+def export_orders_arrow(filters: schemas.ReportFilters = Depends(report_filter_params)):
+	"""流式导出订单明细（含商品 SKU、成本价）为 Arrow IPC stream，筛选参数同报表接口"""
+	stmt = crud.analytics_orders_query(filters)
+	return analytics_export.download_response(
+		analytics_export.iter_arrow(stmt, analytics_export.ORDER_ANALYTICS_SCHEMA),
+		"application/vnd.apache.arrow.stream", "orders.arrows",
+	)
+
+
+@app.get("/orders/export/parquet")
+def export_orders_parquet(filters: schemas.ReportFilters = Depends(report_filter_params)):
+	"""流式导出订单明细为 Parquet（每批一个 row group），筛选参数同报表接口"""
+	stmt = crud.analytics_orders_query(filters)
+	return analytics_export.download_response(
+		analytics_export.iter_parquet(stmt, analytics_export.ORDER_ANALYTICS_SCHEMA),
+		"application/vnd.apache.parquet", "orders.parquet",
+	)
+
+
+@app.get("/orders/export/ndjson")
+def export_orders_ndjson(filters: schemas.ReportFilters = Depends(report_filter_params)):
+	"""流式导出订单明细为 NDJSON（一行一条），筛选参数同报表接口"""
+	stmt = crud.analytics_orders_query(filters)
+	return analytics_export.download_response(
+		analytics_export.iter_ndjson(stmt), "application/x-ndjson", "orders.ndjson",
+	)
+
+
+@app.get("/search", response_model=schemas.SearchResult)
+async def search_all(
+	q: str,
+	types: Optional[str] = None,
+	limit: int = 20,
+	cursor: Optional[str] = None,
+	db: DbRunner = Depends(get_db_runner),
+):
+	"""搜索商品和订单（按相关度分档排序，同档新的在前，覆盖全部命中）
+	- q: SKU / 订单号按前缀匹配；商品名、买家名、备注按词前缀全文检索
+	- types: product,order（逗号分隔，默认都搜）
+	- limit: 每页条数（最多 100），cursor: 上一页返回的 next_cursor（"档位:id"）
+	"""
+	return await db.run(search.search, q, _split(types), limit, cursor)
@@ -0,0 +1,158 @@
+"""版本化的数据库迁移
+
+每个迁移是本包里的一个模块 vNNNN_<说明>.py，提供：
+- upgrade(conn)：升级（必须）
+- downgrade(conn)：回退（可选，没有的迁移不能回退）
+模块 docstring 的第一行作为迁移说明。
+
+已执行的版本记录在 schema_migrations 表。应用启动时自动 upgrade 到最新版本，也可以手动执行：
+
+    python -m app.migrations upgrade [版本]
+    python -m app.migrations downgrade <版本>
+    python -m app.migrations status
+
+每个迁移在独立事务里执行；PostgreSQL 上用 advisory lock 保证多个实例同时启动时只有一个在迁移。
+"""
+import importlib
+import pkgutil
+from dataclasses import dataclass
+from datetime import datetime
+from types import ModuleType
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select, text
+from sqlalchemy.engine import Connection, Engine
+
+_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# pg_advisory_lock 的键，任意固定值
+_LOCK_KEY = 7310514
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    module: ModuleType
+
+    @property
+    def description(self) -> str:
+        doc = (self.module.__doc__ or "").strip()
+        return doc.splitlines()[0] if doc else ""
+
+
+def load_migrations() -> list[Migration]:
+    """按版本号排序的全部迁移"""
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        if not (info.name.startswith("v") and info.name[1:5].isdigit()):
+            continue
+        module = importlib.import_module(f"{__name__}.{info.name}")
+        migrations.append(Migration(version=int(info.name[1:5]), name=info.name, module=module))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"duplicate migration versions: {versions}")
+    return migrations
+
+
+def _applied_versions(conn: Connection) -> set[int]:
+    schema_migrations.create(conn, checkfirst=True)
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+class _MigrationLock:
+    """PostgreSQL 上的 advisory lock，其他数据库不加锁
+
+    用单独的连接开一个事务拿 pg_advisory_xact_lock，迁移结束时回滚释放。锁跟着事务走，
+    在 PgBouncer 事务级连接池后面也不会落到别的后端连接上。
+    """
+
+    def __init__(self, engine: Engine):
+        self._engine = engine
+        self._conn = None
+
+    def __enter__(self):
+        if self._engine.dialect.name == "postgresql":
+            self._conn = self._engine.connect()
+            self._conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+        return self
+
+    def __exit__(self, *exc):
+        if self._conn is not None:
+            self._conn.rollback()
+            self._conn.close()
+
+
+def upgrade(engine: Engine, target: int | None = None) -> list[Migration]:
+    """执行所有未执行且版本号 <= target（默认最新）的迁移，返回本次执行的迁移"""
+    executed = []
+    with _MigrationLock(engine), engine.connect() as conn:
+        applied = _applied_versions(conn)
+        conn.commit()
+        for migration in load_migrations():
+            if migration.version in applied or (target is not None and migration.version > target):
+                continue
+            with conn.begin():
+                migration.module.upgrade(conn)
+                conn.execute(schema_migrations.insert().values(
+                    version=migration.version, name=migration.name, applied_at=datetime.utcnow(),
+                ))
+            executed.append(migration)
+            print(f"migration applied: {migration.name}")
+    return executed
+
+
+def downgrade(engine: Engine, target: int) -> list[Migration]:
+    """从最新版本依次回退，直到只剩版本号 <= target 的迁移"""
+    executed = []
+    with _MigrationLock(engine), engine.connect() as conn:
+        applied = _applied_versions(conn)
+        conn.commit()
+        for migration in reversed(load_migrations()):
+            if migration.version not in applied or migration.version <= target:
+                continue
+            if not hasattr(migration.module, "downgrade"):
+                raise RuntimeError(f"migration {migration.name} cannot be downgraded")
+            with conn.begin():
+                migration.module.downgrade(conn)
+                conn.execute(schema_migrations.delete().where(schema_migrations.c.version == migration.version))
+            executed.append(migration)
+            print(f"migration reverted: {migration.name}")
+    return executed
+
+
+def status(engine: Engine) -> list[tuple[Migration, bool]]:
+    """每个迁移及其是否已执行"""
+    with engine.connect() as conn:
+        applied = _applied_versions(conn)
+        conn.commit()
+    return [(m, m.version in applied) for m in load_migrations()]
+
+
+def main(argv: list[str]) -> int:
+    """命令行入口：upgrade [版本]、downgrade <版本>、status"""
+    from ..database import engine
+
+    command = argv[0] if argv else ""
+    if command == "upgrade" and len(argv) <= 2:
+        executed = upgrade(engine, int(argv[1]) if len(argv) == 2 else None)
+        print(f"{len(executed)} migrations applied")
+        return 0
+    if command == "downgrade" and len(argv) == 2:
+        executed = downgrade(engine, int(argv[1]))
+        print(f"{len(executed)} migrations reverted")
+        return 0
+    if command == "status" and len(argv) == 1:
+        for migration, applied in status(engine):
+            print(f"[{'x' if applied else ' '}] {migration.name}  {migration.description}")
+        return 0
+    print("usage: python -m app.migrations [upgrade [version] | downgrade <version> | status]")
+    return 2
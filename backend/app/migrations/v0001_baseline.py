@@ -0,0 +1,73 @@
+"""初始表结构：products、orders、daily_sales_rollup、sequence_counters
+
+以前由启动时的 create_all 建表，已有的库里这些表都已存在，checkfirst 跳过即可。
+表结构按当时的 models 写死在这里，之后 models 的改动要写成新的迁移。
+"""
+from sqlalchemy import (
+    Column, Date, DateTime, Enum, ForeignKey, Integer, MetaData, Numeric, String, Table, Text,
+)
+from sqlalchemy.engine import Connection
+
+from ..models import Channel, OrderStatus, PaymentMethod
+
+metadata = MetaData()
+
+Table(
+    "products",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("sku", String(64), unique=True, index=True, nullable=False),
+    Column("name", String(255), nullable=False, unique=True, index=True),
+    Column("cost_price", Numeric(12, 2), nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("preset_price", Numeric(12, 2), nullable=True),
+    Column("actual_price", Numeric(12, 2), nullable=True),
+)
+
+Table(
+    "orders",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("order_number", String(64), unique=True, index=True, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("transaction_date", DateTime, nullable=True),
+    Column("buyer_name", String(255), nullable=True),
+    Column("actual_price", Numeric(12, 2), nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("profit", Numeric(12, 2), nullable=False),
+    Column("payment_method", Enum(PaymentMethod), nullable=False),
+    Column("channel", Enum(Channel), nullable=False),
+    Column("status", Enum(OrderStatus), nullable=False),
+    Column("remark", Text, nullable=True),
+    Column("product_id", Integer, ForeignKey("products.id"), nullable=False),
+)
+
+Table(
+    "daily_sales_rollup",
+    metadata,
+    Column("day", Date, primary_key=True),
+    Column("channel", Enum(Channel), primary_key=True),
+    Column("payment_method", Enum(PaymentMethod), primary_key=True),
+    Column("status", Enum(OrderStatus), primary_key=True),
+    Column("product_id", Integer, ForeignKey("products.id"), primary_key=True, index=True),
+    Column("total_sales", Numeric(14, 2), nullable=False),
+    Column("total_cost", Numeric(14, 2), nullable=False),
+    Column("total_profit", Numeric(14, 2), nullable=False),
+    Column("order_count", Integer, nullable=False),
+    Column("quantity", Integer, nullable=False),
+)
+
+Table(
+    "sequence_counters",
+    metadata,
+    Column("name", String(128), primary_key=True),
+    Column("value", Integer, nullable=False),
+)
+
+
+def upgrade(conn: Connection) -> None:
+    metadata.create_all(conn, checkfirst=True)
+
+
+def downgrade(conn: Connection) -> None:
+    metadata.drop_all(conn, checkfirst=True)
@@ -0,0 +1,17 @@
+"""orders.profit 字段（替代原来的 migration_add_profit_field.md）
+
+profit 加入之前建的库：加字段并按 (售价 - 成本价) × 数量 回填。新库的 orders 表已经有这个字段，跳过。
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(conn: Connection) -> None:
+    columns = {c["name"] for c in inspect(conn).get_columns("orders")}
+    if "profit" in columns:
+        return
+    conn.execute(text("ALTER TABLE orders ADD COLUMN profit NUMERIC(12, 2) NOT NULL DEFAULT 0"))
+    conn.execute(text(
+        "UPDATE orders SET profit = actual_price * quantity - ("
+        " SELECT products.cost_price * orders.quantity FROM products WHERE products.id = orders.product_id)"
+    ))
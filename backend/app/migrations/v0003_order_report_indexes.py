@@ -0,0 +1,19 @@
+"""orders 上给报表筛选和按商品查询用的复合索引
+
+- (transaction_date, channel)：报表和订单列表按日期范围筛选，渠道作为第二列直接在索引里过滤；
+  不读日汇总表时（REPORT_USE_ROLLUP=0）的报表、rollup rebuild/check 也走这个索引
+- (product_id, id)：按商品找订单（修改成本价时重算利润、订单号序号初始化、按 SKU 筛选的订单列表），
+  id 作为第二列让按商品筛选的 keyset 分页（id < :cursor ORDER BY id DESC）不用再排序
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(conn: Connection) -> None:
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_transaction_date_channel ON orders (transaction_date, channel)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_product_id_id ON orders (product_id, id)"))
+
+
+def downgrade(conn: Connection) -> None:
+    conn.execute(text("DROP INDEX IF EXISTS ix_orders_product_id_id"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_orders_transaction_date_channel"))
@@ -0,0 +1,32 @@
+"""products 上的销售累计字段：units_sold / revenue / profit_total / last_sold_at
+
+加字段后按 orders 回填（与 product_sales.rebuild 相同的口径）；之后由订单写入路径增量维护。
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+COLUMNS = {
+    "units_sold": "INTEGER NOT NULL DEFAULT 0",
+    "revenue": "NUMERIC(14, 2) NOT NULL DEFAULT 0",
+    "profit_total": "NUMERIC(14, 2) NOT NULL DEFAULT 0",
+    "last_sold_at": "TIMESTAMP NULL",
+}
+
+
+def upgrade(conn: Connection) -> None:
+    existing = {c["name"] for c in inspect(conn).get_columns("products")}
+    for name, ddl in COLUMNS.items():
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE products ADD COLUMN {name} {ddl}"))
+    conn.execute(text(
+        "UPDATE products SET"
+        " units_sold = (SELECT COALESCE(SUM(quantity), 0) FROM orders WHERE orders.product_id = products.id),"
+        " revenue = (SELECT COALESCE(SUM(actual_price * quantity), 0) FROM orders WHERE orders.product_id = products.id),"
+        " profit_total = (SELECT COALESCE(SUM(profit), 0) FROM orders WHERE orders.product_id = products.id),"
+        " last_sold_at = (SELECT MAX(COALESCE(transaction_date, created_at)) FROM orders WHERE orders.product_id = products.id)"
+    ))
+
+
+def downgrade(conn: Connection) -> None:
+    for name in reversed(list(COLUMNS)):
+        conn.execute(text(f"ALTER TABLE products DROP COLUMN {name}"))
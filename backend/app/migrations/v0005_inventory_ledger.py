@@ -0,0 +1,51 @@
+"""库存流水表 inventory_movements 和库存快照表 inventory_snapshots
+
+已有的库存记成每个商品一条 opening 流水（变化量即当前库存），之后由库存写入路径追加。
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, text
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+# 只用来建表时解析外键
+Table("products", metadata, Column("id", Integer, primary_key=True))
+
+movements = Table(
+    "inventory_movements",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("product_id", Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("delta", Integer, nullable=False),
+    Column("quantity_after", Integer, nullable=False),
+    Column("reason", String(32), nullable=False),
+    Column("order_number", String(64), nullable=True),
+    Index("ix_inventory_movements_product_id_id", "product_id", "id"),
+)
+
+snapshots = Table(
+    "inventory_snapshots",
+    metadata,
+    # 不设外键：打快照不对商品行加锁
+    Column("product_id", Integer, primary_key=True),
+    Column("taken_at", DateTime, primary_key=True),
+    Column("quantity", Integer, nullable=False),
+    Column("movement_id", Integer, nullable=False),
+)
+
+
+def upgrade(conn: Connection) -> None:
+    metadata.create_all(conn, tables=[movements, snapshots], checkfirst=True)
+    conn.execute(
+        text(
+            "INSERT INTO inventory_movements (product_id, created_at, delta, quantity_after, reason)"
+            " SELECT id, :now, quantity, quantity, 'opening' FROM products WHERE quantity <> 0 ORDER BY id"
+        ),
+        {"now": datetime.utcnow()},
+    )
+
+
+def downgrade(conn: Connection) -> None:
+    metadata.drop_all(conn, tables=[snapshots, movements], checkfirst=True)
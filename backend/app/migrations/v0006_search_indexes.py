@@ -0,0 +1,29 @@
+"""GET /search 用的索引（只在 PostgreSQL 上创建，SQLite 上搜索退化为扫描）
+
+- 商品名、买家名、订单备注：GIN 全文检索索引，表达式与 models.text_search_vector 一致
+- SKU、订单号：varchar_pattern_ops 的 B-tree，非 C 排序规则下 LIKE 'abc%' 前缀匹配也能走索引
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+INDEXES = {
+    "ix_products_name_fts": "products USING gin (to_tsvector('simple', name))",
+    "ix_products_sku_prefix": "products (sku varchar_pattern_ops)",
+    "ix_orders_buyer_name_fts": "orders USING gin (to_tsvector('simple', buyer_name))",
+    "ix_orders_remark_fts": "orders USING gin (to_tsvector('simple', remark))",
+    "ix_orders_order_number_prefix": "orders (order_number varchar_pattern_ops)",
+}
+
+
+def upgrade(conn: Connection) -> None:
+    if conn.dialect.name != "postgresql":
+        return
+    for name, definition in INDEXES.items():
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+
+
+def downgrade(conn: Connection) -> None:
+    if conn.dialect.name != "postgresql":
+        return
+    for name in reversed(list(INDEXES)):
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
@@ -0,0 +1,21 @@
+"""按已有商品和订单初始化 sequence_counters
+
+每个 SKU 前缀、每个商品的订单号各一行，值为已有数据里最大的数字序号（见 sequences.seed）。
+之后分配编号不用再在首次使用时扫描已有数据；只会调大计数器，重复执行也安全。
+"""
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from .. import sequences
+
+
+def upgrade(conn: Connection) -> None:
+    # 会话加入迁移的事务，随迁移一起提交
+    with Session(bind=conn, join_transaction_mode="create_savepoint") as db:
+        sequences.seed(db)
+        db.commit()
+
+
+def downgrade(conn: Connection) -> None:
+    # 计数器本身由 v0001 建表；回退后首次分配时会按已有数据重新算起点，这里不需要删除
+    pass
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Numeric, Enum, ForeignKey,Text
+from sqlalchemy import Column, Integer, String, Date, DateTime, Numeric, Enum, ForeignKey, Index, Text, func, literal_column
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -23,6 +23,14 @@ class OrderStatus(str, enum.Enum):
 	done = "done"
 
 
+def text_search_vector(column):
+	"""全文检索用的 tsvector 表达式（PostgreSQL，'simple' 配置：只按空白和标点分词、转小写，不做词干处理）
+
+	GIN 索引和 search.py 里的查询必须用同一个表达式，计划器才能用上索引。
+	"""
+	return func.to_tsvector(literal_column("'simple'"), column)
+
+
 class Product(Base):
 	__tablename__ = "products"
 
@@ -34,8 +42,20 @@ class Product(Base):
 	preset_price = Column(Numeric(12, 2), nullable=True)
 	actual_price = Column(Numeric(12, 2), nullable=True)
 
+	# 销售累计（迁移 v0004），由订单写入路径在同一事务里维护，见 product_sales.py
+	units_sold = Column(Integer, nullable=False, default=0)
+	revenue = Column(Numeric(14, 2), nullable=False, default=0)
+	profit_total = Column(Numeric(14, 2), nullable=False, default=0)
+	last_sold_at = Column(DateTime, nullable=True)
+
 	orders = relationship("Order", back_populates="product")
 
+	# 搜索用的索引（迁移 v0006，只在 PostgreSQL 上创建）：商品名全文检索、SKU 前缀匹配
+	__table_args__ = (
+		Index("ix_products_name_fts", text_search_vector(name), postgresql_using="gin").ddl_if(dialect="postgresql"),
+		Index("ix_products_sku_prefix", sku, postgresql_ops={"sku": "varchar_pattern_ops"}).ddl_if(dialect="postgresql"),
+	)
+
 
 class Order(Base):
 	__tablename__ = "orders"
@@ -55,4 +75,73 @@ class Order(Base):
 	remark = Column(Text, nullable=True)  # 可为空的备注字段
 	
 	product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
-	product = relationship("Product", back_populates="orders")
+	# 不允许隐式懒加载（会变成每个订单一条 SELECT）：需要商品时用 contains_eager / selectinload
+	product = relationship("Product", back_populates="orders", lazy="raise_on_sql")
+
+	# 报表筛选和按商品查询用的复合索引（迁移 v0003）；搜索用的索引（迁移 v0006，只在 PostgreSQL 上创建）
+	__table_args__ = (
+		Index("ix_orders_transaction_date_channel", "transaction_date", "channel"),
+		Index("ix_orders_product_id_id", "product_id", "id"),
+		Index("ix_orders_buyer_name_fts", text_search_vector(buyer_name), postgresql_using="gin").ddl_if(dialect="postgresql"),
+		Index("ix_orders_remark_fts", text_search_vector(remark), postgresql_using="gin").ddl_if(dialect="postgresql"),
+		Index("ix_orders_order_number_prefix", order_number, postgresql_ops={"order_number": "varchar_pattern_ops"}).ddl_if(dialect="postgresql"),
+	)
+
+
+class DailySalesRollup(Base):
+	"""按天汇总的销售数据（由 crud 的订单写入路径增量维护，见 rollup.py）
+
+	transaction_date 为空的订单记在 rollup.UNDATED_DAY 这一天。
+	"""
+	__tablename__ = "daily_sales_rollup"
+
+	day = Column(Date, primary_key=True)
+	channel = Column(Enum(Channel), primary_key=True)
+	payment_method = Column(Enum(PaymentMethod), primary_key=True)
+	status = Column(Enum(OrderStatus), primary_key=True)
+	product_id = Column(Integer, ForeignKey("products.id"), primary_key=True, index=True)
+
+	total_sales = Column(Numeric(14, 2), nullable=False, default=0)
+	total_cost = Column(Numeric(14, 2), nullable=False, default=0)
+	total_profit = Column(Numeric(14, 2), nullable=False, default=0)
+	order_count = Column(Integer, nullable=False, default=0)
+	quantity = Column(Integer, nullable=False, default=0)
+
+
+class SequenceCounter(Base):
+	"""编号计数器（见 sequences.py）：sku:<前缀> 记录 SKU 序号，order:<商品id> 记录订单号序号"""
+	__tablename__ = "sequence_counters"
+
+	name = Column(String(128), primary_key=True)
+	value = Column(Integer, nullable=False, default=0)
+
+
+class InventoryMovement(Base):
+	"""库存流水（只追加）：每次库存变化一行，见 inventory.py
+
+	delta 为变化量，quantity_after 为变化后的库存；同一商品的流水在商品行锁内写入，id 顺序即发生顺序。
+	"""
+	__tablename__ = "inventory_movements"
+
+	id = Column(Integer, primary_key=True)
+	product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+	created_at = Column(DateTime, nullable=False)
+	delta = Column(Integer, nullable=False)
+	quantity_after = Column(Integer, nullable=False)
+	reason = Column(String(32), nullable=False)
+	order_number = Column(String(64), nullable=True)
+
+	__table_args__ = (
+		Index("ix_inventory_movements_product_id_id", "product_id", "id"),
+	)
+
+
+class InventorySnapshot(Base):
+	"""库存快照：taken_at 时刻的库存，movement_id 为快照已包含的该商品最后一条流水"""
+	__tablename__ = "inventory_snapshots"
+
+	# 不设外键：打快照时不对商品行加 KEY SHARE 锁，不和正在下单的事务抢行锁（删除商品时由 inventory.remove_product 清理）
+	product_id = Column(Integer, primary_key=True)
+	taken_at = Column(DateTime, primary_key=True)
+	quantity = Column(Integer, nullable=False)
+	movement_id = Column(Integer, nullable=False)
@@ -0,0 +1,215 @@
+"""商品维度的销售累计：products.units_sold / revenue / profit_total / last_sold_at
+
+- units_sold：已售数量，revenue：销售额（售价 × 数量），profit_total：订单利润之和
+- last_sold_at：最近一笔订单的销售时间（交易日期，没有交易日期时用创建时间）
+
+订单的新增/修改/删除在 crud 里把增量记进 SalesDelta，和库存变化一起在同一条
+UPDATE products 里写入（见 crud._adjust_stock），商品列表直接读这几列，不需要聚合 orders。
+成本价变化时 reprice_products 按新的订单利润重算 profit_total。
+
+命令行（在 backend/ 目录下执行）：
+    python -m app.product_sales rebuild   # 从 orders 全量重算
+    python -m app.product_sales check     # 校验与 orders 是否一致
+"""
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+
+COUNTER_COLUMNS = ("units_sold", "revenue", "profit_total", "last_sold_at")
+
+
+def sold_at(order: models.Order) -> datetime:
+    """订单的销售时间"""
+    return order.transaction_date or order.created_at
+
+
+def _sold_at_column():
+    return func.coalesce(models.Order.transaction_date, models.Order.created_at)
+
+
+@dataclass
+class SalesDelta:
+    """一个商品在本次写入中的销售累计变化
+
+    add(order) 计入新增订单（或修改后的新状态），add(order, -1) 扣除删除的订单（或修改前的旧状态）。
+    被扣除的订单记下 id 和最晚的销售时间：只有它们可能是当前的 last_sold_at 时，
+    才需要从 orders 里（排除这些订单）重新取最大值。
+    """
+
+    units: int = 0
+    revenue: Decimal = Decimal(0)
+    profit: Decimal = Decimal(0)
+    latest: datetime | None = None
+    removed: set[int] = field(default_factory=set)
+    removed_latest: datetime | None = None
+
+    def add(self, order: models.Order, sign: int = 1) -> None:
+        when = sold_at(order)
+        self._add(order.quantity, order.actual_price, order.profit, when, sign)
+        if sign < 0 and order.id is not None:
+            self.removed.add(order.id)
+            if when is not None and (self.removed_latest is None or when > self.removed_latest):
+                self.removed_latest = when
+
+    def add_row(self, row: dict) -> None:
+        """计入一行待 INSERT 的订单（批量导入用的字典）"""
+        self._add(row["quantity"], row["actual_price"], row["profit"],
+                  row["transaction_date"] or row["created_at"], 1)
+
+    def _add(self, quantity, actual_price, profit, when: datetime | None, sign: int) -> None:
+        quantity = int(quantity)
+        self.units += sign * quantity
+        self.revenue += sign * Decimal(str(actual_price)) * quantity
+        self.profit += sign * Decimal(str(profit))
+        if sign > 0 and when is not None and (self.latest is None or when > self.latest):
+            self.latest = when
+
+    def totals(self, product: models.Product) -> dict:
+        """已加行锁的商品加上本次变化后的累计值（只有新增订单时可用，按主键批量 UPDATE）"""
+        latest = product.last_sold_at
+        if self.latest is not None and (latest is None or self.latest > latest):
+            latest = self.latest
+        return {
+            "units_sold": (product.units_sold or 0) + self.units,
+            "revenue": Decimal(str(product.revenue or 0)) + self.revenue,
+            "profit_total": Decimal(str(product.profit_total or 0)) + self.profit,
+            "last_sold_at": latest,
+        }
+
+    def __bool__(self) -> bool:
+        return bool(self.units or self.revenue or self.profit or self.latest or self.removed)
+
+    def values(self, product_id: int) -> dict:
+        """UPDATE products 的 SET 表达式（在写入订单之前执行，orders 里还是旧数据）"""
+        table = models.Product.__table__
+        values = {}
+        if self.units or self.revenue or self.profit:
+            values["units_sold"] = table.c.units_sold + self.units
+            values["revenue"] = table.c.revenue + self.revenue
+            values["profit_total"] = table.c.profit_total + self.profit
+
+        previous = table.c.last_sold_at
+        if self.removed_latest is not None:
+            # 有订单被删除或修改：当前值比它们都晚时不受影响；否则取其余订单里最晚的销售时间，
+            # 再和新增/修改后的时间取较晚者
+            rest = (
+                select(func.max(_sold_at_column()))
+                .where(models.Order.product_id == product_id, models.Order.id.not_in(self.removed))
+                .scalar_subquery()
+            )
+            previous = case((previous > self.removed_latest, previous), else_=rest)
+        if self.latest is not None:
+            values["last_sold_at"] = case(
+                (previous.is_(None), self.latest),
+                (previous < self.latest, self.latest),
+                else_=previous,
+            )
+        elif self.removed_latest is not None:
+            values["last_sold_at"] = previous
+        return values
+
+
+def reprice_products(db: Session, product_ids) -> dict[int, Decimal]:
+    """成本价变化、订单利润已按新成本重算后，同步这些商品的 profit_total，返回 {商品 id: 新值}"""
+    table = models.Product.__table__
+    total = (
+        select(func.coalesce(func.sum(models.Order.profit), 0))
+        .where(models.Order.product_id == table.c.id)
+        .scalar_subquery()
+    )
+    rows = db.execute(
+        update(table).where(table.c.id.in_(list(product_ids))).values(profit_total=total)
+        .returning(table.c.id, table.c.profit_total)
+    )
+    return {row.id: row.profit_total for row in rows}
+
+
+def _expected_select():
+    """从 orders 直接聚合出每个商品应有的累计值"""
+    o = models.Order
+    return (
+        select(
+            o.product_id,
+            func.sum(o.quantity).label("units_sold"),
+            func.sum(o.actual_price * o.quantity).label("revenue"),
+            func.sum(o.profit).label("profit_total"),
+            func.max(_sold_at_column()).label("last_sold_at"),
+        )
+        .group_by(o.product_id)
+    )
+
+
+def rebuild(db: Session) -> int:
+    """从 orders 全量重算所有商品的累计值（一条 UPDATE），返回更新的商品数"""
+    table = models.Product.__table__
+    o = models.Order
+
+    def per_product(expr):
+        return select(expr).where(o.product_id == table.c.id).scalar_subquery()
+
+    result = db.execute(update(table).values(
+        units_sold=per_product(func.coalesce(func.sum(o.quantity), 0)),
+        revenue=per_product(func.coalesce(func.sum(o.actual_price * o.quantity), 0)),
+        profit_total=per_product(func.coalesce(func.sum(o.profit), 0)),
+        last_sold_at=per_product(func.max(_sold_at_column())),
+    ))
+    db.commit()
+    return result.rowcount
+
+
+def _normalize(row) -> tuple:
+    last_sold_at = row.last_sold_at
+    if last_sold_at is not None and not isinstance(last_sold_at, datetime):
+        last_sold_at = datetime.fromisoformat(str(last_sold_at))
+    return (
+        int(row.units_sold or 0),
+        Decimal(str(row.revenue or 0)),
+        Decimal(str(row.profit_total or 0)),
+        last_sold_at,
+    )
+
+
+def check(db: Session) -> list[dict]:
+    """对比 orders 与商品上的累计值，返回不一致的商品（空列表表示一致）"""
+    p = models.Product
+    expected = {row.product_id: _normalize(row) for row in db.execute(_expected_select())}
+    zero = (0, Decimal(0), Decimal(0), None)
+    mismatches = []
+    for row in db.execute(select(p.id, p.sku, *(getattr(p, name) for name in COUNTER_COLUMNS)).order_by(p.id)):
+        want, got = expected.get(row.id, zero), _normalize(row)
+        if want != got:
+            mismatches.append({
+                "sku": row.sku,
+                "expected": dict(zip(COUNTER_COLUMNS, want)),
+                "actual": dict(zip(COUNTER_COLUMNS, got)),
+            })
+    return mismatches
+
+
+def main(argv: list[str]) -> int:
+    """命令行入口：rebuild 重算，check 校验"""
+    from .database import SessionLocal
+
+    command = argv[0] if argv else ""
+    if command not in ("rebuild", "check"):
+        print("usage: python -m app.product_sales [rebuild|check]")
+        return 2
+    with SessionLocal() as db:
+        if command == "rebuild":
+            print(f"product sales totals rebuilt: {rebuild(db)} products")
+            return 0
+        mismatches = check(db)
+        for item in mismatches:
+            print(item)
+        print(f"product sales totals check: {len(mismatches)} mismatched products")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
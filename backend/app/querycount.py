@@ -0,0 +1,202 @@
+"""统计每个操作发出的 SQL 语句数，发现 N+1 查询
+
+    with count_queries(engine) as counter:
+        crud.list_orders(db)
+    print(counter.count, counter.statements)
+
+命令行（在 backend/ 目录下执行）：在一个最后整体回滚的事务里，把各接口背后的操作
+（订单/商品的读写、批量和导入、库存流水、搜索、补货预测、各报表）各执行一遍（每个操作用一个
+新会话，和真实请求一样从空的 identity map 开始），语句数超过 QUERY_BUDGETS 就返回非零退出码：
+
+    python -m app.querycount
+
+tests/test_querycount.py 在 pytest 里跑同样的检查。
+
+预算与订单数量无关；如果某个改动让语句数随订单数增长（懒加载 order.product 之类），
+这里会先失败。
+"""
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import crud, forecast, models, schemas, search
+from .cache import report_cache
+
+# 每个操作允许的最多语句数（不含 SAVEPOINT 之类的事务控制语句）；写订单的操作含一条库存流水 INSERT
+QUERY_BUDGETS = {
+    "create_order": 7,
+    "get_order": 1,
+    "update_order": 9,
+    "delete_order": 7,
+    "list_orders": 1,
+    "list_products": 1,
+    # SQLite 上 ORM 插入不能用带 RETURNING 的批量 INSERT，新增的 SAMPLE_ORDERS 单逐条插入；PostgreSQL 上是 9
+    "order_batch": 13,
+    "import_orders": 6,
+    "import_products": 7,
+    "stock_history": 4,
+    # 没凑满一页时每个相关度档位一条
+    "search": 10,
+    "reorder": 2,
+    "report": 4,
+    "sales_summary": 1,
+    "channel_stats": 1,
+    "product_stats": 1,
+    "time_series": 1,
+    "top_products": 1,
+    "abc_classes": 1,
+    "price_percentiles": 2,
+}
+
+# 预置的订单数：N+1 的操作会多出至少这么多条语句
+SAMPLE_ORDERS = 5
+
+_TRANSACTION_CONTROL = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+class QueryCounter:
+    """before_cursor_execute 里记录的语句"""
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(_TRANSACTION_CONTROL):
+            self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine: Engine):
+    """在 with 块内统计 engine 上执行的语句（异步引擎传 async_engine.sync_engine）"""
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._record)
+
+
+def _order_payload(sku: str) -> schemas.OrderCreate:
+    return schemas.OrderCreate(
+        product_sku=sku,
+        actual_price=12.5,
+        quantity=1,
+        transaction_date=datetime.utcnow(),
+        payment_method=models.PaymentMethod.cash,
+        channel=models.Channel.ebay,
+        status=models.OrderStatus.done,
+        remark=None,
+    )
+
+
+def _order_import(sku: str, order_number: str) -> schemas.OrderImport:
+    return schemas.OrderImport(**_order_payload(sku).model_dump(), order_number=order_number)
+
+
+def _reorder(db: Session):
+    """补货建议；结果按 report_cache 的代数缓存，先让缓存失效，统计的是重新计算的语句数"""
+    report_cache.invalidate()
+    return forecast.reorder_items(db, include_all=True)
+
+
+def measure(engine: Engine) -> dict[str, int]:
+    """在回滚的事务里执行各操作，返回 {操作名: 语句数}"""
+    from .database import settings
+
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        if conn.dialect.name == "sqlite":
+            # pysqlite 不会为外层事务发 BEGIN，释放最外层保存点就等于提交；这里显式开启
+            conn.exec_driver_sql("BEGIN")
+
+        def session() -> Session:
+            # crud 里的 commit 变成释放保存点，外层事务最后回滚，不留下任何数据
+            return Session(bind=conn, join_transaction_mode="create_savepoint",
+                           autoflush=False, expire_on_commit=settings.expire_on_commit)
+
+        with session() as db:
+            product = crud.create_product(db, schemas.ProductCreate(
+                sku="QUERYCOUNT", name="querycount sample product", cost_price=Decimal("5.00"), quantity=1000,
+            ))
+            sku = product.sku
+            orders = [crud.create_order(db, _order_payload(sku)) for _ in range(SAMPLE_ORDERS)]
+            order_ids = [order.id for order in orders]
+            order_numbers = [order.order_number for order in orders]
+
+        filters = schemas.ReportFilters(product_skus=[sku])
+        operations = {
+            "create_order": lambda db: crud.create_order(db, _order_payload(sku)),
+            "get_order": lambda db: crud.get_order_by_id(db, order_ids[0]),
+            "update_order": lambda db: crud.update_order(
+                db, crud.get_order_by_id(db, order_ids[1], with_product=True, for_update=True),
+                schemas.OrderUpdate(quantity=2),
+            ),
+            "delete_order": lambda db: crud.delete_order(
+                db, crud.get_order_by_id(db, order_ids[2], with_product=True, for_update=True),
+            ),
+            "list_orders": lambda db: crud.list_orders(db, filters),
+            "list_products": lambda db: crud.list_products(db, skus=[sku]),
+            "order_batch": lambda db: crud.apply_order_batch(db, schemas.OrderBatch(
+                create=[_order_payload(sku) for _ in range(SAMPLE_ORDERS)],
+                update=[schemas.OrderBatchUpdate(id=order_ids[3], quantity=3)],
+                delete=[order_ids[4]],
+            )),
+            # 含一个已存在的订单号（跳过）
+            "import_orders": lambda db: crud.upsert_orders(db, [
+                _order_import(sku, order_number)
+                for order_number in [order_numbers[0], *(f"QUERYCOUNT-{i}" for i in range(SAMPLE_ORDERS))]
+            ]),
+            "import_products": lambda db: crud.upsert_products(db, [
+                schemas.ProductCreate(sku="QUERYCOUNT", name=name, cost_price=Decimal("6.00"), quantity=1000)
+                for name in ["querycount sample product", *(f"querycount import {i}" for i in range(SAMPLE_ORDERS))]
+            ]),
+            "stock_history": lambda db: crud.get_stock_history(db, crud.get_product_by_sku(db, sku)),
+            "search": lambda db: search.search(db, "querycount"),
+            "reorder": _reorder,
+            "report": lambda db: crud.generate_comprehensive_report(db, filters),
+            "sales_summary": lambda db: crud.calculate_sales_summary(db, filters),
+            "channel_stats": lambda db: crud.calculate_channel_stats(db, filters),
+            "product_stats": lambda db: crud.calculate_product_stats(db, filters),
+            "time_series": lambda db: crud.calculate_time_series(db, filters),
+            "top_products": lambda db: crud.calculate_top_products(db, filters),
+            "abc_classes": lambda db: crud.calculate_abc_classes(db, filters),
+            "price_percentiles": lambda db: crud.calculate_price_percentiles(db, filters),
+        }
+        counts = {}
+        try:
+            for name, operation in operations.items():
+                with session() as db, count_queries(engine) as counter:
+                    operation(db)
+                counts[name] = counter.count
+        finally:
+            transaction.rollback()
+    return counts
+
+
+def main(argv: list[str]) -> int:
+    """命令行入口"""
+    from .database import engine
+
+    if argv:
+        print("usage: python -m app.querycount")
+        return 2
+    failed = False
+    for name, count in measure(engine).items():
+        budget = QUERY_BUDGETS[name]
+        status = "ok" if count <= budget else "OVER BUDGET"
+        failed = failed or count > budget
+        print(f"{name:<17} {count:>3} / {budget:<3} {status}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,211 @@
+"""报表计算核心：按列批量取出订单，用整数分做精确的定点运算，一次向量化分组
+
+常规报表在 SQL 里聚合（crud 里的 calculate_* / generate_comprehensive_report）；SQL 不方便表达的
+指标（自定义毛利口径、分位数等）在这里算：
+
+- 金额在 SQL 里换算成整数分（ROUND(x * 100) 转 BIGINT）再取回，存成 int64 列，
+  乘法和求和都是整数运算，结果与库里的 Numeric(12, 2) 完全一致，输出时再转成 Decimal
+- 一次 group_by 按最细的分组键聚合全部订单，更粗的分组（汇总/渠道/商品/时间）都从这个
+  小结果表再合计，不对订单逐行循环
+- 向量化计算用已有依赖 pyarrow（pyarrow.compute），不额外引入 NumPy
+
+售价分位数报表在 PostgreSQL 以外的数据库上直接用这里的 quantiles 计算。
+
+命令行（在 backend/ 目录下执行）：用精确计算核对 SQL 报表（含日汇总表）和售价分位数的结果
+    python -m app.report_core check
+"""
+import sys
+from decimal import Decimal
+from typing import Sequence
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import BigInteger, Select, cast, func
+from sqlalchemy.orm import Session
+
+LOAD_BATCH_SIZE = 10000
+
+# 取回的订单列（crud.report_orders_query 的列顺序），金额都是整数分
+ORDER_SCHEMA = pa.schema([
+    ("product_id", pa.int64()),
+    ("channel", pa.string()),
+    ("bucket", pa.string()),
+    ("quantity", pa.int64()),
+    ("price_cents", pa.int64()),
+    ("cost_cents", pa.int64()),
+    ("profit_cents", pa.int64()),
+])
+
+# 售价分位数取回的列（crud.calculate_exact_price_percentiles）
+PRICE_SCHEMA = pa.schema([
+    ("product_id", pa.int64()),
+    ("price_cents", pa.int64()),
+])
+
+# group_totals 输出的合计列
+TOTAL_COLUMNS = ("total_sales", "total_cost", "total_profit", "quantity", "order_count")
+
+
+def cents(column):
+    """金额列 -> 整数分的 SQL 表达式（SQLite 上 Numeric 存成浮点，先 ROUND 再转整数）"""
+    return cast(func.round(column * 100), BigInteger)
+
+
+def load(db: Session, stmt: Select, schema: pa.Schema = ORDER_SCHEMA,
+         batch_size: int = LOAD_BATCH_SIZE) -> pa.Table:
+    """按批执行查询，每批按列转成 pyarrow 数组，拼成一张表
+
+    直接在会话的连接上执行（同一个事务），结果行不经过 ORM 的结果处理。
+    """
+    batches = []
+    for rows in db.connection().execute(stmt.execution_options(yield_per=batch_size)).partitions():
+        columns = list(zip(*rows))
+        arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema)]
+        batches.append(pa.RecordBatch.from_arrays(arrays, schema=schema))
+    return pa.Table.from_batches(batches, schema=schema)
+
+
+def with_amounts(table: pa.Table) -> pa.Table:
+    """加上每单的销售额/成本（分）：单价 × 数量，溢出时报错而不是回绕"""
+    quantity = table["quantity"]
+    return (
+        table
+        .append_column("sales_cents", pc.multiply_checked(table["price_cents"], quantity))
+        .append_column("line_cost_cents", pc.multiply_checked(table["cost_cents"], quantity))
+    )
+
+
+def _aggregate(table: pa.Table, keys: Sequence[str], aggregations: list[tuple[str, str]]) -> pa.Table:
+    """group_by + aggregate，输出列按名字取出并改名为 keys + TOTAL_COLUMNS（不依赖 pyarrow 版本的列顺序）"""
+    grouped = table.group_by(list(keys), use_threads=False).aggregate(aggregations)
+    names = [f"{column}_{function}" for column, function in aggregations]
+    return grouped.select([*keys, *names]).rename_columns([*keys, *TOTAL_COLUMNS])
+
+
+def group_totals(table: pa.Table, keys: Sequence[str]) -> pa.Table:
+    """一次向量化分组：按 keys 合计销售额/成本/利润（分）、数量和订单数"""
+    return _aggregate(with_amounts(table), keys, [
+        ("sales_cents", "sum"),
+        ("line_cost_cents", "sum"),
+        ("profit_cents", "sum"),
+        ("quantity", "sum"),
+        ("quantity", "count"),
+    ])
+
+
+def regroup(totals: pa.Table, keys: Sequence[str]) -> pa.Table:
+    """把 group_totals 的结果按更粗的 keys 再合计（keys 为空时合计成一行）"""
+    if not keys:
+        return pa.table({name: [pc.sum(totals[name]).as_py() or 0] for name in TOTAL_COLUMNS})
+    return _aggregate(totals, keys, [(name, "sum") for name in TOTAL_COLUMNS])
+
+
+def to_decimal(value_cents: int | None) -> Decimal:
+    """整数分 -> 两位小数的 Decimal"""
+    return Decimal(value_cents or 0).scaleb(-2)
+
+
+def margin(profit_cents: int, sales_cents: int) -> Decimal:
+    """利润率 (%)，由整数分直接计算，不经过 float"""
+    if sales_cents <= 0:
+        return Decimal(0)
+    return Decimal(profit_cents) * 100 / Decimal(sales_cents)
+
+
+def quantiles(table: pa.Table, key: str, value: str, qs: Sequence[Decimal]) -> dict:
+    """每个分组内 value 列的精确分位数（与 SQL percentile_cont 相同的线性插值）
+
+    按 (key, value) 排序一次，分组后各组在排序结果里是连续的一段；每个分位数只需要
+    段内两个位置的值，用一次 take 批量取出。返回 {分组键: [Decimal, ...]}，value 为整数分时
+    结果也是分。
+    """
+    table = table.select([key, value]).filter(pc.is_valid(table[value]))
+    if table.num_rows == 0:
+        return {}
+    table = table.take(pc.sort_indices(table, sort_keys=[(key, "ascending"), (value, "ascending")]))
+    # 排好序的分组键做游程编码：每段一个分组，run_ends 是各段的结束位置
+    runs = pc.run_end_encode(table[key].combine_chunks())
+    keys = runs.values.to_pylist()
+    ends = runs.run_ends.to_pylist()
+
+    positions = []
+    offset = 0
+    for end in ends:
+        size = end - offset
+        for q in qs:
+            rank = Decimal(q) * (size - 1)
+            low = int(rank)
+            positions.append((offset + low, offset + min(low + 1, size - 1), rank - low))
+        offset = end
+    picked = table[value].take(pa.array([p for low, high, _ in positions for p in (low, high)])).to_pylist()
+
+    result = {}
+    for index, group in enumerate(keys):
+        values = []
+        for j in range(len(qs)):
+            n = index * len(qs) + j
+            low_value, high_value = picked[2 * n], picked[2 * n + 1]
+            values.append(low_value + (high_value - low_value) * positions[n][2])
+        result[group] = values
+    return result
+
+
+# 核对时允许的误差：SQLite 上 Numeric 按浮点求和，会有分以下的漂移
+_TOLERANCE = 0.005
+
+
+def _compare(name: str, expected: dict, actual: dict) -> list[dict]:
+    mismatches = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        want, got = expected.get(key), actual.get(key)
+        if want is None or got is None or any(
+            abs(want[field] - got[field]) > _TOLERANCE for field in want
+        ):
+            mismatches.append({"section": name, "key": key, "sql": want, "exact": got})
+    return mismatches
+
+
+def check(db: Session, filters=None) -> list[dict]:
+    """SQL 报表与精确计算的结果对比，返回不一致的分组（空列表表示一致）"""
+    from . import crud, schemas
+
+    filters = filters or schemas.ReportFilters()
+    sql = crud.generate_comprehensive_report(db, filters)
+    exact = crud.generate_exact_report(db, filters)
+    sql_prices = crud.calculate_price_percentiles(db, filters)
+    exact_prices = crud.calculate_exact_price_percentiles(db, filters)
+
+    def keyed(items, key):
+        return {key(item): item.model_dump(exclude={"channel", "product_sku", "product_name", "date"})
+                for item in items}
+
+    return [
+        *_compare("summary", {None: sql.summary.model_dump()}, {None: exact.summary.model_dump()}),
+        *_compare("channels", keyed(sql.channel_stats, lambda s: s.channel.value),
+                  keyed(exact.channel_stats, lambda s: s.channel.value)),
+        *_compare("products", keyed(sql.product_stats, lambda s: s.product_sku),
+                  keyed(exact.product_stats, lambda s: s.product_sku)),
+        *_compare("time_series", keyed(sql.time_series, lambda t: t.date),
+                  keyed(exact.time_series, lambda t: t.date)),
+        *_compare("price_percentiles", keyed(sql_prices, lambda s: s.product_sku),
+                  keyed(exact_prices, lambda s: s.product_sku)),
+    ]
+
+
+def main(argv: list[str]) -> int:
+    """命令行入口：check 核对 SQL 报表和售价分位数"""
+    from .database import SessionLocal
+
+    if argv != ["check"]:
+        print("usage: python -m app.report_core check")
+        return 2
+    with SessionLocal() as db:
+        mismatches = check(db)
+    for item in mismatches:
+        print(item)
+    print(f"report check: {len(mismatches)} mismatched groups")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
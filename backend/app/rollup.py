@@ -0,0 +1,267 @@
+"""按天销售汇总表 daily_sales_rollup 的维护
+
+- add_order / remove_order / add_rows / reprice_products：由 crud 的写入路径调用，和订单改动在同一个事务里提交
+- merge_delta / apply_merged：批量写入时先在内存里按分组键合并，再一次写入
+- rebuild：从 orders 全量重建（回填）
+- check：对比 orders 与汇总表，列出不一致的分组
+
+命令行（在 backend/ 目录下执行）：
+    python -m app.rollup rebuild
+    python -m app.rollup check
+"""
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import select, delete, update, func, cast, literal, Date
+from sqlalchemy.orm import Session
+
+from . import models
+
+# transaction_date 为空的订单统一记在这一天，按日期筛选/时间序列时排除
+UNDATED_DAY = date.min
+
+# 报表是否优先读汇总表（设为 0/false 时回退为直接扫描 orders）
+REPORT_USE_ROLLUP = os.getenv("REPORT_USE_ROLLUP", "true").lower() not in ("0", "false", "no")
+
+KEY_COLUMNS = ("day", "channel", "payment_method", "status", "product_id")
+VALUE_COLUMNS = ("total_sales", "total_cost", "total_profit", "order_count", "quantity")
+# 订单上决定分组键的字段
+ORDER_KEY_FIELDS = ("transaction_date", "channel", "payment_method", "status", "product_id")
+
+
+def dialect_insert(db: Session):
+    """按方言返回支持 ON CONFLICT 的 insert()"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def _key_filter(key: dict) -> list:
+    table = models.DailySalesRollup.__table__
+    return [table.c[name] == value for name, value in key.items()]
+
+
+def order_key(order: models.Order) -> dict:
+    """订单在汇总表中的分组键"""
+    return row_key({name: getattr(order, name) for name in ORDER_KEY_FIELDS})
+
+
+def row_key(row: dict) -> dict:
+    """订单字段字典（批量 insert 用的参数）在汇总表中的分组键"""
+    transaction_date = row.get("transaction_date")
+    return {
+        "day": transaction_date.date() if transaction_date else UNDATED_DAY,
+        "channel": row["channel"],
+        "payment_method": row["payment_method"],
+        "status": row["status"],
+        "product_id": row["product_id"],
+    }
+
+
+def order_values(order: models.Order, product: models.Product) -> dict:
+    """订单对汇总表各指标的贡献"""
+    quantity = int(order.quantity)
+    return {
+        "total_sales": Decimal(str(order.actual_price)) * quantity,
+        "total_cost": product.cost_price * quantity,
+        "total_profit": Decimal(str(order.profit)),
+        "order_count": 1,
+        "quantity": quantity,
+    }
+
+
+def apply_delta(db: Session, key: dict, values: dict) -> None:
+    """把一组增量累加到汇总表（INSERT ... ON CONFLICT DO UPDATE），订单数归零的分组直接删除"""
+    table = models.DailySalesRollup.__table__
+    stmt = dialect_insert(db)(table).values(**key, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={name: table.c[name] + stmt.excluded[name] for name in VALUE_COLUMNS},
+    )
+    db.execute(stmt)
+    if values["order_count"] < 0:
+        db.execute(delete(table).where(*_key_filter(key), table.c.order_count <= 0))
+
+
+def merge_delta(merged: dict, key: dict, values: dict, sign: int = 1) -> None:
+    """把一笔贡献按分组键累加到 merged（sign=-1 为扣除），最后用 apply_merged 一次写入"""
+    totals = merged.setdefault(tuple(key.values()), {name: 0 for name in VALUE_COLUMNS})
+    for name in VALUE_COLUMNS:
+        totals[name] += sign * values[name]
+
+
+def apply_merged(db: Session, merged: dict) -> None:
+    """把合并好的增量用一条 executemany upsert 写入汇总表，再删掉因扣除而订单数归零的分组"""
+    changes = [
+        {**dict(zip(KEY_COLUMNS, key)), **values}
+        for key, values in merged.items()
+        if any(values.values())
+    ]
+    if not changes:
+        return
+    table = models.DailySalesRollup.__table__
+    stmt = dialect_insert(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={name: table.c[name] + stmt.excluded[name] for name in VALUE_COLUMNS},
+    )
+    db.execute(stmt, changes)
+    shrunk = {change["product_id"] for change in changes if change["order_count"] < 0}
+    if shrunk:
+        db.execute(delete(table).where(table.c.product_id.in_(shrunk), table.c.order_count <= 0))
+
+
+def add_rows(db: Session, rows: list[dict], cost_by_product: dict) -> None:
+    """批量导入：把多条新订单按分组键先在内存合并，再用一条 executemany upsert 写入汇总表"""
+    merged: dict[tuple, dict] = {}
+    for row in rows:
+        quantity = int(row["quantity"])
+        merge_delta(merged, row_key(row), {
+            "total_sales": row["actual_price"] * quantity,
+            "total_cost": cost_by_product[row["product_id"]] * quantity,
+            "total_profit": row["profit"],
+            "order_count": 1,
+            "quantity": quantity,
+        })
+    apply_merged(db, merged)
+
+
+def add_order(db: Session, order: models.Order, product: models.Product) -> None:
+    """新增订单（或订单修改后的新状态）计入汇总表"""
+    apply_delta(db, order_key(order), order_values(order, product))
+
+
+def remove_order(db: Session, order: models.Order, product: models.Product) -> None:
+    """删除订单（或订单修改前的旧状态）从汇总表扣除"""
+    values = {name: -value for name, value in order_values(order, product).items()}
+    apply_delta(db, order_key(order), values)
+
+
+def reprice_products(db: Session, product_ids) -> None:
+    """商品成本价变化后，按数据库中的新成本重算这些商品所有分组的成本和利润"""
+    table = models.DailySalesRollup.__table__
+    cost = (
+        select(models.Product.cost_price)
+        .where(models.Product.id == table.c.product_id)
+        .scalar_subquery()
+    )
+    db.execute(
+        update(table)
+        .where(table.c.product_id.in_(list(product_ids)))
+        .values(
+            total_cost=table.c.quantity * cost,
+            total_profit=table.c.total_sales - table.c.quantity * cost,
+        )
+    )
+
+
+def _order_day(db: Session):
+    """订单交易日期（按天）的 SQL 表达式"""
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(models.Order.transaction_date, Date)
+    return func.date(models.Order.transaction_date)
+
+
+def _expected_select(db: Session):
+    """从 orders 直接聚合出汇总表应有的内容"""
+    day = _order_day(db)
+    return (
+        select(
+            func.coalesce(day, literal(UNDATED_DAY, Date)).label("day"),
+            models.Order.channel,
+            models.Order.payment_method,
+            models.Order.status,
+            models.Order.product_id,
+            func.sum(models.Order.actual_price * models.Order.quantity).label("total_sales"),
+            func.sum(models.Product.cost_price * models.Order.quantity).label("total_cost"),
+            func.sum(models.Order.profit).label("total_profit"),
+            func.count(models.Order.id).label("order_count"),
+            func.sum(models.Order.quantity).label("quantity"),
+        )
+        .select_from(models.Order)
+        .join(models.Product, models.Order.product_id == models.Product.id)
+        .group_by(
+            day,
+            models.Order.channel,
+            models.Order.payment_method,
+            models.Order.status,
+            models.Order.product_id,
+        )
+    )
+
+
+def rebuild(db: Session) -> int:
+    """清空并从 orders 全量重建汇总表，返回写入的分组数"""
+    table = models.DailySalesRollup.__table__
+    db.execute(delete(table))
+    result = db.execute(
+        table.insert().from_select(list(KEY_COLUMNS + VALUE_COLUMNS), _expected_select(db))
+    )
+    db.commit()
+    return result.rowcount
+
+
+def _normalize_day(value) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def check(db: Session) -> list[dict]:
+    """对比 orders 与汇总表，返回不一致的分组（空列表表示一致）"""
+    def index(rows):
+        result = {}
+        for row in rows:
+            key = (_normalize_day(row.day),) + tuple(getattr(row, name) for name in KEY_COLUMNS[1:])
+            result[key] = tuple(Decimal(str(getattr(row, name) or 0)) for name in VALUE_COLUMNS)
+        return result
+
+    expected = index(db.execute(_expected_select(db)))
+    actual = index(db.execute(select(models.DailySalesRollup.__table__)))
+    zero = tuple(Decimal(0) for _ in VALUE_COLUMNS)
+    mismatches = []
+    for key in sorted(expected.keys() | actual.keys(), key=str):
+        want, got = expected.get(key, zero), actual.get(key, zero)
+        if want != got:
+            mismatches.append({
+                "key": dict(zip(KEY_COLUMNS, key)),
+                "expected": dict(zip(VALUE_COLUMNS, want)),
+                "actual": dict(zip(VALUE_COLUMNS, got)),
+            })
+    return mismatches
+
+
+def ensure_backfilled(db: Session) -> None:
+    """汇总表为空但已有订单时（例如刚升级的旧库）自动回填一次"""
+    has_rollup = db.execute(select(models.DailySalesRollup.day).limit(1)).first() is not None
+    has_orders = db.execute(select(models.Order.id).limit(1)).first() is not None
+    if has_orders and not has_rollup:
+        rebuild(db)
+
+
+def main(argv: list[str]) -> int:
+    """命令行入口：rebuild 重建，check 校验"""
+    from .database import SessionLocal
+
+    command = argv[0] if argv else ""
+    if command not in ("rebuild", "check"):
+        print("usage: python -m app.rollup [rebuild|check]")
+        return 2
+    db = SessionLocal()
+    try:
+        if command == "rebuild":
+            print(f"daily_sales_rollup rebuilt: {rebuild(db)} rows")
+            return 0
+        mismatches = check(db)
+        for item in mismatches:
+            print(item)
+        print(f"daily_sales_rollup check: {len(mismatches)} mismatched groups")
+        return 1 if mismatches else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
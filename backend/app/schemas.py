@@ -1,5 +1,5 @@
 from datetime import datetime, date
-from typing import Optional, List
+from typing import Optional, List, Dict, Any, Literal
 from pydantic import BaseModel, Field
 from sqlalchemy import Column,Text
 from .models import PaymentMethod, Channel, OrderStatus
@@ -30,6 +30,11 @@ class ProductUpdate(BaseModel):
 
 class ProductOut(ProductBase):
     id: int
+    # 销售累计（随订单写入维护，见 product_sales.py）
+    units_sold: int = 0
+    revenue: float = 0
+    profit_total: float = 0
+    last_sold_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -53,6 +58,12 @@ class OrderCreate(OrderBase):
     pass
 
 
+class OrderImport(OrderCreate):
+    """CSV 导入订单：订单号来自文件，已存在的订单号会被跳过"""
+    order_number: str = Field(min_length=1)
+    remark: Optional[str] = None
+
+
 class OrderUpdate(BaseModel):
     """订单更新模型 - 允许部分字段更新"""
     transaction_date: Optional[datetime] = None
@@ -78,15 +89,99 @@ class OrderOut(BaseModel):
     channel: Channel
     status: OrderStatus
     product_id: int
-    remark: str  # 可为空的备注字段
+    remark: Optional[str] = None  # 可为空的备注字段
     class Config:
         from_attributes = True
 
 
+class OrderBatchUpdate(OrderUpdate):
+    """批量修改中的一项：订单 id + 要修改的字段"""
+    id: int
+
+
+class OrderBatch(BaseModel):
+    """批量下单/改单/删单，在一个事务里执行；顺序为先删除、再修改、最后新增
+
+    - all_or_nothing：任何一项失败则整批不生效（返回 400，detail 里是每一项的结果）
+    - best_effort：失败的项跳过，其余照常提交
+    """
+    create: List[OrderCreate] = []
+    update: List[OrderBatchUpdate] = []
+    delete: List[int] = []
+    mode: Literal["all_or_nothing", "best_effort"] = "all_or_nothing"
+
+
+class OrderBatchItem(BaseModel):
+    """单项结果：action + index 对应请求里的数组和位置"""
+    action: Literal["create", "update", "delete"]
+    index: int
+    ok: bool
+    order_id: Optional[int] = None
+    order: Optional[OrderOut] = None  # 新增/修改成功时为提交后的订单
+    error: Optional[str] = None
+
+
+class OrderBatchResult(BaseModel):
+    committed: bool
+    results: List[OrderBatchItem]
+
+
+# ==================== 分页 Schemas ====================
+
+class Page(BaseModel):
+    """游标分页结果：items 按 id 倒序；next_cursor 传回 cursor 参数取下一页，为 null 表示没有更多"""
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[int] = None
+
+
+# ==================== 库存流水 Schemas ====================
+
+class InventoryMovementOut(BaseModel):
+    """一条库存流水（见 inventory.py）"""
+    id: int
+    created_at: datetime
+    delta: int
+    quantity_after: int
+    reason: str
+    order_number: Optional[str] = None
+
+
+class StockHistory(Page):
+    """商品的库存流水（items 为 InventoryMovementOut，按 id 倒序分页）及区间首尾的库存"""
+    product_sku: str
+    opening_quantity: int = Field(description="start_date 之前的库存（没有 start_date 时为 0）")
+    closing_quantity: int = Field(description="end_date 当天结束时的库存（没有 end_date 时为当前库存）")
+
+
+# ==================== 搜索 Schemas ====================
+
+SEARCH_TYPES = ("product", "order")
+
+
+class SearchHit(BaseModel):
+    """一条搜索结果（见 search.py）"""
+    type: Literal["product", "order"]
+    id: int
+    key: str = Field(description="SKU 或订单号")
+    title: Optional[str] = Field(default=None, description="商品名或买家名")
+    matched: str = Field(description="命中的字段：sku / name / order_number / buyer_name / remark")
+    score: float = Field(description="排序分数，越大越靠前")
+
+
+class SearchResult(BaseModel):
+    """搜索结果：items 按 score 从高到低（同分时新的在前）；next_cursor 传给下一页，为 null 表示没有更多"""
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None
+
+
 # ==================== 报表 Schemas ====================
 from pydantic import BaseModel, Field, validator
 from typing import Optional, List
 from datetime import date
+
+REPORT_GROUP_BY = ("day", "week", "month", "year", "channel", "product")
+
+
 class ReportFilters(BaseModel):
     start_date: Optional[date] = None
     end_date: Optional[date] = None
@@ -94,7 +189,8 @@ class ReportFilters(BaseModel):
     payment_methods: Optional[List[str]] = None
     statuses: Optional[List[str]] = None
     product_skus: Optional[List[str]] = None
-    group_by: Optional[str] = Field(default="day", description="day/week/month/channel/product")
+    group_by: Optional[str] = Field(default="day", description="day/week/month/year/channel/product")
+    max_points: Optional[int] = Field(default=None, ge=1, description="时间序列最多返回的点数，超出时合并相邻分组")
 
     @validator("start_date", "end_date", pre=True)
     def empty_str_to_none(cls, v):
@@ -102,6 +198,14 @@ class ReportFilters(BaseModel):
             return None
         return v
 
+    @validator("group_by", pre=True)
+    def check_group_by(cls, v):
+        if v in (None, ""):
+            return "day"
+        if v not in REPORT_GROUP_BY:
+            raise ValueError(f"group_by must be one of: {', '.join(REPORT_GROUP_BY)}")
+        return v
+
 class SalesSummary(BaseModel):
     """销售汇总"""
     total_sales: float = Field(description="总销售额")
@@ -134,8 +238,39 @@ class ProductStats(BaseModel):
     profit_margin: float
 
 
+class ProductABC(BaseModel):
+    """商品 ABC 分类：按销售额降序累加，累计占比在前 A% 的为 A 类，前 B% 的为 B 类，其余为 C 类"""
+    product_sku: str
+    product_name: str
+    total_sales: float
+    sales_share: float = Field(description="销售额占比 (%)")
+    cumulative_share: float = Field(description="按销售额降序累加到该商品的占比 (%)")
+    abc_class: str = Field(description="A/B/C")
+
+
+class ProductPricePercentiles(BaseModel):
+    """商品售价分位数（按订单计，不按数量加权；线性插值，同 percentile_cont）"""
+    product_sku: str
+    product_name: str
+    order_count: int
+    median_price: float
+    p90_price: float
+
+
+class ReorderItem(BaseModel):
+    """补货预测（见 forecast.py）"""
+    product_sku: str
+    product_name: str
+    quantity: int = Field(description="当前库存")
+    daily_velocity: float = Field(description="平滑后的日销量")
+    days_of_cover: Optional[float] = Field(description="按当前速度还能卖多少天，没有销量时为空")
+    stockout_date: Optional[date] = Field(description="预计售罄日期，没有销量或在 10 年（forecast.STOCKOUT_HORIZON_DAYS）以后时为空")
+    reorder_point: float = Field(description="补货点：到货周期内的预计销量 + 安全库存")
+    needs_reorder: bool
+
+
 class TimeSeriesData(BaseModel):
-    """时间序列数据"""
+    """时间序列数据（date 为分组键：时间分组是分组起始日期，channel/product 分组是渠道名/SKU）"""
     date: str
     total_sales: float
     total_cost: float
@@ -0,0 +1,198 @@
+"""搜索：GET /search，商品（SKU、商品名）和订单（订单号、买家名、备注）
+
+- SKU、订单号按前缀匹配（区分大小写）：PostgreSQL 上 LIKE 'abc%' 走 varchar_pattern_ops 索引，
+  SQLite 上换成范围条件 >= 'abc' AND < 'abc\\U0010ffff'，走原有的唯一索引
+- 商品名、买家名、备注用 PostgreSQL 全文检索：输入按字母/数字切成词，同一字段里要包含所有的词，
+  走 GIN 表达式索引（迁移 v0006）；SQLite 上退化为 LIKE '%word%' 扫描，只用于开发
+- 相关度分档（TIERS），分数高的档在前，同一档内新的在前（id 倒序）：
+      编号完全相同 3 > 编号前缀 2 > 商品名/买家名包含完整的词 1.5 > 商品名/买家名词前缀 1
+      > 备注包含完整的词 0.5 > 备注词前缀 0
+  "完整的词"是所有词都整词匹配（'judy & roberts'），"词前缀"是最后一个词按前缀匹配（'judy & rob:*'，
+  边输入边搜索）；SQLite 上"完整的词"近似为字段以第一个词开头
+- 每条记录只落在它命中的最高一档（低档的条件排除掉高档），排序和分页都在 SQL 里完成、覆盖全部命中：
+  逐档执行 WHERE 本档条件 ORDER BY id DESC LIMIT n，凑满一页就停；
+  cursor 是 "档位:id"（上一页最后一条），下一页从这一档 id 更小的记录接着取
+- 每档的语句按形状缓存，每次只换参数
+
+常见词的第一页只需要前几档的最新几十行，不对全部命中计算相关度，耗时与订单表大小基本无关。
+"""
+import functools
+import re
+
+from fastapi import HTTPException
+from sqlalchemy import Select, and_, bindparam, false, func, literal, literal_column, not_, select
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+MAX_SEARCH_LIMIT = 100
+# 输入里最多用前几个词
+MAX_SEARCH_WORDS = 8
+
+# 每类数据：(模型, 编号列名, 标题列名, [(全文检索列名, 基础分)])，全文检索列按基础分从高到低
+_SOURCES = {
+    "product": (models.Product, "sku", "name", [("name", 1)]),
+    "order": (models.Order, "order_number", "buyer_name", [("buyer_name", 1), ("remark", 0)]),
+}
+
+# 每个全文检索字段分两档：完整的词加 0.5 分，词前缀不加分
+_WORD_BONUS = 0.5
+
+
+def _words(q: str) -> list[str]:
+    """输入切成词（字母/数字，小写），与 PostgreSQL 'simple' 配置的分词方式一致"""
+    return re.findall(r"[^\W_]+", q.lower())[:MAX_SEARCH_WORDS]
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class _Matcher:
+    """按数据库生成各档的匹配条件（输入都是绑定参数，见 _params）"""
+
+    def __init__(self, postgresql: bool, word_count: int):
+        self.postgresql = postgresql
+        self.word_count = word_count
+
+    def key_exact(self, column):
+        return column == bindparam("q")
+
+    def key_prefix(self, column):
+        if self.postgresql:
+            return column.like(bindparam("prefix"), escape="\\")
+        return and_(column >= bindparam("q"), column < bindparam("q_upper"))
+
+    def _contains_words(self, column):
+        return and_(*(column.ilike(bindparam(f"word_{i}"), escape="\\") for i in range(self.word_count)))
+
+    def text_words(self, column):
+        """所有词都整词匹配"""
+        if self.postgresql:
+            return self._tsquery_match(column, "words_query")
+        return and_(self._contains_words(column), column.ilike(bindparam("first_word"), escape="\\"))
+
+    def text_prefix(self, column):
+        """最后一个词按前缀匹配"""
+        if self.postgresql:
+            return self._tsquery_match(column, "prefix_query")
+        return self._contains_words(column)
+
+    @staticmethod
+    def _tsquery_match(column, param: str):
+        tsquery = func.to_tsquery(literal_column("'simple'"), bindparam(param))
+        return models.text_search_vector(column).op("@@")(tsquery)
+
+
+def _params(q: str, words: list[str]) -> dict:
+    params = {"q": q, "q_upper": q + "\U0010ffff", "prefix": _escape_like(q) + "%"}
+    if words:
+        params["words_query"] = " & ".join(words)
+        params["prefix_query"] = " & ".join([*words[:-1], f"{words[-1]}:*"])
+        params["first_word"] = _escape_like(words[0]) + "%"
+        params.update({f"word_{i}": f"%{_escape_like(w)}%" for i, w in enumerate(words)})
+    return params
+
+
+def _type_tiers(type_: str, matcher: _Matcher, word_count: int) -> list[tuple[float, str, object]]:
+    """一类数据的各档：[(分数, 命中字段, 条件)]，分数从高到低"""
+    model, key, _, fields = _SOURCES[type_]
+    key_column = getattr(model, key)
+    tiers = [(3.0, key, matcher.key_exact(key_column)), (2.0, key, matcher.key_prefix(key_column))]
+    if word_count:
+        for name, weight in fields:
+            column = getattr(model, name)
+            tiers.append((weight + _WORD_BONUS, name, matcher.text_words(column)))
+            tiers.append((float(weight), name, matcher.text_prefix(column)))
+    return tiers
+
+
+def _tier_select(type_: str, matched: str, condition, higher: list, after_id: bool) -> Select:
+    """一档的查询：命中本档、不命中更高档，id 倒序取 :n 条；after_id 时只取 id < :cursor_id"""
+    model, key, title, _ = _SOURCES[type_]
+    # 字段为 NULL 时条件为 NULL，用 coalesce 当作不命中，NOT 之后不会把这一行也排除掉
+    conditions = [condition, *(not_(func.coalesce(c, false())) for c in higher)]
+    if after_id:
+        conditions.append(model.id < bindparam("cursor_id"))
+    return (
+        select(
+            model.id,
+            getattr(model, key).label("key"),
+            getattr(model, title).label("title"),
+            literal(matched).label("matched"),
+        )
+        .where(*conditions)
+        .order_by(model.id.desc())
+        .limit(bindparam("n"))
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def _tiers(postgresql: bool, types: tuple[str, ...], word_count: int) -> list[tuple[str, float, Select, Select]]:
+    """全部档位，按 (分数从高到低, types 顺序) 排好：[(类型, 分数, 语句, 带游标的语句)]
+
+    按数据库、搜索类型和词数缓存，每次只换参数，不用重新构造和编译。
+    """
+    matcher = _Matcher(postgresql, word_count)
+    tiers = []
+    for type_index, type_ in enumerate(types):
+        type_tiers = _type_tiers(type_, matcher, word_count)
+        for i, (score, matched, condition) in enumerate(type_tiers):
+            higher = [c for _, _, c in type_tiers[:i]]
+            tiers.append((-score, type_index, type_, score,
+                          _tier_select(type_, matched, condition, higher, after_id=False),
+                          _tier_select(type_, matched, condition, higher, after_id=True)))
+    tiers.sort(key=lambda t: (t[0], t[1]))
+    return [t[2:] for t in tiers]
+
+
+def _parse_cursor(cursor: str | None) -> tuple[int, int | None]:
+    """"档位:id" -> (档位, id)；没有游标时从第 0 档开始"""
+    if not cursor:
+        return 0, None
+    try:
+        tier, last_id = (int(part) for part in cursor.split(":"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if tier < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return tier, last_id
+
+
+def search(db: Session, q: str, types: list[str] | None = None, limit: int = 20,
+           cursor: str | None = None) -> schemas.SearchResult:
+    """按 q 搜索商品和订单，返回按相关度排序的一页结果"""
+    unknown = [t for t in types or [] if t not in schemas.SEARCH_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown types: {', '.join(unknown)}")
+    q = q.strip()
+    if not q:
+        return schemas.SearchResult(items=[])
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+    start, after_id = _parse_cursor(cursor)
+    words = _words(q)
+    postgresql = db.get_bind().dialect.name == "postgresql"
+    tiers = _tiers(postgresql, tuple(dict.fromkeys(types or schemas.SEARCH_TYPES)), len(words))
+    params = _params(q, words)
+
+    # 多取一条判断是否还有下一页
+    hits: list[tuple[int, schemas.SearchHit]] = []
+    for index in range(start, len(tiers)):
+        type_, score, stmt, stmt_after = tiers[index]
+        paged = index == start and after_id is not None
+        rows = db.execute(
+            stmt_after if paged else stmt,
+            {**params, "n": limit + 1 - len(hits), **({"cursor_id": after_id} if paged else {})},
+        )
+        for row in rows:
+            hits.append((index, schemas.SearchHit(type=type_, id=row.id, key=row.key, title=row.title,
+                                                  matched=row.matched, score=score)))
+        if len(hits) > limit:
+            break
+
+    page = hits[:limit]
+    last_tier, last_hit = page[-1] if page else (None, None)
+    return schemas.SearchResult(
+        items=[hit for _, hit in page],
+        next_cursor=f"{last_tier}:{last_hit.id}" if len(hits) > limit else None,
+    )
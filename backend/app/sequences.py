@@ -0,0 +1,169 @@
+"""SKU / 订单号序号分配
+
+每个编号序列在 sequence_counters 表里占一行：
+- sku:<前缀>      -> 前缀下已分配的最大 SKU 序号（<前缀>_001, <前缀>_002 ...）
+- order:<商品id>  -> 该商品已分配的最大订单号序号（<SKU>_001, <SKU>_002 ...）
+
+分配时执行 UPDATE ... SET value = value + n RETURNING value，只动一行、与数据量无关；
+PostgreSQL 下这行的行锁一直持有到事务提交，并发创建同一前缀/商品时会排队，不会拿到重复序号。
+已有数据的计数器由迁移 v0007 初始化；之后新出现的前缀/商品在第一次分配时从已有数据算起点
+（每个序列只发生一次）。
+
+命令行（在 backend/ 目录下执行），从现有数据重新校正所有计数器（只会调大）：
+    python -m app.sequences seed
+"""
+import re
+import sys
+from typing import Callable
+
+from sqlalchemy import select, update, case
+from sqlalchemy.orm import Session
+
+from . import models
+from .rollup import dialect_insert
+
+_DIGITS = re.compile(r"^\d+$")
+
+
+def sku_sequence(prefix: str) -> str:
+    return f"sku:{prefix}"
+
+
+def order_sequence(product_id: int) -> str:
+    return f"order:{product_id}"
+
+
+def _like_prefix(prefix: str) -> str:
+    """LIKE 'prefix\\_%'，转义前缀里的通配符"""
+    return prefix.replace("\\", "\\\\").replace("_", "\\_").replace("%", "\\%") + "\\_%"
+
+
+def _max_suffix(values, prefix: str | None = None) -> int:
+    """取最后一个下划线后的数字序号的最大值；指定 prefix 时只看 prefix_<数字> 形式"""
+    best = 0
+    for value in values:
+        if not value or "_" not in value:
+            continue
+        head, suffix = value.rsplit("_", 1)
+        if prefix is not None and head != prefix:
+            continue
+        if _DIGITS.match(suffix):
+            best = max(best, int(suffix))
+    return best
+
+
+def max_sku_suffix(db: Session, prefix: str) -> int:
+    """已有 SKU 中 prefix_<数字> 的最大序号"""
+    skus = db.execute(
+        select(models.Product.sku).where(models.Product.sku.like(_like_prefix(prefix), escape="\\"))
+    ).scalars()
+    return _max_suffix(skus, prefix)
+
+
+def max_order_suffix(db: Session, product_id: int) -> int:
+    """该商品已有订单号的最大序号"""
+    numbers = db.execute(
+        select(models.Order.order_number).where(models.Order.product_id == product_id)
+    ).scalars()
+    return _max_suffix(numbers)
+
+
+def allocate(db: Session, name: str, count: int = 1, seed: Callable[[], int] = lambda: 0) -> int:
+    """原子地为序列 name 分配 count 个连续序号，返回第一个（不提交，随调用方事务提交）"""
+    table = models.SequenceCounter.__table__
+    value = db.execute(
+        update(table)
+        .where(table.c.name == name)
+        .values(value=table.c.value + count)
+        .returning(table.c.value)
+    ).scalar()
+    if value is None:
+        # 计数器还不存在：从已有数据算起点；并发时另一方先插入的话走 ON CONFLICT 累加
+        stmt = dialect_insert(db)(table).values(name=name, value=seed() + count)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={"value": table.c.value + count},
+        ).returning(table.c.value)
+        value = db.execute(stmt).scalar_one()
+    return value - count + 1
+
+
+def next_skus(db: Session, prefix: str, count: int = 1) -> list[str]:
+    """为同一前缀分配 count 个新 SKU"""
+    first = allocate(db, sku_sequence(prefix), count, seed=lambda: max_sku_suffix(db, prefix))
+    return [f"{prefix}_{n:03d}" for n in range(first, first + count)]
+
+
+def next_order_numbers(db: Session, product: models.Product, count: int = 1) -> list[str]:
+    """为商品分配 count 个连续订单号 <SKU>_<序号>"""
+    first = allocate(db, order_sequence(product.id), count, seed=lambda: max_order_suffix(db, product.id))
+    return [f"{product.sku}_{n:03d}" for n in range(first, first + count)]
+
+
+def next_order_number(db: Session, product: models.Product) -> str:
+    """为商品分配下一个订单号 <SKU>_<序号>"""
+    return next_order_numbers(db, product)[0]
+
+
+def bump(db: Session, values: dict[str, int]) -> None:
+    """把计数器至少推到给定值（已有更大的值则保持不变），用于导入外部编号和初始化"""
+    if not values:
+        return
+    table = models.SequenceCounter.__table__
+    stmt = dialect_insert(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={"value": case((table.c.value > stmt.excluded.value, table.c.value), else_=stmt.excluded.value)},
+    )
+    db.execute(stmt, [{"name": name, "value": value} for name, value in values.items()])
+
+
+def bump_for_order_numbers(db: Session, rows: list[dict], sku_by_product: dict[int, str]) -> None:
+    """导入的订单号如果形如 <SKU>_<数字>，把对应商品的订单号计数器推到这个值，避免以后生成重复订单号"""
+    values: dict[str, int] = {}
+    for row in rows:
+        sku = sku_by_product[row["product_id"]]
+        suffix = _max_suffix([row["order_number"]], sku)
+        if suffix:
+            name = order_sequence(row["product_id"])
+            values[name] = max(values.get(name, 0), suffix)
+    bump(db, values)
+
+
+def seed(db: Session) -> int:
+    """从现有商品和订单初始化所有计数器（只会调大，不提交），返回涉及的计数器数量"""
+    values: dict[str, int] = {}
+    for sku in db.execute(select(models.Product.sku)).scalars():
+        if "_" in sku:
+            prefix, suffix = sku.rsplit("_", 1)
+            if _DIGITS.match(suffix):
+                name = sku_sequence(prefix)
+                values[name] = max(values.get(name, 0), int(suffix))
+    rows = db.execute(
+        select(models.Order.product_id, models.Order.order_number).execution_options(yield_per=10000)
+    )
+    for product_id, order_number in rows:
+        suffix = _max_suffix([order_number])
+        if suffix:
+            name = order_sequence(product_id)
+            values[name] = max(values.get(name, 0), suffix)
+    bump(db, values)
+    return len(values)
+
+
+def main(argv: list[str]) -> int:
+    """命令行入口：seed 从现有数据初始化计数器"""
+    from .database import SessionLocal
+
+    if argv[:1] != ["seed"]:
+        print("usage: python -m app.sequences seed")
+        return 2
+    with SessionLocal() as db:
+        count = seed(db)
+        db.commit()
+    print(f"sequence_counters seeded: {count} sequences")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
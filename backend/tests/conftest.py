@@ -0,0 +1,47 @@
+"""测试共用的 fixture
+
+默认用临时目录里的 SQLite 库（应用启动时由迁移建表）；设置 TEST_DATABASE_URL 可以换成
+PostgreSQL，测试会在里面建表并写入数据，不要指向生产库。
+数据库配置在导入 app 时读取，所以要在这里先设置好环境变量。
+"""
+import os
+import tempfile
+from uuid import uuid4
+
+_tmpdir = tempfile.mkdtemp(prefix="ecommerce-tests-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{_tmpdir}/test.db")
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    """整个测试会话共用的 TestClient（进入时执行迁移）"""
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def session_factory(client):
+    """每个线程各开一个会话，和真实请求一样"""
+    from app.database import SessionLocal
+
+    return SessionLocal
+
+
+@pytest.fixture
+def make_product(session_factory):
+    """新建一个商品（商品名唯一），返回 SKU"""
+    from app import crud, schemas
+
+    def make(quantity: int = 100, cost_price: float = 5, prefix: str = "TEST") -> str:
+        with session_factory() as db:
+            product = crud.create_product(db, schemas.ProductCreate(
+                sku=prefix, name=f"test product {uuid4().hex}", cost_price=cost_price, quantity=quantity,
+            ))
+            return product.sku
+
+    return make
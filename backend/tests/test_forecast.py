@@ -0,0 +1,27 @@
+"""补货预测：卖得极慢的商品（可售天数极大）不会让 GET /products/reorder 出错"""
+from datetime import date, datetime, timedelta
+
+from app import crud, forecast, models, schemas
+
+AS_OF = date(2026, 10, 16)
+
+
+def test_slow_seller_has_no_stockout_date(client, session_factory, make_product):
+    sku = make_product(quantity=201)
+    with session_factory() as db:
+        crud.create_order(db, schemas.OrderCreate(
+            product_sku=sku, actual_price=2, quantity=1,
+            transaction_date=datetime.combine(AS_OF - timedelta(days=88), datetime.min.time()),
+            payment_method=models.PaymentMethod.cash, channel=models.Channel.other,
+            status=models.OrderStatus.done, remark="slow seller",
+        ))
+
+    response = client.get("/products/reorder", params={
+        "include_all": "true", "as_of": AS_OF.isoformat(), "limit": forecast.MAX_REORDER_ITEMS,
+    })
+
+    assert response.status_code == 200
+    item = next(item for item in response.json() if item["product_sku"] == sku)
+    assert item["days_of_cover"] > forecast.STOCKOUT_HORIZON_DAYS
+    assert item["stockout_date"] is None
+    assert item["needs_reorder"] is False
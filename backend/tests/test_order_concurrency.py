@@ -0,0 +1,110 @@
+"""并发下单/改单/删单时库存和销售累计不出错（商品行锁、订单在锁内重新读取）"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from app import crud, models, schemas
+
+# SQLite 同一时间只有一个写事务，并发太高时等锁会超时（database is locked）
+THREADS = 10
+
+
+def _order(sku: str, quantity: int = 1) -> schemas.OrderCreate:
+    return schemas.OrderCreate(
+        product_sku=sku, actual_price=2, quantity=quantity,
+        payment_method=models.PaymentMethod.cash, channel=models.Channel.other,
+        status=models.OrderStatus.pending, remark="concurrency test",
+    )
+
+
+def _stock(session_factory, sku: str) -> tuple[int, int]:
+    with session_factory() as db:
+        product = crud.get_product_by_sku(db, sku)
+        return product.quantity, product.units_sold
+
+
+def _outcome(fn) -> str:
+    """执行一次写操作，返回 ok 或 HTTPException 的状态码"""
+    try:
+        fn()
+    except HTTPException as exc:
+        return str(exc.status_code)
+    return "ok"
+
+
+def _update(session_factory, order_id: int, quantity: int) -> str:
+    """与 PATCH /orders/{id} 相同的路径"""
+    def run():
+        with session_factory() as db:
+            order = crud.get_order_by_id(db, order_id, with_product=True, for_update=True)
+            if order is None:
+                raise HTTPException(status_code=404)
+            crud.update_order(db, order, schemas.OrderUpdate(quantity=quantity))
+    return _outcome(run)
+
+
+def _delete(session_factory, order_id: int) -> str:
+    """与 DELETE /orders/{id} 相同的路径"""
+    def run():
+        with session_factory() as db:
+            order = crud.get_order_by_id(db, order_id, with_product=True, for_update=True)
+            if order is None:
+                raise HTTPException(status_code=404)
+            crud.delete_order(db, order)
+    return _outcome(run)
+
+
+def _create(session_factory, sku: str) -> int:
+    with session_factory() as db:
+        return crud.create_order(db, _order(sku)).id
+
+
+def test_parallel_orders_never_oversell(session_factory, make_product):
+    sku = make_product(quantity=THREADS)
+
+    def create(_) -> str:
+        def run():
+            with session_factory() as db:
+                crud.create_order(db, _order(sku))
+        return _outcome(run)
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        outcomes = list(pool.map(create, range(THREADS * 3)))
+
+    assert outcomes.count("ok") == THREADS
+    assert outcomes.count("400") == THREADS * 2
+    assert _stock(session_factory, sku) == (0, THREADS)
+
+
+def test_update_waits_for_the_order_locked_by_another_session(session_factory, make_product):
+    """两个会话交错改同一单：后一个要等前一个提交，再按新的订单数量算库存差额"""
+    sku = make_product(quantity=100)
+    order_id = _create(session_factory, sku)
+
+    with session_factory() as first, ThreadPoolExecutor(1) as pool:
+        order = crud.get_order_by_id(first, order_id, with_product=True, for_update=True)
+        second = pool.submit(_update, session_factory, order_id, 3)
+        time.sleep(0.3)
+        assert not second.done(), "第二个会话应该在等锁"
+        crud.update_order(first, order, schemas.OrderUpdate(quantity=5))
+        assert second.result() == "ok"
+
+    assert _stock(session_factory, sku) == (97, 3)
+
+
+def test_parallel_updates_then_deletes_keep_stock_consistent(session_factory, make_product):
+    sku = make_product(quantity=100)
+    order_id = _create(session_factory, sku)
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        updates = list(pool.map(lambda i: _update(session_factory, order_id, 1 + i % 5), range(THREADS * 3)))
+    assert updates == ["ok"] * (THREADS * 3)
+    with session_factory() as db:
+        final_quantity = crud.get_order_by_id(db, order_id).quantity
+    assert _stock(session_factory, sku) == (100 - final_quantity, final_quantity)
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        deletes = list(pool.map(lambda _: _delete(session_factory, order_id), range(THREADS)))
+    assert sorted(deletes) == ["404"] * (THREADS - 1) + ["ok"]
+    assert _stock(session_factory, sku) == (100, 0)
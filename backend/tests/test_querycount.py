@@ -0,0 +1,13 @@
+"""每个操作的 SQL 语句数不超过 querycount.QUERY_BUDGETS（发现 N+1 查询）"""
+from app import querycount
+
+
+def test_query_budgets(client):
+    from app.database import engine
+
+    counts = querycount.measure(engine)
+
+    assert set(counts) == set(querycount.QUERY_BUDGETS)
+    over = {name: (count, querycount.QUERY_BUDGETS[name])
+            for name, count in counts.items() if count > querycount.QUERY_BUDGETS[name]}
+    assert not over, f"over budget (count, budget): {over}"
@@ -0,0 +1,53 @@
+"""并发新建商品/订单时 SKU 和订单号不重复（sequences.allocate）"""
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from app import crud, models, schemas
+
+# SQLite 同一时间只有一个写事务，并发太高时等锁会超时（database is locked）
+THREADS = 10
+
+
+def _order(sku: str) -> schemas.OrderCreate:
+    return schemas.OrderCreate(
+        product_sku=sku, actual_price=1, quantity=1,
+        payment_method=models.PaymentMethod.cash, channel=models.Channel.other,
+        status=models.OrderStatus.pending, remark="sequence test",
+    )
+
+
+def test_parallel_product_creates_get_unique_skus(session_factory):
+    prefix = f"SEQ{uuid4().hex[:8].upper()}"
+
+    def create(i: int) -> str:
+        with session_factory() as db:
+            return crud.create_product(db, schemas.ProductCreate(
+                sku=prefix, name=f"sequence test {prefix}-{i}", cost_price=1, quantity=1,
+            )).sku
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        skus = list(pool.map(create, range(THREADS * 3)))
+
+    assert sorted(skus) == [f"{prefix}_{n:03d}" for n in range(1, THREADS * 3 + 1)]
+
+
+def test_parallel_order_creates_get_unique_numbers(session_factory, make_product):
+    sku = make_product(quantity=1000)
+
+    def create(_) -> str:
+        with session_factory() as db:
+            return crud.create_order(db, _order(sku)).order_number
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        numbers = list(pool.map(create, range(THREADS * 3)))
+
+    assert sorted(numbers) == [f"{sku}_{n:03d}" for n in range(1, THREADS * 3 + 1)]
+
+
+def test_numbers_continue_after_deleted_product(session_factory, make_product):
+    prefix = f"SEQ{uuid4().hex[:8].upper()}"
+    first = make_product(prefix=prefix)
+    with session_factory() as db:
+        crud.delete_product(db, crud.get_product_by_sku(db, first))
+    # 删除后不复用已分配过的序号
+    assert make_product(prefix=prefix) == f"{prefix}_002"
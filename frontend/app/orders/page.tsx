@@ -2,7 +2,7 @@
 
 import { useState, useEffect } from 'react'
 import Layout from '@/components/Layout'
-import { orderApi, productApi } from '@/lib/api'
+import { orderApi, productApi, Page, PageParams } from '@/lib/api'
 import toast from 'react-hot-toast'
 import { 
   Plus, 
@@ -40,13 +40,58 @@ interface Product {
   actual_price?: number
 }
 
+// 每页订单数
+const ORDER_PAGE_SIZE = 200
+
+// 批量删除时每个请求包含的订单数
+const BULK_DELETE_BATCH_SIZE = 500
+
+// 搜索框/SKU 输入停顿多久（毫秒）后再请求
+const SEARCH_DEBOUNCE_MS = 300
+
+// 新增订单时商品下拉框最多显示的搜索结果数
+const PRODUCT_OPTION_LIMIT = 20
+
+// 列表筛选条件，全部在服务端筛选（空字符串表示不限）
+interface OrderFilters {
+  q: string
+  channel: string
+  status: string
+  start_date: string
+  end_date: string
+  product_sku: string
+}
+
+const EMPTY_FILTERS: OrderFilters = { q: '', channel: '', status: '', start_date: '', end_date: '', product_sku: '' }
+
+// 筛选条件 -> GET /orders 的查询参数
+const filterParams = (filters: OrderFilters): PageParams => ({
+  q: filters.q.trim(),
+  channels: filters.channel,
+  statuses: filters.status,
+  start_date: filters.start_date,
+  end_date: filters.end_date,
+  product_skus: filters.product_sku.trim(),
+})
+
+// 按交易日期倒序
+const sortByTransactionDate = (orders: Order[]) =>
+  [...orders].sort((a, b) => {
+    if (!a.transaction_date) return 1
+    if (!b.transaction_date) return -1
+    return new Date(b.transaction_date).getTime() - new Date(a.transaction_date).getTime()
+  })
+
 export default function OrdersPage() {
   const [orders, setOrders] = useState<Order[]>([])
-  const [products, setProducts] = useState<Product[]>([])
+  // 已加载订单涉及的商品（按 id），只按需取当前页用到的商品
+  const [products, setProducts] = useState<Record<number, Product>>({})
   const [loading, setLoading] = useState(true)
+  const [nextCursor, setNextCursor] = useState<number | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [showModal, setShowModal] = useState(false)
   const [editingOrder, setEditingOrder] = useState<Order | null>(null)
-  const [searchTerm, setSearchTerm] = useState('')
+  const [filters, setFilters] = useState<OrderFilters>(EMPTY_FILTERS)
   const [showImportModal, setShowImportModal] = useState(false)
   const [showDetailModal, setShowDetailModal] = useState<Order | null>(null)
 //加排序状态
@@ -54,24 +99,27 @@ export default function OrdersPage() {
     key: null,
     direction: 'asc',
   })
-  // 获取订单和商品列表
+  // 取这一页订单涉及的商品（一次请求，按 id 筛选）；onlyMissing 时跳过已加载的商品
+  const loadProducts = async (items: Order[], onlyMissing: boolean) => {
+    const ids = Array.from(new Set(items.map(order => order.product_id)))
+    const missing = onlyMissing ? ids.filter(id => !products[id]) : ids
+    if (missing.length === 0) return
+    const response = await productApi.getProductsPage({ ids: missing.join(','), limit: missing.length })
+    setProducts(prev => ({
+      ...prev,
+      ...Object.fromEntries(response.data.items.map((product: Product) => [product.id, product])),
+    }))
+  }
+
+  // 按当前筛选条件获取第一页订单
   const fetchData = async () => {
     try {
       setLoading(true)
-      const [ordersResponse, productsResponse] = await Promise.all([
-        orderApi.getOrders(),
-        productApi.getProducts()
-      ])
-      
-      // 按交易日期倒序
-      const sortedOrders = [...ordersResponse.data].sort((a, b) => {
-        if (!a.transaction_date) return 1
-        if (!b.transaction_date) return -1
-        return new Date(b.transaction_date).getTime() - new Date(a.transaction_date).getTime()
-      })
-      
-      setOrders(sortedOrders)
-      setProducts(productsResponse.data)
+      const response = await orderApi.getOrdersPage({ limit: ORDER_PAGE_SIZE, ...filterParams(filters) })
+      setOrders(sortByTransactionDate(response.data.items))
+      setNextCursor(response.data.next_cursor)
+      // 重新加载时刷新商品（写入后库存会变）
+      await loadProducts(response.data.items, false)
     } catch (error) {
       console.error('获取数据失败:', error)
     } finally {
@@ -79,9 +127,30 @@ export default function OrdersPage() {
     }
   }
 
+  // 加载下一页订单（同样的筛选条件）
+  const loadMore = async () => {
+    if (nextCursor == null) return
+    try {
+      setLoadingMore(true)
+      const response = await orderApi.getOrdersPage({ limit: ORDER_PAGE_SIZE, cursor: nextCursor, ...filterParams(filters) })
+      setOrders(prev => sortByTransactionDate([...prev, ...response.data.items]))
+      setNextCursor(response.data.next_cursor)
+      await loadProducts(response.data.items, true)
+    } catch (error) {
+      console.error('加载更多订单失败:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
+  // 筛选条件变化后从第一页重新加载；文本输入停顿一会儿再请求
   useEffect(() => {
-    fetchData()
-  }, [])
+    const typing = filters.q || filters.product_sku
+    const timer = setTimeout(fetchData, typing ? SEARCH_DEBOUNCE_MS : 0)
+    return () => clearTimeout(timer)
+  }, [filters])
+
+  const updateFilter = (key: keyof OrderFilters, value: string) => setFilters(prev => ({ ...prev, [key]: value }))
 
   // 点击排序按钮时切换排序字段
   const handleSort = (key: keyof Order) => {
@@ -127,23 +196,38 @@ export default function OrdersPage() {
   const [deleting, setDeleting] = useState(false)
   const [deleteProgress, setDeleteProgress] = useState(0)
 
-  // 🚀 批量删除订单（带进度条）
+  // 🚀 批量删除：删除服务端所有符合当前筛选条件的订单（不只是已加载的几页）
   const handleBulkDeleteOrders = async () => {
-    if (!confirm(`确定要删除当前显示的 ${filteredOrders.length} 个订单吗？`)) return
+    const filtered = Object.values(filterParams(filters)).some(value => value)
+    if (!confirm(filtered ? '确定要删除所有符合当前筛选条件的订单吗？' : '确定要删除全部订单吗？')) return
 
     setDeleting(true)
     setDeleteProgress(0)
 
     try {
-      const total = filteredOrders.length
-
-      for (let i = 0; i < total; i++) {
-        await orderApi.deleteOrder(filteredOrders[i].id)
-        setDeleteProgress(Math.round(((i + 1) / total) * 100))
-        await new Promise(resolve => setTimeout(resolve, 100)) // 给 UI 时间刷新
-      }
-
-      toast.success(`成功删除 ${total} 个订单`)
+      let deleted = 0
+      let cursor: number | null = null
+
+      // 按游标每次取 BULK_DELETE_BATCH_SIZE 个符合条件的订单 id，一个批量请求删除，已被删除的订单跳过
+      do {
+        const page: Page = (await orderApi.getOrdersPage({
+          limit: BULK_DELETE_BATCH_SIZE,
+          cursor,
+          fields: 'id',
+          ...filterParams(filters),
+        })).data
+        if (page.items.length > 0) {
+          const response = await orderApi.batchOrders({
+            delete: page.items.map(order => order.id),
+            mode: 'best_effort',
+          })
+          deleted += response.data.results.filter(result => result.ok).length
+          setDeleteProgress(deleted)
+        }
+        cursor = page.next_cursor
+      } while (cursor != null)
+
+      toast.success(`成功删除 ${deleted} 个订单`)
       fetchData()
     } catch (error) {
       console.error('批量删除订单失败:', error)
@@ -168,11 +252,8 @@ export default function OrdersPage() {
     }
   }
 
-  // 筛选订单
-  const filteredOrders = orders.filter(order =>
-    order.order_number.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    (products.find(p => p.id === order.product_id)?.name && products.find(p => p.id === order.product_id)?.name.toLowerCase().includes(searchTerm.toLowerCase()))
-  )
+  // 已加载的订单（筛选已在服务端完成），排序只作用于已加载的订单
+  const filteredOrders = [...orders]
 // 排序逻辑
 if (sortConfig.key) {
   const key = sortConfig.key as keyof Order
@@ -218,9 +299,9 @@ if (sortConfig.key) {
               <Search className="absolute left-3 top-1/2 transform -translate-y-1/2 h-4 w-4 text-gray-400" />
               <input
                 type="text"
-                placeholder="搜索订单号或商品名称..."
-                value={searchTerm}
-                onChange={(e) => setSearchTerm(e.target.value)}
+                placeholder="搜索订单号或商品名称/SKU..."
+                value={filters.q}
+                onChange={(e) => updateFilter('q', e.target.value)}
                 className="form-input pl-10"
               />
             </div>
@@ -255,17 +336,51 @@ if (sortConfig.key) {
           </div>
         </div>
 
+        {/* 筛选栏（服务端筛选） */}
+        <div className="mb-6 grid grid-cols-2 md:grid-cols-5 gap-4">
+          <select value={filters.channel} onChange={(e) => updateFilter('channel', e.target.value)} className="form-input">
+            <option value="">全部渠道</option>
+            <option value="eBay">eBay</option>
+            <option value="Facebook">Facebook</option>
+            <option value="saltFish">咸鱼</option>
+            <option value="other">其他</option>
+          </select>
+          <select value={filters.status} onChange={(e) => updateFilter('status', e.target.value)} className="form-input">
+            <option value="">全部状态</option>
+            <option value="pending">待处理</option>
+            <option value="done">已完成</option>
+          </select>
+          <input
+            type="date"
+            value={filters.start_date}
+            onChange={(e) => updateFilter('start_date', e.target.value)}
+            className="form-input"
+            title="交易日期起"
+          />
+          <input
+            type="date"
+            value={filters.end_date}
+            onChange={(e) => updateFilter('end_date', e.target.value)}
+            className="form-input"
+            title="交易日期止"
+          />
+          <input
+            type="text"
+            placeholder="SKU（多个用逗号分隔）"
+            value={filters.product_sku}
+            onChange={(e) => updateFilter('product_sku', e.target.value)}
+            className="form-input"
+          />
+        </div>
+
         {/* 🚀 批量删除进度条 */}
         {deleting && (
           <div className="mb-6">
             <div className="w-full bg-gray-200 rounded h-3">
-              <div
-                className="bg-red-500 h-3 rounded transition-all duration-300"
-                style={{ width: `${deleteProgress}%` }}
-              ></div>
+              <div className="bg-red-500 h-3 rounded animate-pulse w-full"></div>
             </div>
             <p className="text-sm mt-2 text-gray-600">
-              正在删除订单... {deleteProgress}%
+              正在删除订单... 已删除 {deleteProgress} 个
             </p>
           </div>
         )}
@@ -274,7 +389,7 @@ if (sortConfig.key) {
         <div className="card">
           <div className="card-header">
             <h3 className="text-lg font-semibold text-gray-900">
-              订单列表 ({filteredOrders.length})
+              订单列表 (已加载 {filteredOrders.length}{nextCursor != null ? '，还有更多' : ''})
             </h3>
           </div>
           <div className="overflow-x-auto">
@@ -342,14 +457,14 @@ if (sortConfig.key) {
                       </td>
                       <td className="table-cell">{order.buyer_name || '-'}</td>
                       <td className="table-cell font-mono text-sm">
-                        {products.find(p => p.id === order.product_id)?.name || 'N/A'}
+                        {products[order.product_id]?.name || 'N/A'}
                       </td>
                       <td className="table-cell">{order.quantity}</td>
                       <td className="table-cell font-medium">¥{order.actual_price.toFixed(2)}</td>
                       <td className="table-cell font-medium text-success-600">
                         {(() => {
-                          const product = products.find(p => p.id === order.product_id)
-                          if (!product) return 'N/A'
+                          const product = products[order.product_id]
+                          if (!product) return `¥${order.profit.toFixed(2)}`
                           const profit = (order.actual_price - product.cost_price) * order.quantity
                           return `¥${profit.toFixed(2)}`
                         })()}
@@ -400,6 +515,13 @@ if (sortConfig.key) {
               </tbody>
             </table>
           </div>
+          {nextCursor != null && !loading && (
+            <div className="flex justify-center py-4">
+              <button onClick={loadMore} disabled={loadingMore} className="btn-secondary">
+                {loadingMore ? '加载中...' : '加载更多'}
+              </button>
+            </div>
+          )}
         </div>
 
         {/* 新增/编辑订单模态框 */}
@@ -443,12 +565,30 @@ if (sortConfig.key) {
 // ✅ 正确的 OrderModal（订单号自动生成）
 function OrderModal({ order, products, onSubmit, onClose }: {
   order: Order | null
-  products: Product[]
+  products: Record<number, Product>
   onSubmit: (data: any) => void
   onClose: () => void
 }) {
+  const orderProduct = order ? products[order.product_id] : undefined
+  // 新增订单时按输入搜索商品（服务端搜索 SKU 前缀或名称），只取前几条作为选项
+  const [productQuery, setProductQuery] = useState('')
+  const [productOptions, setProductOptions] = useState<Product[]>([])
+
+  useEffect(() => {
+    if (order) return
+    const timer = setTimeout(async () => {
+      try {
+        const response = await productApi.getProductsPage({ limit: PRODUCT_OPTION_LIMIT, q: productQuery.trim() })
+        setProductOptions(response.data.items)
+      } catch (error) {
+        console.error('搜索商品失败:', error)
+      }
+    }, productQuery ? SEARCH_DEBOUNCE_MS : 0)
+    return () => clearTimeout(timer)
+  }, [productQuery])
+
   const [formData, setFormData] = useState({
-    product_sku: order ? products.find(p => p.id === order.product_id)?.sku || '' : '',
+    product_sku: orderProduct?.sku || '',
     actual_price: order?.actual_price?.toString() || '',
     quantity: order?.quantity?.toString() || '',
     payment_method: order?.payment_method || 'cash',
@@ -486,16 +626,24 @@ function OrderModal({ order, products, onSubmit, onClose }: {
             {order ? (
               <input
                 type="text"
-                value={`${products.find(p => p.id)?.name || ''} - ${products.find(p => p.id)?.sku || ''} (库存: ${products.find(p => p.id)?.quantity})`}
+                value={`${orderProduct?.name || ''} - ${orderProduct?.sku || ''} (库存: ${orderProduct?.quantity ?? '-'})`}
                 className="form-input"
                 disabled
               />
             ) : (
+              <>
+              <input
+                type="text"
+                placeholder="输入 SKU 或商品名称搜索..."
+                value={productQuery}
+                onChange={(e) => setProductQuery(e.target.value)}
+                className="form-input mb-2"
+              />
               <select
                 value={formData.product_sku}
                 onChange={(e) => {
                   const selectedSku = e.target.value
-                  const selectedProduct = products.find(p => p.sku === selectedSku)
+                  const selectedProduct = productOptions.find(p => p.sku === selectedSku)
 
                   setFormData({
                     ...formData,
@@ -509,14 +657,13 @@ function OrderModal({ order, products, onSubmit, onClose }: {
                 required
               >
                 <option value="">选择商品</option>
-                {products.map(p => (
+                {productOptions.map(p => (
                   <option key={p.sku} value={p.sku}>
                     {p.sku} - {p.name} (库存: {p.quantity})
                   </option>
                 ))}
               </select>
-
-
+              </>
             )}
           </div>
 
@@ -642,10 +789,10 @@ function OrderModal({ order, products, onSubmit, onClose }: {
 // ✅ 订单详情
 function OrderDetailModal({ order, products, onClose }: {
   order: Order
-  products: Product[]
+  products: Record<number, Product>
   onClose: () => void
 }) {
-  const product = products.find(p => p.id === order.product_id)
+  const product = products[order.product_id]
 
   return (
     <div className="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50">
@@ -32,7 +32,7 @@ export default function HomePage() {
     {
       name: '售出商品总数',
       // 注意：summary.total_quantity 是卖出的数量，
-      // 如果你要显示商品种类数，可以改用 productApi.getProducts().length
+      // 如果你要显示商品种类数，需要后端提供商品计数接口（商品列表是分页的）
       value: summary ? summary.total_quantity : 0,
       icon: Package,
       color: 'bg-blue-100 text-blue-600',
@@ -1,7 +1,7 @@
 'use client'
 
 import OrderModal from '@/components/OrderModal'
-import { productApi, orderApi } from '@/lib/api'
+import { productApi, orderApi, Page } from '@/lib/api'
 
 import { useState, useEffect } from 'react'
 import { ShoppingCart } from 'lucide-react'
@@ -24,11 +24,23 @@ interface Product {
   quantity: number
   preset_price?: number
   actual_price?: number
+  units_sold?: number
+  revenue?: number
+  profit_total?: number
+  last_sold_at?: string | null
 }
 
+// 每页商品数
+const PRODUCT_PAGE_SIZE = 100
+
+// 搜索框输入停顿多久（毫秒）后再请求
+const SEARCH_DEBOUNCE_MS = 300
+
 export default function ProductsPage() {
   const [products, setProducts] = useState<Product[]>([])
   const [loading, setLoading] = useState(true)
+  const [nextCursor, setNextCursor] = useState<number | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [showModal, setShowModal] = useState(false)
   const [editingProduct, setEditingProduct] = useState<Product | null>(null)
   const [searchTerm, setSearchTerm] = useState('')
@@ -39,12 +51,13 @@ const [sortConfig, setSortConfig] = useState<{ key: keyof Product | null; direct
   direction: 'asc',
 })
 
-  // 获取商品列表
+  // 获取第一页商品（搜索在服务端进行：SKU 前缀或名称）
   const fetchProducts = async () => {
     try {
       setLoading(true)
-      const response = await productApi.getProducts()
-      setProducts(response.data)
+      const response = await productApi.getProductsPage({ limit: PRODUCT_PAGE_SIZE, q: searchTerm.trim() })
+      setProducts(response.data.items)
+      setNextCursor(response.data.next_cursor)
     } catch (error) {
       console.error('获取商品列表失败:', error)
     } finally {
@@ -52,9 +65,30 @@ const [sortConfig, setSortConfig] = useState<{ key: keyof Product | null; direct
     }
   }
 
+  // 加载下一页商品
+  const loadMore = async () => {
+    if (nextCursor == null) return
+    try {
+      setLoadingMore(true)
+      const response = await productApi.getProductsPage({
+        limit: PRODUCT_PAGE_SIZE,
+        cursor: nextCursor,
+        q: searchTerm.trim(),
+      })
+      setProducts(prev => [...prev, ...response.data.items])
+      setNextCursor(response.data.next_cursor)
+    } catch (error) {
+      console.error('加载更多商品失败:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
+  // 搜索词变化后（停顿一会儿）从第一页重新加载
   useEffect(() => {
-    fetchProducts()
-  }, [])
+    const timer = setTimeout(fetchProducts, searchTerm ? SEARCH_DEBOUNCE_MS : 0)
+    return () => clearTimeout(timer)
+  }, [searchTerm])
 const handleSort = (key: keyof Product) => {
   let direction: 'asc' | 'desc' = 'asc'
   if (sortConfig.key === key && sortConfig.direction === 'asc') {
@@ -63,14 +97,10 @@ const handleSort = (key: keyof Product) => {
   setSortConfig({ key, direction })
 }
 
-  // 筛选商品
-let filteredProducts = products.filter(product =>
-  product.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-  product.sku.toLowerCase().includes(searchTerm.toLowerCase())
-)
+  // 已加载的商品（搜索已在服务端完成）
+let filteredProducts = products
 
-// 排序逻辑
-// 排序逻辑
+// 排序逻辑（只对已加载的商品排序）
 if (sortConfig.key) {
   const key = sortConfig.key as keyof Product
   filteredProducts = [...filteredProducts].sort((a, b) => {
@@ -125,28 +155,30 @@ if (sortConfig.key) {
   const [deleting, setDeleting] = useState(false)
   const [deleteProgress, setDeleteProgress] = useState(0)
 
-  // 🚀 带进度条的批量删除
+  // 🚀 批量删除：删除服务端所有符合当前搜索条件的商品（不只是已加载的几页）
   const handleBulkDelete = async () => {
-    const itemsToDelete = [...filteredProducts]
-
-    if (!confirm(`确定要删除当前显示的 ${itemsToDelete.length} 个商品吗？`)) return
+    const q = searchTerm.trim()
+    const scope = q ? `所有匹配“${q}”的商品` : '全部商品'
+    if (!confirm(`确定要删除${scope}吗？`)) return
 
     setDeleting(true)
     setDeleteProgress(0)
 
     try {
-      const total = itemsToDelete.length
-
-      for (let i = 0; i < total; i++) {
-        await productApi.deleteProduct(itemsToDelete[i].sku)
-
-        setDeleteProgress(Math.round(((i + 1) / total) * 100))
-
-        // 给 UI 时间刷新
-        await new Promise(resolve => setTimeout(resolve, 100))
-      }
-
-      toast.success(`成功删除 ${total} 个商品`)
+      let deleted = 0
+      let cursor: number | null = null
+      // 按游标逐页取出匹配的 SKU 再逐个删除，删除不影响后面几页的游标
+      do {
+        const page: Page = (await productApi.getProductsPage({ limit: PRODUCT_PAGE_SIZE, cursor, q, fields: 'sku' })).data
+        for (const item of page.items) {
+          await productApi.deleteProduct(item.sku)
+          deleted += 1
+          setDeleteProgress(deleted)
+        }
+        cursor = page.next_cursor
+      } while (cursor != null)
+
+      toast.success(`成功删除 ${deleted} 个商品`)
       fetchProducts()
     } catch (error) {
       console.error('批量删除失败:', error)
@@ -237,13 +269,10 @@ if (sortConfig.key) {
         {deleting && (
           <div className="mb-6">
             <div className="w-full bg-gray-200 rounded h-3">
-              <div
-                className="bg-red-500 h-3 rounded transition-all duration-300"
-                style={{ width: `${deleteProgress}%` }}
-              ></div>
+              <div className="bg-red-500 h-3 rounded animate-pulse w-full"></div>
             </div>
             <p className="text-sm mt-2 text-gray-600">
-              正在删除商品... {deleteProgress}%
+              正在删除商品... 已删除 {deleteProgress} 个
             </p>
           </div>
         )}
@@ -252,7 +281,7 @@ if (sortConfig.key) {
         <div className="card">
           <div className="card-header">
             <h3 className="text-lg font-semibold text-gray-900">
-              商品列表 ({filteredProducts.length})
+              商品列表 (已加载 {filteredProducts.length}{nextCursor != null ? '，还有更多' : ''})
             </h3>
           </div>
           <div className="overflow-x-auto">
@@ -285,13 +314,21 @@ if (sortConfig.key) {
                     </button>
                   </th>
                   <th className="table-header-cell">实际售价</th>
+                  <th className="table-header-cell">
+                    已售数量
+                    <button onClick={() => handleSort('units_sold')} className="ml-1 text-xs text-gray-500">
+                      ⇅
+                    </button>
+                  </th>
+                  <th className="table-header-cell">销售额</th>
+                  <th className="table-header-cell">累计利润</th>
                   <th className="table-header-cell">操作</th>
                 </tr>
               </thead>
               <tbody className="table-body">
                 {loading ? (
                   <tr>
-                    <td colSpan={7} className="table-cell text-center py-8">
+                    <td colSpan={10} className="table-cell text-center py-8">
                       <div className="flex items-center justify-center">
                         <div className="animate-spin rounded-full h-6 w-6 border-b-2 border-primary-600"></div>
                         <span className="ml-2">加载中...</span>
@@ -300,7 +337,7 @@ if (sortConfig.key) {
                   </tr>
                 ) : filteredProducts.length === 0 ? (
                   <tr>
-                    <td colSpan={7} className="table-cell text-center py-8 text-gray-500">
+                    <td colSpan={10} className="table-cell text-center py-8 text-gray-500">
                       暂无商品数据
                     </td>
                   </tr>
@@ -321,6 +358,9 @@ if (sortConfig.key) {
                       <td className="table-cell">
                         {product.actual_price ? `¥${product.actual_price.toFixed(2)}` : '-'}
                       </td>
+                      <td className="table-cell">{product.units_sold ?? 0}</td>
+                      <td className="table-cell">¥{(product.revenue ?? 0).toFixed(2)}</td>
+                      <td className="table-cell">¥{(product.profit_total ?? 0).toFixed(2)}</td>
                       <td className="table-cell">
                         <div className="flex gap-2">
                           <button
@@ -355,6 +395,13 @@ if (sortConfig.key) {
               </tbody>
             </table>
           </div>
+          {nextCursor != null && !loading && (
+            <div className="flex justify-center py-4">
+              <button onClick={loadMore} disabled={loadingMore} className="btn-secondary">
+                {loadingMore ? '加载中...' : '加载更多'}
+              </button>
+            </div>
+          )}
         </div>
 
         {/* 新增/编辑商品模态框 */}
@@ -56,10 +56,30 @@ api.interceptors.response.use(
   }
 )
 
+// 分页列表响应：items 为当前页，next_cursor 为 null 表示没有下一页
+export interface Page<T = any> {
+  items: T[]
+  next_cursor: number | null
+}
+
+// 分页查询参数：cursor 传上一页的 next_cursor；q 为搜索词；其余过滤参数与报表接口相同
+// （如 channels、statuses、start_date、product_skus，多个值用逗号分隔），都在服务端筛选
+export interface PageParams {
+  limit?: number
+  cursor?: number | null
+  fields?: string
+  q?: string
+  [key: string]: any
+}
+
+// 去掉空的查询参数（空字符串、null），避免传给后端当成筛选条件
+const pageParams = (params?: PageParams) =>
+  Object.fromEntries(Object.entries(params ?? {}).filter(([, value]) => value !== '' && value != null))
+
 // 商品相关 API
 export const productApi = {
-  // 获取商品列表
-  getProducts: () => api.get('/products'),
+  // 获取一页商品（q 搜索 SKU 前缀或名称，ids 按商品 id 筛选）
+  getProductsPage: (params?: PageParams) => api.get<Page>('/products', { params: pageParams(params) }),
   
   // 获取单个商品
   getProduct: (sku: string) => api.get(`/products/${sku}`),
@@ -85,10 +105,31 @@ export const productApi = {
   },
 }
 
+// 批量订单请求：一个事务内先删除、再修改、最后新增
+export interface OrderBatch {
+  create?: any[]
+  update?: ({ id: number } & Record<string, any>)[]
+  delete?: number[]
+  mode?: 'all_or_nothing' | 'best_effort'
+}
+
+// 批量订单结果：action + index 对应请求里的数组和位置
+export interface OrderBatchResult {
+  committed: boolean
+  results: {
+    action: 'create' | 'update' | 'delete'
+    index: number
+    ok: boolean
+    order_id: number | null
+    order: any | null
+    error: string | null
+  }[]
+}
+
 // 订单相关 API
 export const orderApi = {
-  // 获取订单列表
-  getOrders: () => api.get('/orders'),
+  // 获取一页订单（q 搜索订单号前缀或商品，其余筛选参数同报表）
+  getOrdersPage: (params?: PageParams) => api.get<Page>('/orders', { params: pageParams(params) }),
   
   // 获取单个订单
   getOrder: (id: number) => api.get(`/orders/${id}`),
@@ -104,6 +145,9 @@ export const orderApi = {
   
   // 删除订单
   deleteOrder: (id: number) => api.delete(`/orders/${id}`),
+
+  // 批量新增/修改/删除订单（一个请求、一个事务）
+  batchOrders: (batch: OrderBatch) => api.post<OrderBatchResult>('/orders/batch', batch),
   
   // 导入订单CSV
   importOrders: (file: File) => {